@@ -1,36 +1,161 @@
+import json
+
 from aws_cdk import (
     Stack,
     aws_apigateway as apigateway,
+    aws_dynamodb as dynamodb,
     aws_lambda as lambda_,
     aws_iam as iam,
+    aws_s3 as s3,
+    aws_sns as sns,
+    aws_sns_subscriptions as sns_subscriptions,
     Duration,
     CfnOutput,
-    RemovalPolicy
+    RemovalPolicy,
+    Size
 )
 from constructs import Construct
 
+from build_lambda import build_package
+from endpoint_router import parse_targets
+from response_encoding import BINARY_TYPES
+
 class ApiGatewaySagemakerStack(Stack):
     def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
         
-        # Get SageMaker endpoint name from context
+        # Get the SageMaker endpoint name, or a JSON array of endpoints/variants/models to
+        # route across, from context
         sagemaker_endpoint_name = self.node.try_get_context("SAGEMAKER_ENDPOINT_NAME")
-        if not sagemaker_endpoint_name:
-            raise ValueError("SAGEMAKER_ENDPOINT_NAME must be provided in CDK context")
+        sagemaker_targets = self.node.try_get_context("SAGEMAKER_TARGETS") or ""
+        if not isinstance(sagemaker_targets, str):
+            sagemaker_targets = json.dumps(sagemaker_targets)
+        if not sagemaker_endpoint_name and not sagemaker_targets:
+            raise ValueError("SAGEMAKER_ENDPOINT_NAME or SAGEMAKER_TARGETS must be provided in CDK context")
+        # Fail the synth, not the first request, on a malformed target list
+        targets = parse_targets(sagemaker_targets, sagemaker_endpoint_name or "")
+        sagemaker_endpoint_name = sagemaker_endpoint_name or targets[0].endpoint
+
+        # SageMaker runtime client tuning, overridable from CDK context
+        runtime_client_settings = {
+            "SAGEMAKER_MAX_POOL_CONNECTIONS": "10",
+            "SAGEMAKER_CONNECT_TIMEOUT": "2",
+            "SAGEMAKER_READ_TIMEOUT": "25",
+            "SAGEMAKER_MAX_ATTEMPTS": "3",
+            "SAGEMAKER_RETRY_MODE": "adaptive"
+        }
+
+        # Least-loaded routing and circuit breaking across SAGEMAKER_TARGETS, overridable from CDK context
+        routing_settings = {
+            "SAGEMAKER_ROUTER_EWMA_ALPHA": "0.3",
+            "SAGEMAKER_CIRCUIT_FAILURE_THRESHOLD": "3",
+            "SAGEMAKER_CIRCUIT_OPEN_SECONDS": "30"
+        }
+
+        # /predict/batch packing and concurrency, overridable from CDK context
+        batch_settings = {
+            "SAGEMAKER_BATCH_SIZE": "8",
+            "SAGEMAKER_BATCH_CONCURRENCY": "4",
+            "SAGEMAKER_BATCH_CONTENT_TYPE": "application/json"
+        }
+
+        # In-container prediction cache, overridable from CDK context
+        cache_settings = {
+            "PREDICTION_CACHE_MAX_ENTRIES": "256",
+            "PREDICTION_CACHE_TTL_SECONDS": "300"
+        }
+
+        # Server-side image downscaling (0 disables it), overridable from CDK context
+        image_settings = {
+            "IMAGE_MAX_DIMENSION": "0",
+            "IMAGE_FORMAT": "JPEG",
+            "IMAGE_QUALITY": "85"
+        }
+
+        # /predict/async request tracking and long polling, overridable from CDK context
+        async_settings = {
+            "ASYNC_REQUEST_TTL_SECONDS": "86400",
+            "ASYNC_REQUEST_QUEUE_TTL_SECONDS": "21600",
+            "ASYNC_RESULT_POLL_SECONDS": "1"
+        }
+
+        # Share of invocations traced as X-Ray subsegments per phase (needs XRAY_TRACING)
+        telemetry_settings = {
+            "TELEMETRY_XRAY_SAMPLE_RATE": "0"
+        }
+
+        lambda_settings = {
+            **runtime_client_settings,
+            **routing_settings,
+            **batch_settings,
+            **cache_settings,
+            **image_settings,
+            **async_settings,
+            **telemetry_settings
+        }
+        for key, default in lambda_settings.items():
+            lambda_settings[key] = str(self.node.try_get_context(key) or default)
+        if sagemaker_targets:
+            lambda_settings["SAGEMAKER_TARGETS"] = sagemaker_targets
 
-        # Create Lambda function that will invoke SageMaker endpoint
+        # Pillow is needed for server-side image downscaling and is supplied as a Lambda layer
+        pillow_layer_arn = self.node.try_get_context("PILLOW_LAYER_ARN")
+        pillow_layers = [
+            lambda_.LayerVersion.from_layer_version_arn(self, "PillowLayer", pillow_layer_arn)
+        ] if pillow_layer_arn else []
+
+        # Optional X-Ray active tracing; the aws-xray-sdk package is supplied as a Lambda layer
+        xray_tracing = str(self.node.try_get_context("XRAY_TRACING")).lower() == "true"
+        xray_sdk_layer_arn = self.node.try_get_context("XRAY_SDK_LAYER_ARN")
+        xray_layers = [
+            lambda_.LayerVersion.from_layer_version_arn(self, "XRaySdkLayer", xray_sdk_layer_arn)
+        ] if xray_sdk_layer_arn else []
+
+        # Cold start settings. Layers (Pillow, X-Ray SDK) must be built for the same architecture.
+        architecture = str(self.node.try_get_context("LAMBDA_ARCHITECTURE") or "arm64")
+        if architecture not in ("arm64", "x86_64"):
+            raise ValueError("LAMBDA_ARCHITECTURE must be arm64 or x86_64")
+        memory_size = int(self.node.try_get_context("LAMBDA_MEMORY_SIZE") or 256)
+        provisioned_concurrency = int(self.node.try_get_context("LAMBDA_PROVISIONED_CONCURRENCY") or 0)
+        snap_start = str(self.node.try_get_context("LAMBDA_SNAP_START")).lower() == "true"
+        if snap_start and provisioned_concurrency:
+            raise ValueError("LAMBDA_SNAP_START and LAMBDA_PROVISIONED_CONCURRENCY cannot be combined")
+        # Build the runtime client during the init phase when it runs ahead of traffic
+        prewarm = self.node.try_get_context("LAMBDA_PREWARM")
+        if prewarm is None:
+            prewarm = bool(snap_start or provisioned_concurrency)
+        lambda_settings["LAMBDA_PREWARM"] = str(prewarm).lower()
+
+        # Create Lambda function that will invoke SageMaker endpoint. The package holds only
+        # the handler modules, staged by build_lambda.py, not the CDK project.
         sagemaker_lambda = lambda_.Function(
             self, "SageMakerLambda",
-            runtime=lambda_.Runtime.PYTHON_3_9,
+            runtime=lambda_.Runtime.PYTHON_3_13,
+            architecture=lambda_.Architecture.ARM_64 if architecture == "arm64" else lambda_.Architecture.X86_64,
             handler="sample_lambda.lambda_handler",
-            code=lambda_.Code.from_asset(".", exclude=["cdk.out", ".venv"]),
+            code=lambda_.Code.from_asset(build_package("handler")),
             timeout=Duration.seconds(30),
-            memory_size=256,
+            memory_size=memory_size,
+            layers=[*pillow_layers, *xray_layers],
+            tracing=lambda_.Tracing.ACTIVE if xray_tracing else None,
+            snap_start=lambda_.SnapStartConf.ON_PUBLISHED_VERSIONS if snap_start else None,
             environment={
-                "SAGEMAKER_ENDPOINT_NAME": sagemaker_endpoint_name
+                "SAGEMAKER_ENDPOINT_NAME": sagemaker_endpoint_name,
+                **lambda_settings
             }
         )
 
+        # Provisioned concurrency and SnapStart apply to published versions, so API Gateway
+        # invokes the function through an alias on the current version
+        sagemaker_target = sagemaker_lambda
+        if snap_start or provisioned_concurrency:
+            sagemaker_target = lambda_.Alias(
+                self, "SageMakerLambdaLiveAlias",
+                alias_name="live",
+                version=sagemaker_lambda.current_version,
+                provisioned_concurrent_executions=provisioned_concurrency or None
+            )
+
         # Grant Lambda permission to invoke SageMaker endpoint
         sagemaker_lambda.add_to_role_policy(
             iam.PolicyStatement(
@@ -39,11 +164,39 @@ class ApiGatewaySagemakerStack(Stack):
             )
         )
 
+        # Optionally share cached predictions across Lambda containers through DynamoDB
+        if str(self.node.try_get_context("PREDICTION_CACHE_SHARED")).lower() == "true":
+            cache_table = dynamodb.Table(
+                self, "PredictionCacheTable",
+                partition_key=dynamodb.Attribute(
+                    name="cache_key",
+                    type=dynamodb.AttributeType.STRING
+                ),
+                billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+                time_to_live_attribute="expires_at",
+                removal_policy=RemovalPolicy.DESTROY
+            )
+            cache_table.grant_read_write_data(sagemaker_lambda)
+            sagemaker_lambda.add_environment("PREDICTION_CACHE_TABLE_NAME", cache_table.table_name)
+
+        async_enabled = str(self.node.try_get_context("ASYNC_ENABLED")).lower() == "true"
+        if async_enabled:
+            async_notification_topics = self._add_async_inference(sagemaker_lambda, lambda_settings)
+
+        # Responses of at least this many bytes are gzip/deflate compressed for clients that
+        # send Accept-Encoding; -1 turns compression off
+        min_compression_size = self.node.try_get_context("API_MIN_COMPRESSION_SIZE")
+        min_compression_size = 1024 if min_compression_size is None else int(min_compression_size)
+
         # Create API Gateway
         api = apigateway.RestApi(
             self, "SageMakerAPI",
             rest_api_name="SageMaker Inference API",
             description="API Gateway to invoke SageMaker endpoint via Lambda",
+            # Accept raw image uploads on /predict in addition to the JSON/base64 contract, and
+            # return the binary /predict response formats as bytes
+            binary_media_types=["image/*", "application/octet-stream", *BINARY_TYPES],
+            min_compression_size=Size.bytes(min_compression_size) if min_compression_size >= 0 else None,
             default_cors_preflight_options=apigateway.CorsOptions(
                 allow_origins=apigateway.Cors.ALL_ORIGINS,
                 allow_methods=apigateway.Cors.ALL_METHODS
@@ -57,6 +210,18 @@ class ApiGatewaySagemakerStack(Stack):
             enabled=True
         )
 
+        # Usage plan limits per API key, overridable from CDK context; clients such as the
+        # OpenWebUI filter should be configured with the same rate and burst
+        rate_limit = float(self.node.try_get_context("USAGE_PLAN_RATE_LIMIT") or 10)
+        burst_limit = int(self.node.try_get_context("USAGE_PLAN_BURST_LIMIT") or 20)
+        quota_limit = self.node.try_get_context("USAGE_PLAN_QUOTA_LIMIT")
+        quota_limit = 1000 if quota_limit is None else int(quota_limit)
+        quota_period = str(self.node.try_get_context("USAGE_PLAN_QUOTA_PERIOD") or "MONTH").upper()
+        if rate_limit <= 0 or burst_limit < 1:
+            raise ValueError("USAGE_PLAN_RATE_LIMIT and USAGE_PLAN_BURST_LIMIT must be positive")
+        if quota_period not in ("DAY", "WEEK", "MONTH"):
+            raise ValueError("USAGE_PLAN_QUOTA_PERIOD must be DAY, WEEK or MONTH")
+
         # Create usage plan
         usage_plan = apigateway.UsagePlan(
             self, "SageMakerUsagePlan",
@@ -69,14 +234,14 @@ class ApiGatewaySagemakerStack(Stack):
             ],
             # Define throttling limits
             throttle=apigateway.ThrottleSettings(
-                rate_limit=10,
-                burst_limit=20
+                rate_limit=rate_limit,
+                burst_limit=burst_limit
             ),
-            # Define quota limits (optional)
+            # Define quota limits (USAGE_PLAN_QUOTA_LIMIT=0 removes the quota)
             quota=apigateway.QuotaSettings(
-                limit=1000,
-                period=apigateway.Period.MONTH
-            )
+                limit=quota_limit,
+                period=getattr(apigateway.Period, quota_period)
+            ) if quota_limit > 0 else None
         )
 
         # Add API key to usage plan
@@ -87,7 +252,7 @@ class ApiGatewaySagemakerStack(Stack):
         
         # Integration with Lambda
         lambda_integration = apigateway.LambdaIntegration(
-            sagemaker_lambda,
+            sagemaker_target,
             proxy=True,
             integration_responses=[
                 apigateway.IntegrationResponse(
@@ -114,15 +279,201 @@ class ApiGatewaySagemakerStack(Stack):
             ]
         )
 
+        # Add /predict/batch for multi-image requests, backed by the same Lambda
+        batch_resource = predict_resource.add_resource("batch")
+        batch_resource.add_method(
+            "POST",
+            lambda_integration,
+            api_key_required=True,
+            method_responses=[
+                apigateway.MethodResponse(
+                    status_code="200",
+                    response_parameters={
+                        "method.response.header.Access-Control-Allow-Origin": True
+                    }
+                )
+            ]
+        )
+
+        # Optionally accept /predict/async requests and serve their results from /predict/result/{id}
+        if async_enabled:
+            predict_resource.add_resource("async").add_method(
+                "POST",
+                lambda_integration,
+                api_key_required=True
+            )
+            predict_resource.add_resource("result").add_resource("{id}").add_method(
+                "GET",
+                lambda_integration,
+                api_key_required=True
+            )
+
+            CfnOutput(
+                self, "AsyncApiEndpoint",
+                value=f"{api.url}predict/async",
+                description="API Gateway endpoint URL for asynchronous predictions"
+            )
+            for name, topic in async_notification_topics.items():
+                CfnOutput(
+                    self, f"Async{name}TopicArn",
+                    value=topic.topic_arn,
+                    description=f"SNS topic to set as the {name} topic of the async endpoint's notification config"
+                )
+
+        # Optionally stream predictions through /predict/stream. Python runtimes cannot stream
+        # Lambda responses natively, so the function runs stream_server.py behind the
+        # AWS Lambda Web Adapter layer and API Gateway relays the response stream.
+        if str(self.node.try_get_context("STREAMING_ENABLED")).lower() == "true":
+            adapter_layer_version = str(self.node.try_get_context("LAMBDA_WEB_ADAPTER_LAYER_VERSION") or "25")
+            adapter_layer_name = "LambdaAdapterLayerArm64" if architecture == "arm64" else "LambdaAdapterLayerX86"
+            streaming_lambda = lambda_.Function(
+                self, "SageMakerStreamingLambda",
+                runtime=lambda_.Runtime.PYTHON_3_13,
+                architecture=sagemaker_lambda.architecture,
+                handler="run.sh",
+                code=lambda_.Code.from_asset(build_package("streaming")),
+                timeout=Duration.minutes(5),
+                memory_size=memory_size,
+                layers=[
+                    lambda_.LayerVersion.from_layer_version_arn(
+                        self, "LambdaWebAdapterLayer",
+                        f"arn:aws:lambda:{self.region}:753240598075:layer:{adapter_layer_name}:{adapter_layer_version}"
+                    ),
+                    *pillow_layers
+                ],
+                environment={
+                    "SAGEMAKER_ENDPOINT_NAME": sagemaker_endpoint_name,
+                    **lambda_settings,
+                    "SAGEMAKER_STREAM_ACCEPT": str(
+                        self.node.try_get_context("SAGEMAKER_STREAM_ACCEPT") or "application/jsonlines"
+                    ),
+                    "AWS_LAMBDA_EXEC_WRAPPER": "/opt/bootstrap",
+                    "AWS_LWA_INVOKE_MODE": "response_stream",
+                    "PORT": "8080"
+                }
+            )
+
+            streaming_lambda.add_to_role_policy(
+                iam.PolicyStatement(
+                    actions=["sagemaker:InvokeEndpointWithResponseStream"],
+                    resources=["*"]  # For production, scope this down to specific endpoint ARN
+                )
+            )
+
+            stream_resource = predict_resource.add_resource("stream")
+            stream_resource.add_method(
+                "POST",
+                apigateway.LambdaIntegration(
+                    streaming_lambda,
+                    proxy=True,
+                    response_transfer_mode=apigateway.ResponseTransferMode.STREAM,
+                    timeout=Duration.minutes(5)
+                ),
+                api_key_required=True
+            )
+
+            CfnOutput(
+                self, "StreamApiEndpoint",
+                value=f"{api.url}predict/stream",
+                description="API Gateway endpoint URL for the streaming predict resource"
+            )
+
         # Outputs
         CfnOutput(
             self, "ApiEndpoint",
             value=f"{api.url}predict",
             description="API Gateway endpoint URL for the predict resource"
         )
+
+        CfnOutput(
+            self, "BatchApiEndpoint",
+            value=f"{api.url}predict/batch",
+            description="API Gateway endpoint URL for the batch predict resource"
+        )
         
         CfnOutput(
             self, "ApiKeyId",
             value=api_key.key_id,
             description="API Key ID (use AWS CLI to retrieve the actual key value)"
         )
+
+    def _add_async_inference(self, sagemaker_lambda, lambda_settings):
+        """Add the input bucket, request table and completion Lambda of the async mode.
+
+        Returns the SNS topics the async endpoint's success and error notifications go to.
+        """
+        input_bucket = s3.Bucket(
+            self, "AsyncInputBucket",
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            enforce_ssl=True,
+            # SageMaker reads the input once; keep it a day for troubleshooting
+            lifecycle_rules=[s3.LifecycleRule(expiration=Duration.days(1))],
+            removal_policy=RemovalPolicy.DESTROY,
+            auto_delete_objects=True
+        )
+        request_table = dynamodb.Table(
+            self, "AsyncRequestTable",
+            partition_key=dynamodb.Attribute(
+                name="request_id",
+                type=dynamodb.AttributeType.STRING
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expires_at",
+            removal_policy=RemovalPolicy.DESTROY
+        )
+
+        sagemaker_lambda.add_environment("ASYNC_INPUT_BUCKET_NAME", input_bucket.bucket_name)
+        sagemaker_lambda.add_environment("ASYNC_REQUEST_TABLE_NAME", request_table.table_name)
+        async_endpoint_name = self.node.try_get_context("SAGEMAKER_ASYNC_ENDPOINT_NAME")
+        if async_endpoint_name:
+            sagemaker_lambda.add_environment("SAGEMAKER_ASYNC_ENDPOINT_NAME", async_endpoint_name)
+        input_bucket.grant_put(sagemaker_lambda)
+        request_table.grant_read_write_data(sagemaker_lambda)
+        sagemaker_lambda.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=["sagemaker:InvokeEndpointAsync"],
+                resources=["*"]  # For production, scope this down to specific endpoint ARN
+            )
+        )
+        # Results are read from the output path of the endpoint's AsyncInferenceConfig. Without
+        # s3:ListBucket, HeadObject on a result that is not written yet is denied (403) instead
+        # of reported missing (404), and pending requests could not be told apart from errors.
+        output_bucket_name = self.node.try_get_context("ASYNC_OUTPUT_BUCKET_NAME")
+        sagemaker_lambda.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=["s3:GetObject"],
+                resources=[f"arn:aws:s3:::{output_bucket_name}/*" if output_bucket_name else "*"]
+            )
+        )
+        sagemaker_lambda.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=["s3:ListBucket"],
+                resources=[f"arn:aws:s3:::{output_bucket_name}" if output_bucket_name else "*"]
+            )
+        )
+
+        # SageMaker publishes success and error notifications; the completion Lambda records them
+        completion_lambda = lambda_.Function(
+            self, "AsyncCompletionLambda",
+            runtime=lambda_.Runtime.PYTHON_3_13,
+            architecture=sagemaker_lambda.architecture,
+            handler="async_inference.completion_handler",
+            code=lambda_.Code.from_asset(build_package("handler")),
+            timeout=Duration.seconds(30),
+            environment={
+                "ASYNC_REQUEST_TABLE_NAME": request_table.table_name,
+                "ASYNC_REQUEST_TTL_SECONDS": lambda_settings["ASYNC_REQUEST_TTL_SECONDS"]
+            }
+        )
+        request_table.grant_read_write_data(completion_lambda)
+
+        topics = {}
+        for name in ("Success", "Error"):
+            # Reuse the endpoint's existing topics when given, otherwise create them
+            topic_arn = self.node.try_get_context(f"ASYNC_{name.upper()}_TOPIC_ARN")
+            if topic_arn:
+                topics[name] = sns.Topic.from_topic_arn(self, f"Async{name}Topic", topic_arn)
+            else:
+                topics[name] = sns.Topic(self, f"Async{name}Topic")
+            topics[name].add_subscription(sns_subscriptions.LambdaSubscription(completion_lambda))
+        return topics
@@ -0,0 +1,215 @@
+"""Asynchronous inference for large images and slow models.
+
+``POST /predict/async`` stores the image in S3, calls InvokeEndpointAsync and returns a
+request ID at once, so neither the 30 s Lambda timeout nor API Gateway's 29 s limit
+applies to the model. ``GET /predict/result/{id}`` returns the prediction once it is
+ready, optionally waiting for it (long poll).
+
+Requests are tracked in a DynamoDB table. SageMaker's success and error SNS notifications
+mark them finished through ``completion_handler``, so no Lambda has to poll the endpoint;
+without notifications, the result route checks the output location in S3 instead.
+"""
+import json
+import os
+import time
+import uuid
+
+# Request states; PENDING until a notification (or the output object) shows the outcome
+PENDING = 'PENDING'
+COMPLETED = 'COMPLETED'
+FAILED = 'FAILED'
+
+# Long polls stay well inside API Gateway's 29 s integration timeout
+MAX_WAIT_SECONDS = 20
+
+# Clients built on first use, like the runtime client in sample_lambda
+_s3_client = None
+_dynamodb_client = None
+
+
+def get_s3_client():
+    global _s3_client
+    if _s3_client is None:
+        import boto3
+        _s3_client = boto3.client('s3')
+    return _s3_client
+
+
+def get_dynamodb_client():
+    global _dynamodb_client
+    if _dynamodb_client is None:
+        import boto3
+        _dynamodb_client = boto3.client('dynamodb')
+    return _dynamodb_client
+
+
+def parse_s3_uri(uri):
+    """Split ``s3://bucket/key`` into ``(bucket, key)``."""
+    if not uri.startswith('s3://') or '/' not in uri[5:]:
+        raise ValueError(f'Not an S3 URI: {uri}')
+    bucket, key = uri[5:].split('/', 1)
+    return bucket, key
+
+
+class AsyncRequestStore:
+    """Async requests in a DynamoDB table keyed on ``request_id`` with an ``expires_at`` TTL."""
+
+    def __init__(self, table_name, ttl_seconds, client=None, clock=time.time):
+        self.table_name = table_name
+        self.ttl_seconds = ttl_seconds
+        self.client = client or get_dynamodb_client()
+        self.clock = clock
+
+    def create(self, request_id, output_location, failure_location=''):
+        item = {
+            'request_id': {'S': request_id},
+            'status': {'S': PENDING},
+            'output_location': {'S': output_location},
+            'created_at': {'N': str(int(self.clock()))},
+            'expires_at': {'N': str(int(self.clock() + self.ttl_seconds))}
+        }
+        if failure_location:
+            item['failure_location'] = {'S': failure_location}
+        self.client.put_item(TableName=self.table_name, Item=item)
+
+    def get(self, request_id):
+        """Return the request as a dict of strings, or None when it is unknown or expired."""
+        response = self.client.get_item(
+            TableName=self.table_name,
+            Key={'request_id': {'S': request_id}},
+            ConsistentRead=True
+        )
+        item = response.get('Item')
+        # DynamoDB deletes expired items lazily, so check the TTL ourselves
+        if not item or int(item['expires_at']['N']) <= self.clock():
+            return None
+        return {name: next(iter(value.values())) for name, value in item.items()}
+
+    def finish(self, request_id, status, output_location='', failure_reason=''):
+        """Record the outcome of a request; unknown (or expired and deleted) requests are ignored."""
+        names = {'#status': 'status'}
+        values = {':status': {'S': status}}
+        updates = ['#status = :status']
+        if output_location:
+            updates.append('output_location = :output_location')
+            values[':output_location'] = {'S': output_location}
+        if failure_reason:
+            updates.append('failure_reason = :failure_reason')
+            values[':failure_reason'] = {'S': failure_reason}
+        try:
+            self.client.update_item(
+                TableName=self.table_name,
+                Key={'request_id': {'S': request_id}},
+                UpdateExpression='SET ' + ', '.join(updates),
+                ConditionExpression='attribute_exists(request_id)',
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values
+            )
+        except Exception as e:
+            if getattr(e, 'response', {}).get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise
+            print(f"Ignoring the outcome of unknown async request {request_id}")
+
+
+def get_request_store():
+    return AsyncRequestStore(
+        os.environ['ASYNC_REQUEST_TABLE_NAME'],
+        int(os.environ.get('ASYNC_REQUEST_TTL_SECONDS', '86400'))
+    )
+
+
+def submit(runtime_client, endpoint_name, image_bytes, content_type='application/x-image',
+           s3_client=None, store=None):
+    """Upload the image, start an InvokeEndpointAsync request and return its request ID."""
+    s3_client = s3_client or get_s3_client()
+    store = store or get_request_store()
+    request_id = uuid.uuid4().hex
+    bucket = os.environ['ASYNC_INPUT_BUCKET_NAME']
+    key = f"{os.environ.get('ASYNC_INPUT_PREFIX', 'async-inputs/')}{request_id}"
+    s3_client.put_object(Bucket=bucket, Key=key, Body=image_bytes, ContentType=content_type)
+
+    response = runtime_client.invoke_endpoint_async(
+        EndpointName=endpoint_name,
+        InputLocation=f's3://{bucket}/{key}',
+        ContentType=content_type,
+        Accept='application/json',
+        InferenceId=request_id,
+        RequestTTLSeconds=int(os.environ.get('ASYNC_REQUEST_QUEUE_TTL_SECONDS', '21600'))
+    )
+    store.create(request_id, response['OutputLocation'], response.get('FailureLocation', ''))
+    return request_id
+
+
+def _read_object(s3_client, location):
+    bucket, key = parse_s3_uri(location)
+    return s3_client.get_object(Bucket=bucket, Key=key)['Body'].read()
+
+
+def _object_exists(s3_client, location):
+    bucket, key = parse_s3_uri(location)
+    try:
+        s3_client.head_object(Bucket=bucket, Key=key)
+    except Exception as e:
+        if getattr(e, 'response', {}).get('ResponseMetadata', {}).get('HTTPStatusCode') == 404:
+            return False
+        raise
+    return True
+
+
+def get_result(request_id, wait_seconds=0, s3_client=None, store=None, clock=time.monotonic, sleep=time.sleep):
+    """Return ``{"status", ...}`` for a request, or None when it is unknown.
+
+    While the request is pending, waits up to ``wait_seconds`` (capped at MAX_WAIT_SECONDS)
+    for the completion notification, re-reading the request every
+    ``ASYNC_RESULT_POLL_SECONDS``. The output location in S3 is checked once per call, so
+    results are found even when the endpoint sends no notifications.
+    """
+    s3_client = s3_client or get_s3_client()
+    store = store or get_request_store()
+    deadline = clock() + max(0, min(wait_seconds, MAX_WAIT_SECONDS))
+    poll_seconds = float(os.environ.get('ASYNC_RESULT_POLL_SECONDS', '1'))
+    checked_output = False
+    while True:
+        request = store.get(request_id)
+        if request is None:
+            return None
+
+        if request['status'] == PENDING and not checked_output:
+            checked_output = True
+            if _object_exists(s3_client, request['output_location']):
+                request['status'] = COMPLETED
+            elif request.get('failure_location') and _object_exists(s3_client, request['failure_location']):
+                request['status'] = FAILED
+                request['failure_reason'] = _read_object(s3_client, request['failure_location']).decode(errors='replace')
+
+        if request['status'] == COMPLETED:
+            body = _read_object(s3_client, request['output_location'])
+            try:
+                prediction = json.loads(body.decode())
+            except ValueError:
+                prediction = body.decode(errors='replace')
+            return {'requestId': request_id, 'status': COMPLETED, 'prediction': prediction}
+        if request['status'] == FAILED:
+            return {'requestId': request_id, 'status': FAILED, 'error': request.get('failure_reason', '')}
+
+        remaining = deadline - clock()
+        if remaining <= 0:
+            return {'requestId': request_id, 'status': PENDING}
+        sleep(min(poll_seconds, remaining))
+
+
+def completion_handler(event, context):
+    """Lambda handler for SageMaker's async inference success and error SNS notifications."""
+    store = get_request_store()
+    for record in event.get('Records', []):
+        notification = json.loads(record['Sns']['Message'])
+        request_id = notification.get('inferenceId')
+        if not request_id:
+            print(f"Notification without an inferenceId: {notification}")
+            continue
+        response_parameters = notification.get('responseParameters') or {}
+        if notification.get('invocationStatus') == 'Completed':
+            store.finish(request_id, COMPLETED, output_location=response_parameters.get('outputLocation', ''))
+        else:
+            store.finish(request_id, FAILED, failure_reason=notification.get('failureReason', 'Inference failed'))
+    return {'processed': len(event.get('Records', []))}
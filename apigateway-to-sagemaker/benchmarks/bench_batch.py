@@ -0,0 +1,73 @@
+"""Per-image /predict calls vs. one /predict/batch request against a slow local endpoint.
+
+The SageMaker stand-in sleeps for ``--latency`` seconds per invoke_endpoint call, which
+stands in for model and network time:
+
+    python benchmarks/bench_batch.py --images 64 --latency 0.05
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_sagemaker import (  # noqa: E402
+    FakeSageMakerRuntime,
+    configure_fake_aws_environment,
+    quiet_handler_logs
+)
+
+configure_fake_aws_environment()
+
+import sample_lambda  # noqa: E402
+
+
+def run_single(images, runtime):
+    sample_lambda._runtime_client = runtime
+    start = time.perf_counter()
+    for image in images:
+        result = sample_lambda.lambda_handler({'body': json.dumps({'image': image})}, None)
+        assert result['statusCode'] == 200, result
+    return time.perf_counter() - start
+
+
+def run_batch(images, runtime):
+    sample_lambda._runtime_client = runtime
+    event = {'resource': sample_lambda.BATCH_RESOURCE, 'body': json.dumps({'images': images})}
+    start = time.perf_counter()
+    result = sample_lambda.lambda_handler(event, None)
+    elapsed = time.perf_counter() - start
+    predictions = json.loads(result['body'])['predictions']
+    assert [p['index'] for p in predictions] == list(range(len(images)))
+    assert not any('error' in p for p in predictions), predictions
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', type=int, default=64)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    os.environ['SAGEMAKER_BATCH_SIZE'] = str(args.batch_size)
+    os.environ['SAGEMAKER_BATCH_CONCURRENCY'] = str(args.concurrency)
+    images = [base64.b64encode(os.urandom(4096)).decode() for _ in range(args.images)]
+
+    with quiet_handler_logs():
+        single_runtime = FakeSageMakerRuntime(latency=args.latency)
+        single = run_single(images, single_runtime)
+        batch_runtime = FakeSageMakerRuntime(latency=args.latency)
+        batch = run_batch(images, batch_runtime)
+
+    print(f"per-image /predict : {single * 1000:9.1f} ms  endpoint calls={len(single_runtime.calls)}")
+    print(f"/predict/batch     : {batch * 1000:9.1f} ms  endpoint calls={len(batch_runtime.calls)} "
+          f"(batch size {args.batch_size}, concurrency {args.concurrency})")
+
+
+if __name__ == '__main__':
+    main()
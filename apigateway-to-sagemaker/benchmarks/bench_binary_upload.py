@@ -0,0 +1,85 @@
+"""Memory and latency of the JSON/base64 upload path vs. the raw binary upload path.
+
+Builds the Lambda proxy events API Gateway delivers for each path and runs them
+through sample_lambda with an in-process SageMaker stand-in:
+
+    python benchmarks/bench_binary_upload.py --iterations 20
+"""
+import argparse
+import base64
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_sagemaker import (  # noqa: E402
+    FakeSageMakerRuntime,
+    configure_fake_aws_environment,
+    quiet_handler_logs
+)
+
+configure_fake_aws_environment()
+
+import sample_lambda  # noqa: E402
+
+PAYLOAD_SIZES = {'100KB': 100 * 1024, '1MB': 1024 * 1024, '5MB': 5 * 1024 * 1024}
+
+
+def json_request(image):
+    """Return (bytes on the wire, Lambda event) for the JSON/base64 contract."""
+    body = json.dumps({'image': base64.b64encode(image).decode()})
+    event = {
+        'headers': {'Content-Type': 'application/json'},
+        'body': body,
+        'isBase64Encoded': False
+    }
+    return len(body), event
+
+
+def binary_request(image):
+    """Return (bytes on the wire, Lambda event) for a raw image/jpeg upload."""
+    event = {
+        'headers': {'Content-Type': 'image/jpeg'},
+        'body': base64.b64encode(image).decode(),
+        'isBase64Encoded': True
+    }
+    return len(image), event
+
+
+def measure(event, iterations):
+    timings = []
+    with quiet_handler_logs():
+        for _ in range(iterations):
+            start = time.perf_counter()
+            result = sample_lambda.lambda_handler(event, None)
+            timings.append(time.perf_counter() - start)
+            assert result['statusCode'] == 200, result
+
+        tracemalloc.start()
+        sample_lambda.lambda_handler(event, None)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return statistics.median(timings) * 1000, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    sample_lambda._runtime_client = FakeSageMakerRuntime()
+    print(f"{'size':<6} {'path':<7} {'wire bytes':>12} {'p50 ms':>9} {'peak alloc':>12}")
+    for label, size in PAYLOAD_SIZES.items():
+        image = os.urandom(size)
+        for path, build in (('json', json_request), ('binary', binary_request)):
+            wire_bytes, event = build(image)
+            p50_ms, peak = measure(event, args.iterations)
+            print(f"{label:<6} {path:<7} {wire_bytes:>12,} {p50_ms:>9.3f} {peak:>12,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Prediction cache hit rate and latency for a stream of partly repeated images.
+
+Simulates several Lambda containers sharing a DynamoDB tier (a local stand-in) in
+front of a slow SageMaker endpoint:
+
+    python benchmarks/bench_cache.py --requests 200 --unique-images 40 --containers 4
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_sagemaker import (  # noqa: E402
+    FakeDynamoDbClient,
+    FakeSageMakerRuntime,
+    configure_fake_aws_environment,
+    quiet_handler_logs
+)
+
+configure_fake_aws_environment()
+
+import prediction_cache  # noqa: E402
+import sample_lambda  # noqa: E402
+
+
+def build_caches(containers, shared_client):
+    """One in-process cache per simulated container, optionally sharing a DynamoDB tier."""
+    caches = []
+    for _ in range(containers):
+        shared = prediction_cache.DynamoDbCacheTier('cache', 300, client=shared_client) if shared_client else None
+        caches.append(prediction_cache.PredictionCache(prediction_cache.LruTtlCache(256, 300), shared))
+    return caches
+
+
+def run(events, caches, runtime):
+    """Send ``events`` round-robin to the simulated containers; return the hits and per-request latencies."""
+    sample_lambda._runtime_client = runtime
+    hits, timings = 0, []
+    for i, event in enumerate(events):
+        # With no caches the handler sees caching disabled (PREDICTION_CACHE_MAX_ENTRIES=0)
+        prediction_cache._prediction_cache = caches[i % len(caches)] if caches else None
+        start = time.perf_counter()
+        result = sample_lambda.lambda_handler(event, None)
+        timings.append(time.perf_counter() - start)
+        assert result['statusCode'] == 200, result
+        hits += result['headers']['X-Cache'] == 'HIT'
+    prediction_cache._prediction_cache = None
+    return hits, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--unique-images', type=int, default=40)
+    parser.add_argument('--containers', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    images = [base64.b64encode(os.urandom(16 * 1024)).decode() for _ in range(args.unique_images)]
+    events = [{'body': json.dumps({'image': rng.choice(images)})} for _ in range(args.requests)]
+
+    scenarios = (
+        ('no cache', []),
+        ('local LRU only', build_caches(args.containers, None)),
+        ('local LRU + shared tier', build_caches(args.containers, FakeDynamoDbClient(latency=0.002)))
+    )
+    results = []
+    with quiet_handler_logs():
+        for label, caches in scenarios:
+            runtime = FakeSageMakerRuntime(latency=args.latency)
+            hits, timings = run(events, caches, runtime)
+            results.append((label, hits, len(runtime.calls), timings))
+
+    for label, hits, calls, timings in results:
+        print(f"{label:<24} hit rate={hits / len(events):6.1%} endpoint calls={calls:<5} "
+              f"mean={statistics.mean(timings) * 1000:7.2f}ms p50={statistics.median(timings) * 1000:7.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
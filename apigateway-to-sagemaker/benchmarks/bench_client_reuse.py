@@ -0,0 +1,84 @@
+"""Per-invocation overhead of sample_lambda with and without runtime client reuse.
+
+Runs the handler against a stubbed SageMaker runtime so no AWS calls are made:
+
+    python benchmarks/bench_client_reuse.py --iterations 200
+"""
+import argparse
+import base64
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_sagemaker import (  # noqa: E402
+    StubbedClientFactory,
+    configure_fake_aws_environment,
+    quiet_handler_logs
+)
+
+configure_fake_aws_environment()
+
+import boto3  # noqa: E402
+import sample_lambda  # noqa: E402
+
+_real_boto3_client = boto3.client
+
+
+def _run_invocations(factory, event, iterations, reuse_client, timings):
+    for _ in range(iterations):
+        if reuse_client and sample_lambda._runtime_client is not None:
+            factory.queue_response()
+        else:
+            # Reproduce the previous behaviour: a brand-new client on every invocation
+            sample_lambda._runtime_client = None
+        start = time.perf_counter()
+        result = sample_lambda.lambda_handler(event, None)
+        timings.append(time.perf_counter() - start)
+        assert result['statusCode'] == 200, result
+
+
+def run(iterations, reuse_client):
+    factory = StubbedClientFactory(_real_boto3_client)
+    boto3.client = factory
+    sample_lambda._runtime_client = None
+    event = {'body': json.dumps({'image': base64.b64encode(b'\x00' * 1024).decode()})}
+
+    timings = []
+    # The handler logs the incoming event; keep that out of the report
+    with quiet_handler_logs():
+        try:
+            _run_invocations(factory, event, iterations, reuse_client, timings)
+        finally:
+            boto3.client = _real_boto3_client
+            sample_lambda._runtime_client = None
+
+    # Exclude the first (cold) invocation so both modes compare warm behaviour
+    warm = timings[1:] or timings
+    return {
+        'mode': 'reused client' if reuse_client else 'client per invocation',
+        'clients_created': factory.clients_created,
+        'mean_ms': statistics.mean(warm) * 1000,
+        'p50_ms': statistics.median(warm) * 1000,
+        'max_ms': max(warm) * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    for reuse_client in (False, True):
+        stats = run(args.iterations, reuse_client)
+        print(
+            f"{stats['mode']:<24} clients={stats['clients_created']:<5} "
+            f"mean={stats['mean_ms']:.3f}ms p50={stats['p50_ms']:.3f}ms max={stats['max_ms']:.3f}ms"
+        )
+
+
+if __name__ == '__main__':
+    main()
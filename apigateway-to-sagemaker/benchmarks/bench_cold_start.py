@@ -0,0 +1,86 @@
+"""Init time and package size of the inference Lambda.
+
+Stages the handler-only package with build_lambda.py, compares its zipped size with the
+previous whole-project asset, and imports the handler in fresh interpreters (as a Lambda
+cold start does) to time the init phase:
+
+    python benchmarks/bench_cold_start.py --runs 10
+"""
+import argparse
+import io
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import zipfile
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from build_lambda import build_package  # noqa: E402
+from fake_sagemaker import configure_fake_aws_environment  # noqa: E402
+
+# What Code.from_asset(".") used to leave out of the function package
+PREVIOUS_ASSET_EXCLUDES = ('cdk.out', '.venv', 'benchmarks')
+
+# Previous module-level imports of sample_lambda, now deferred to first use
+EAGER_IMPORTS = 'import boto3; from botocore.config import Config; from concurrent.futures import ThreadPoolExecutor; '
+
+INIT_SCRIPT = '''
+import time
+start = time.perf_counter()
+{imports}import sample_lambda
+print((time.perf_counter() - start) * 1000)
+'''
+
+
+def zipped_size(root, excludes=()):
+    """Size of ``root`` as a deflated zip, the way the Lambda asset is uploaded."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for directory, subdirectories, file_names in os.walk(root):
+            subdirectories[:] = [d for d in subdirectories if d not in excludes and d != '__pycache__']
+            for file_name in file_names:
+                path = os.path.join(directory, file_name)
+                archive.write(path, os.path.relpath(path, root))
+    return len(buffer.getvalue())
+
+
+def init_times(package_dir, runs, imports='', prewarm=False):
+    """Milliseconds to import the handler module in ``runs`` fresh interpreters."""
+    env = dict(os.environ, LAMBDA_PREWARM='true' if prewarm else 'false', PYTHONDONTWRITEBYTECODE='1')
+    times = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', INIT_SCRIPT.format(imports=imports)],
+            cwd=package_dir, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        times.append(float(output.strip().splitlines()[-1]))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help='Fresh interpreters per mode')
+    args = parser.parse_args()
+
+    configure_fake_aws_environment()
+    with tempfile.TemporaryDirectory() as build_dir:
+        package_dir = build_package('handler', build_dir)
+        print(f"previous asset (project dir) : {zipped_size(PROJECT_DIR, PREVIOUS_ASSET_EXCLUDES + ('build',)):>9,} bytes zipped")
+        print(f"handler-only package         : {zipped_size(package_dir):>9,} bytes zipped, "
+              f"{len(os.listdir(package_dir))} files")
+
+        modes = (
+            ('eager imports (previous)', EAGER_IMPORTS, False),
+            ('lazy imports', '', False),
+            ('lazy imports + LAMBDA_PREWARM', '', True),
+        )
+        for name, imports, prewarm in modes:
+            times = init_times(package_dir, args.runs, imports, prewarm)
+            print(f"{name:<30} init p50={statistics.median(times):7.1f}ms  max={max(times):7.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Response size and encode/decode time of the /predict response formats for large outputs.
+
+Runs sample_lambda against the in-process SageMaker stand-in returning an embedding,
+top-k class probabilities and a segmentation mask, and compares the JSON, raw and float32
+formats: bytes on the wire (also gzip compressed, as API Gateway sends them to clients that
+accept it), handler time and client decode time. The prediction cache is on, as in a
+deployment, and every request sends a new image, so all requests are cache misses:
+
+    python benchmarks/bench_response_format.py --iterations 20 --cache-entries 256
+"""
+import argparse
+import base64
+import gzip
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_sagemaker import (  # noqa: E402
+    FakeSageMakerRuntime,
+    configure_fake_aws_environment,
+    quiet_handler_logs
+)
+
+configure_fake_aws_environment()
+
+import sample_lambda  # noqa: E402
+from response_encoding import FLOAT32_TYPE, JSON_TYPE, RAW_TYPE, unpack_float32  # noqa: E402
+
+
+def outputs(rng):
+    return {
+        'embedding (1024)': {'embedding': [rng.gauss(0, 1) for _ in range(1024)]},
+        'probabilities (1000 classes)': {
+            'labels': list(range(1000)),
+            'probabilities': [rng.random() / 1000 for _ in range(1000)]
+        },
+        'mask (256x256)': {'mask': [[rng.random() for _ in range(256)] for _ in range(256)]},
+    }
+
+
+def decode(media_type, wire):
+    if media_type == FLOAT32_TYPE:
+        return unpack_float32(wire)
+    return json.loads(wire)
+
+
+def measure(media_type, iterations):
+    handler_times, decode_times = [], []
+    with quiet_handler_logs():
+        for _ in range(iterations):
+            event = {
+                'headers': {'Content-Type': 'image/jpeg', 'Accept': media_type},
+                'body': base64.b64encode(os.urandom(64)).decode(),
+                'isBase64Encoded': True
+            }
+            start = time.perf_counter()
+            response = sample_lambda.lambda_handler(event, None)
+            handler_times.append(time.perf_counter() - start)
+            assert response['statusCode'] == 200, response
+            assert response['headers']['X-Cache'] != 'HIT', response['headers']
+            body = response['body']
+            wire = base64.b64decode(body) if response.get('isBase64Encoded') else body.encode()
+
+            start = time.perf_counter()
+            decode(media_type, wire)
+            decode_times.append(time.perf_counter() - start)
+    return len(wire), len(gzip.compress(wire)), statistics.median(handler_times), statistics.median(decode_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--cache-entries', type=int, default=256,
+                        help='PREDICTION_CACHE_MAX_ENTRIES of the handler (the deployed default); 0 disables the cache')
+    args = parser.parse_args()
+    os.environ['PREDICTION_CACHE_MAX_ENTRIES'] = str(args.cache_entries)
+
+    print(f"{'output':<29} {'format':<8} {'bytes':>10} {'gzip bytes':>11} {'handler ms':>11} {'decode ms':>10}")
+    for name, prediction in outputs(random.Random(7)).items():
+        sample_lambda._runtime_client = FakeSageMakerRuntime(prediction=prediction)
+        for label, media_type in (('json', JSON_TYPE), ('raw', RAW_TYPE), ('float32', FLOAT32_TYPE)):
+            size, gzip_size, handler, decode_time = measure(media_type, args.iterations)
+            print(f"{name:<29} {label:<8} {size:>10,} {gzip_size:>11,} {handler * 1000:>11.2f} "
+                  f"{decode_time * 1000:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
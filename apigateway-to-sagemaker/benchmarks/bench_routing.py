@@ -0,0 +1,151 @@
+"""Endpoint routing under load: one endpoint vs. static weights vs. EndpointRouter.
+
+Discrete-event simulation with a simulated clock, so it is deterministic and runs in
+seconds. Requests arrive at a fixed rate and are served by simulated endpoints with
+injected latencies and a concurrency limit past which they throttle (429). One endpoint
+also has an outage (503s) in the middle of the run:
+
+    python benchmarks/bench_routing.py --rps 150 --seconds 60
+"""
+import argparse
+import heapq
+import os
+import random
+import statistics
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from botocore.exceptions import ClientError  # noqa: E402
+
+from endpoint_router import EndpointRouter, RouteTarget  # noqa: E402
+
+# name: (concurrent requests before throttling, median latency ms, weight)
+ENDPOINTS = {
+    'endpoint-a': (12, 80, 2),
+    'endpoint-b': (8, 120, 1),
+    'endpoint-c': (6, 60, 1),
+}
+OUTAGE_ENDPOINT = 'endpoint-c'
+
+
+def _error(code, status):
+    return ClientError({'Error': {'Code': code}, 'ResponseMetadata': {'HTTPStatusCode': status}}, 'InvokeEndpoint')
+
+
+class SimulatedEndpoint:
+    """Latency grows with the requests in flight; past ``capacity`` requests are throttled."""
+
+    def __init__(self, name, capacity, latency_ms, rng):
+        self.name = name
+        self.capacity = capacity
+        self.latency_ms = latency_ms
+        self.rng = rng
+        self.in_flight = 0
+        self.outage = (None, None)
+
+    def start(self, now):
+        """Return ``(duration_seconds, error)`` of a request starting at ``now``."""
+        if self.outage[0] is not None and self.outage[0] <= now < self.outage[1]:
+            return 0.02, _error('ServiceUnavailable', 503)
+        if self.in_flight >= self.capacity:
+            return 0.005, _error('ThrottlingException', 429)
+        self.in_flight += 1
+        slowdown = 1 + 0.5 * self.in_flight / self.capacity
+        return self.latency_ms * slowdown * self.rng.lognormvariate(0, 0.25) / 1000, None
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def simulate(strategy, rps, seconds, seed):
+    rng = random.Random(seed)
+    clock = SimulatedClock()
+    endpoints = {
+        name: SimulatedEndpoint(name, capacity, latency_ms, random.Random(f'{seed}-{name}'))
+        for name, (capacity, latency_ms, _) in ENDPOINTS.items()
+    }
+    endpoints[OUTAGE_ENDPOINT].outage = (seconds / 3, seconds / 2)
+    targets = [RouteTarget(name, weight=weight) for name, (_, _, weight) in ENDPOINTS.items()]
+    if strategy == 'single endpoint':
+        targets = targets[:1]
+    router = EndpointRouter(targets, clock=clock, rng=random.Random(seed), open_seconds=5)
+
+    def pick(tried):
+        if strategy == 'static weights':
+            return rng.choices(targets, weights=[t.weight for t in targets])[0]
+        return router.acquire(exclude=tried)
+
+    events = []
+    sequence = 0
+    arrival = 0.0
+    while arrival < seconds:
+        heapq.heappush(events, (arrival, sequence, 'arrive', (arrival, set())))
+        sequence += 1
+        arrival += rng.expovariate(rps)
+
+    latencies, failed, failovers, served = [], 0, 0, Counter()
+    while events:
+        clock.now, _, kind, data = heapq.heappop(events)
+        if kind == 'arrive':
+            arrived_at, tried = data
+            target = pick(tried)
+            duration, error = endpoints[target.endpoint].start(clock.now)
+            heapq.heappush(events, (clock.now + duration, sequence, 'finish', (arrived_at, tried, target, duration, error)))
+            sequence += 1
+            continue
+
+        arrived_at, tried, target, duration, error = data
+        if error is None:
+            endpoints[target.endpoint].in_flight -= 1
+        if strategy != 'static weights':
+            router.release(target, duration * 1000, error)
+        if error is None:
+            latencies.append((clock.now - arrived_at) * 1000)
+            served[target.endpoint] += 1
+            continue
+        tried.add(target)
+        if strategy == 'static weights' or len(tried) == len(targets):
+            failed += 1
+            continue
+        # Fail over to the next target right away
+        failovers += 1
+        heapq.heappush(events, (clock.now, sequence, 'arrive', (arrived_at, tried)))
+        sequence += 1
+
+    latencies.sort()
+    total = len(latencies) + failed
+    return {
+        'success_rate': len(latencies) / total,
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(0.95 * (len(latencies) - 1))],
+        'p99': latencies[int(0.99 * (len(latencies) - 1))],
+        'failovers': failovers,
+        'served': served
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rps', type=float, default=150)
+    parser.add_argument('--seconds', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{args.rps:g} requests/s for {args.seconds:g}s; {OUTAGE_ENDPOINT} returns 503s "
+          f"from {args.seconds / 3:g}s to {args.seconds / 2:g}s")
+    for strategy in ('single endpoint', 'static weights', 'ewma router'):
+        result = simulate(strategy, args.rps, args.seconds, args.seed)
+        served = ' '.join(f"{name}={count}" for name, count in sorted(result['served'].items()))
+        print(f"{strategy:<16} success={result['success_rate']:6.1%}  p50={result['p50']:6.1f}ms  "
+              f"p95={result['p95']:6.1f}ms  p99={result['p99']:6.1f}ms  failovers={result['failovers']:<5} {served}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Percentiles and histograms of the EMF metrics written by telemetry.Metrics.
+
+Reads Lambda log output (sam local, CloudWatch log exports, benchmark logs) from files or
+stdin, picks out the embedded metric format records and summarises every metric, so phase
+timings can be compared locally without CloudWatch:
+
+    BENCH_EMF_LOG=emf.log python benchmarks/bench_batch.py && python benchmarks/emf_report.py emf.log
+    python benchmarks/emf_report.py exported-log-events.txt --metric InvokeEndpoint
+"""
+import argparse
+import fileinput
+import json
+from collections import defaultdict
+
+HISTOGRAM_BINS = 10
+HISTOGRAM_WIDTH = 40
+
+
+def parse_records(lines):
+    """Yield the EMF records found in log lines; the JSON may follow a log prefix."""
+    for line in lines:
+        start = line.find('{"_aws"')
+        if start == -1:
+            start = line.find('{')
+        if start == -1:
+            continue
+        try:
+            record = json.loads(line[start:])
+        except ValueError:
+            continue
+        if isinstance(record, dict) and '_aws' in record:
+            yield record
+
+
+def collect(records):
+    """Return ``{(namespace, service, metric): (unit, [values])}``."""
+    metrics = defaultdict(lambda: (None, []))
+    for record in records:
+        for directive in record['_aws'].get('CloudWatchMetrics', []):
+            for definition in directive.get('Metrics', []):
+                name = definition['Name']
+                if name not in record:
+                    continue
+                values = record[name] if isinstance(record[name], list) else [record[name]]
+                key = (directive.get('Namespace'), record.get('Service'), name)
+                metrics[key] = (definition.get('Unit'), metrics[key][1] + values)
+    return metrics
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def histogram(values):
+    """ASCII histogram of ``values`` in equal-width bins."""
+    low, high = min(values), max(values)
+    width = (high - low) / HISTOGRAM_BINS or 1
+    counts = [0] * HISTOGRAM_BINS
+    for value in values:
+        counts[min(HISTOGRAM_BINS - 1, int((value - low) / width))] += 1
+    peak = max(counts)
+    return [
+        f"    {low + i * width:10.2f} | {'#' * round(HISTOGRAM_WIDTH * count / peak):<{HISTOGRAM_WIDTH}} {count}"
+        for i, count in enumerate(counts)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('files', nargs='*', help='Log files to read (default: stdin)')
+    parser.add_argument('--metric', action='append', help='Only report these metrics (repeatable)')
+    parser.add_argument('--no-histogram', action='store_true')
+    args = parser.parse_args()
+
+    metrics = collect(parse_records(fileinput.input(args.files or ['-'])))
+    if not metrics:
+        print('No EMF records found')
+        return
+
+    for (namespace, service, name), (unit, values) in sorted(metrics.items(), key=lambda item: tuple(map(str, item[0]))):
+        if args.metric and name not in args.metric:
+            continue
+        ordered = sorted(values)
+        print(f"{namespace}/{service} {name} ({unit}): n={len(ordered)} "
+              f"p50={percentile(ordered, 0.5):.2f} p90={percentile(ordered, 0.9):.2f} "
+              f"p99={percentile(ordered, 0.99):.2f} max={ordered[-1]:.2f}")
+        if not args.no_histogram and unit == 'Milliseconds' and len(ordered) > 1:
+            print('\n'.join(histogram(ordered)))
+
+
+if __name__ == '__main__':
+    main()
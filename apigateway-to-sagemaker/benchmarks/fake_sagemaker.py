@@ -0,0 +1,142 @@
+"""Local stand-ins for the SageMaker runtime and other AWS services used by the benchmarks."""
+import contextlib
+import io
+import json
+import os
+import random
+import time
+
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+
+DEFAULT_PREDICTION = {'label': 'cat', 'score': 0.98}
+
+
+def configure_fake_aws_environment(endpoint_name='benchmark-endpoint'):
+    """Set the environment variables the handler and botocore expect, without touching real AWS."""
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    os.environ.setdefault('SAGEMAKER_ENDPOINT_NAME', endpoint_name)
+    # Benchmarks measure the uncached path unless they enable the prediction cache themselves
+    os.environ.setdefault('PREDICTION_CACHE_MAX_ENTRIES', '0')
+
+
+@contextlib.contextmanager
+def quiet_handler_logs():
+    """
+    Discard anything the handler prints while benchmarking it, or append it to the file
+    named by ``BENCH_EMF_LOG`` to summarise the EMF metrics with emf_report.py afterwards.
+    """
+    with open(os.environ.get('BENCH_EMF_LOG') or os.devnull, 'a') as log, contextlib.redirect_stdout(log):
+        yield
+
+
+def invoke_endpoint_response(prediction=None):
+    """Build an invoke_endpoint response dict with a readable streaming body."""
+    payload = json.dumps(DEFAULT_PREDICTION if prediction is None else prediction).encode()
+    return {
+        'Body': StreamingBody(io.BytesIO(payload), len(payload)),
+        'ContentType': 'application/json'
+    }
+
+
+class FakeSageMakerRuntime:
+    """Minimal in-process replacement for the ``runtime.sagemaker`` client.
+
+    A JSON array body is treated as a batch and answered with one prediction per item,
+    so the /predict/batch path can be exercised without a real endpoint. Each call takes
+    ``latency`` seconds plus up to ``jitter`` more; ``response_bytes`` pads predictions to
+    about that size, like a model returning embeddings or masks. Load tests pass
+    ``record_calls=False`` so the recorded request bodies do not skew memory measurements.
+    """
+
+    def __init__(self, prediction=None, latency=0.0, jitter=0.0, response_bytes=0, record_calls=True, seed=0):
+        self.prediction = prediction
+        self.latency = latency
+        self.jitter = jitter
+        self.record_calls = record_calls
+        self.rng = random.Random(seed)
+        self.calls = []
+        if response_bytes:
+            base = DEFAULT_PREDICTION if prediction is None else prediction
+            padding = max(0, response_bytes - len(json.dumps(base)))
+            self.prediction = dict(base, padding='x' * padding)
+
+    def _wait(self):
+        delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+
+    def invoke_endpoint(self, **kwargs):
+        if self.record_calls:
+            self.calls.append(kwargs)
+        self._wait()
+        if kwargs.get('ContentType') == 'application/json':
+            instances = json.loads(kwargs['Body'])
+            if isinstance(instances, list):
+                prediction = DEFAULT_PREDICTION if self.prediction is None else self.prediction
+                return invoke_endpoint_response([prediction] * len(instances))
+        return invoke_endpoint_response(self.prediction)
+
+    def invoke_endpoint_with_response_stream(self, **kwargs):
+        """Stream the prediction back in small JSON-lines parts, ``latency`` seconds apart."""
+        if self.record_calls:
+            self.calls.append(kwargs)
+        prediction = DEFAULT_PREDICTION if self.prediction is None else self.prediction
+        tokens = prediction if isinstance(prediction, list) else [prediction]
+
+        def parts():
+            for token in tokens:
+                self._wait()
+                yield {'PayloadPart': {'Bytes': json.dumps(token).encode() + b'\n'}}
+
+        return {'Body': parts(), 'ContentType': 'application/jsonlines'}
+
+
+class StubbedClientFactory:
+    """Drop-in for ``boto3.client`` that returns real botocore clients with stubbed responses.
+
+    Every client is fully constructed (session, endpoint resolution, credentials), so the
+    cost of building it is measured, but no request ever leaves the process. Each new client
+    has one invoke_endpoint reply queued; call ``queue_response`` before reusing it.
+    """
+
+    def __init__(self, real_factory, prediction=None):
+        self.real_factory = real_factory
+        self.prediction = prediction
+        self.clients_created = 0
+        self.stubbers = []
+
+    def __call__(self, service_name, *args, **kwargs):
+        client = self.real_factory(service_name, *args, **kwargs)
+        stubber = Stubber(client)
+        stubber.add_response('invoke_endpoint', invoke_endpoint_response(self.prediction))
+        stubber.activate()
+        self.stubbers.append(stubber)
+        self.clients_created += 1
+        return client
+
+    def queue_response(self):
+        """Queue one invoke_endpoint reply on the most recently created client."""
+        self.stubbers[-1].add_response('invoke_endpoint', invoke_endpoint_response(self.prediction))
+
+
+class FakeDynamoDbClient:
+    """Dict-backed stand-in for the ``get_item``/``put_item`` calls of a DynamoDB client."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.items = {}
+
+    def get_item(self, TableName, Key):
+        if self.latency:
+            time.sleep(self.latency)
+        item = self.items.get((TableName, Key['cache_key']['S']))
+        return {'Item': item} if item else {}
+
+    def put_item(self, TableName, Item):
+        if self.latency:
+            time.sleep(self.latency)
+        self.items[(TableName, Item['cache_key']['S'])] = Item
+        return {}
@@ -0,0 +1,366 @@
+"""Load test of the inference path: the Lambda handler and the OpenWebUI filter end to end.
+
+Each scenario runs in a fresh interpreter, so its peak RSS is its own, against the
+in-process SageMaker stand-in (``--latency``, ``--jitter``, ``--response-bytes``):
+
+- ``handler-json`` and ``handler-binary`` call sample_lambda.lambda_handler with JSON/base64
+  and raw binary proxy events from a thread pool of ``--concurrency`` workers.
+- ``filter`` drives image2sagemaker.Filter.inlet with ``--concurrency`` chats sending
+  ``--images-per-turn`` images each, through a local aiohttp stand-in for API Gateway
+  that runs the handler in threads (one per in-flight request, like Lambda scaling out).
+
+Images cycle through a corpus: the files in ``--corpus`` or random (incompressible, like
+photos) images of ``--image-kb`` sizes. Throughput, latency percentiles, peak RSS and the
+peak and retained allocations per request (measured with tracemalloc on separate sequential
+requests) are printed and, with ``--output``, written as JSON. ``--baseline`` compares a
+run with a previous JSON file and exits with status 1 when a metric is worse by more than
+``--tolerance``:
+
+    python benchmarks/load_test.py --requests 500 --concurrency 16 --output results.json
+    python benchmarks/load_test.py --requests 500 --concurrency 16 --baseline results.json
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FILTER_DIR = os.path.join(os.path.dirname(PROJECT_DIR), 'miscellaneous', 'openwebui')
+sys.path.insert(0, PROJECT_DIR)
+
+from fake_sagemaker import (  # noqa: E402
+    FakeSageMakerRuntime,
+    configure_fake_aws_environment,
+    quiet_handler_logs
+)
+
+SCENARIOS = ('handler-json', 'handler-binary', 'filter')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp')
+
+# metric: True when a larger value is better
+COMPARED_METRICS = {
+    'throughput_rps': True,
+    'p50_ms': False,
+    'p95_ms': False,
+    'p99_ms': False,
+    'peak_rss_mb': False,
+    'alloc_peak_kb': False,
+}
+
+
+def load_corpus(corpus_dir, image_kb):
+    """Return ``(content_type, image_bytes)`` pairs from ``corpus_dir`` or random images."""
+    if not corpus_dir:
+        return [('image/jpeg', os.urandom(size * 1024)) for size in image_kb]
+    corpus = []
+    for file_name in sorted(os.listdir(corpus_dir)):
+        extension = os.path.splitext(file_name)[1].lower()
+        if extension in IMAGE_EXTENSIONS:
+            with open(os.path.join(corpus_dir, file_name), 'rb') as image_file:
+                content_type = 'image/jpeg' if extension == '.jpg' else f'image/{extension[1:]}'
+                corpus.append((content_type, image_file.read()))
+    if not corpus:
+        raise SystemExit(f'No images in {corpus_dir}')
+    return corpus
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def measure_allocations(run_one, samples):
+    """Mean peak (KB) and retained (bytes) traced allocations of ``samples`` sequential requests."""
+    peaks, retained = [], []
+    tracemalloc.start()
+    try:
+        for number in range(samples):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            run_one(number)
+            after, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(after - before)
+    finally:
+        tracemalloc.stop()
+    return statistics.mean(peaks) / 1024, statistics.mean(retained)
+
+
+def summarize(scenario, args, latencies, errors, wall_seconds, allocations):
+    latencies.sort()
+    alloc_peak_kb, alloc_retained_bytes = allocations
+    return {
+        'scenario': scenario,
+        'requests': len(latencies),
+        'concurrency': args.concurrency,
+        'errors': errors,
+        'throughput_rps': len(latencies) / wall_seconds,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': latencies[-1] * 1000,
+        'peak_rss_mb': peak_rss_mb(),
+        'alloc_peak_kb': alloc_peak_kb,
+        'alloc_retained_bytes': alloc_retained_bytes,
+    }
+
+
+def handler_event(scenario, content_type, image):
+    if scenario == 'handler-binary':
+        return {
+            'resource': '/predict',
+            'headers': {'Content-Type': content_type},
+            'body': base64.b64encode(image).decode(),
+            'isBase64Encoded': True
+        }
+    return {
+        'resource': '/predict',
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps({'image': base64.b64encode(image).decode()}),
+        'isBase64Encoded': False
+    }
+
+
+def run_handler(scenario, args, corpus):
+    import sample_lambda
+
+    events = [handler_event(scenario, content_type, image) for content_type, image in corpus]
+
+    def run_one(number):
+        start = time.perf_counter()
+        response = sample_lambda.lambda_handler(events[number % len(events)], None)
+        return time.perf_counter() - start, response['statusCode'] != 200
+
+    with quiet_handler_logs():
+        for number in range(args.warmup):
+            run_one(number)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            outcomes = list(executor.map(run_one, range(args.requests)))
+        wall_seconds = time.perf_counter() - start
+        allocations = measure_allocations(run_one, args.alloc_samples)
+    latencies = [latency for latency, _ in outcomes]
+    errors = sum(failed for _, failed in outcomes)
+    return summarize(scenario, args, latencies, errors, wall_seconds, allocations)
+
+
+async def start_api(executor):
+    """Serve /predict by running the Lambda handler on the proxy event API Gateway would send."""
+    from aiohttp import web
+
+    import sample_lambda
+
+    async def predict(request):
+        event = {
+            'resource': '/predict',
+            'headers': dict(request.headers),
+            'body': await request.text(),
+            'isBase64Encoded': False
+        }
+        response = await asyncio.get_running_loop().run_in_executor(
+            executor, sample_lambda.lambda_handler, event, None
+        )
+        headers = {'Content-Type': 'application/json', **(response.get('headers') or {})}
+        return web.Response(status=response['statusCode'], text=response['body'], headers=headers)
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post('/predict', predict)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://127.0.0.1:{port}'
+
+
+async def run_filter_async(args, corpus):
+    sys.path.insert(0, FILTER_DIR)
+    from image2sagemaker import Filter
+
+    # Format the filter's log records as usual, but do not write them out
+    devnull = open(os.devnull, 'w')
+    for handler in logging.getLogger().handlers:
+        handler.setStream(devnull)
+
+    urls = [
+        f"data:{content_type};base64,{base64.b64encode(image).decode()}"
+        for content_type, image in corpus
+    ]
+
+    def chat_body(number):
+        first = number * args.images_per_turn
+        content = [{'type': 'text', 'text': 'What is in these pictures?'}]
+        content += [
+            {'type': 'image_url', 'image_url': {'url': urls[(first + i) % len(urls)]}}
+            for i in range(args.images_per_turn)
+        ]
+        return {'messages': [{'role': 'user', 'content': content}]}
+
+    async def no_op_emitter(event):
+        pass
+
+    executor = ThreadPoolExecutor(max_workers=args.concurrency * args.images_per_turn)
+    runner, base_url = await start_api(executor)
+    image_filter = Filter()
+    image_filter.valves.sm_base_url = base_url
+    # The stand-in has no usage plan to stay under
+    image_filter.valves.rate_limit_rps = 0
+    image_filter.valves.max_images = args.images_per_turn
+    image_filter.valves.max_concurrent_images = args.images_per_turn
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run_one(number):
+        async with semaphore:
+            start = time.perf_counter()
+            body = await image_filter.inlet(chat_body(number), no_op_emitter)
+            latency = time.perf_counter() - start
+        texts = [part.get('text', '') for part in body['messages'][-1]['content']]
+        return latency, any('could not classify' in text for text in texts)
+
+    try:
+        with quiet_handler_logs():
+            for number in range(args.warmup):
+                await run_one(number)
+            start = time.perf_counter()
+            outcomes = await asyncio.gather(*(run_one(number) for number in range(args.requests)))
+            wall_seconds = time.perf_counter() - start
+
+            # tracemalloc needs a synchronous callable; each sample drives one turn on the loop
+            peaks, retained = [], []
+            tracemalloc.start()
+            for number in range(args.alloc_samples):
+                before, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                await run_one(number)
+                after, peak = tracemalloc.get_traced_memory()
+                peaks.append(peak - before)
+                retained.append(after - before)
+            tracemalloc.stop()
+    finally:
+        await image_filter.on_shutdown()
+        await runner.cleanup()
+        executor.shutdown()
+        devnull.close()
+    latencies = [latency for latency, _ in outcomes]
+    errors = sum(failed for _, failed in outcomes)
+    allocations = (statistics.mean(peaks) / 1024, statistics.mean(retained))
+    return summarize('filter', args, latencies, errors, wall_seconds, allocations)
+
+
+def run_scenario(scenario, args):
+    """Run one scenario in this process and return its results."""
+    configure_fake_aws_environment()
+    import sample_lambda
+
+    sample_lambda._runtime_client = FakeSageMakerRuntime(
+        latency=args.latency, jitter=args.jitter, response_bytes=args.response_bytes, record_calls=False
+    )
+    corpus = load_corpus(args.corpus, args.image_kb)
+    if scenario == 'filter':
+        return asyncio.run(run_filter_async(args, corpus))
+    return run_handler(scenario, args, corpus)
+
+
+def run_in_child(scenario):
+    """Run a scenario in a fresh interpreter so peak RSS and imports are not shared."""
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), *sys.argv[1:], '--child', scenario],
+        capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise SystemExit(f'{scenario} failed:\n{completed.stderr[-4000:]}')
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    """Print the change of every compared metric and return the regressions beyond ``tolerance``."""
+    previous = {result['scenario']: result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get(result['scenario'])
+        if old is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            if not old.get(metric):
+                continue
+            change = (result[metric] - old[metric]) / old[metric]
+            worse = -change if higher_is_better else change
+            flag = 'REGRESSION' if worse > tolerance else ''
+            print(f"{result['scenario']:<15} {metric:<15} {old[metric]:>10.1f} -> {result[metric]:>10.1f} "
+                  f"({change:+7.1%}) {flag}")
+            if flag:
+                regressions.append((result['scenario'], metric))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=300, help='Requests (filter: chat turns) per scenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='Requests (filter: chats) in flight')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--alloc-samples', type=int, default=20, help='Sequential requests traced for allocations')
+    parser.add_argument('--latency', type=float, default=0.02, help='Endpoint latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.01, help='Extra random endpoint latency, up to this many seconds')
+    parser.add_argument('--response-bytes', type=int, default=0, help='Pad each prediction to about this size')
+    parser.add_argument('--image-kb', type=int, nargs='+', default=[64, 256, 1024], help='Random image sizes')
+    parser.add_argument('--corpus', help='Directory of images to send instead of random ones')
+    parser.add_argument('--images-per-turn', type=int, default=2, help='Images per chat turn in the filter scenario')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='Compare with the results in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Allowed relative regression per metric')
+    parser.add_argument('--child', choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_scenario(args.child, args)))
+        return
+
+    results = [run_in_child(scenario) for scenario in args.scenarios]
+    print(f"{'scenario':<15} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6} "
+          f"{'peak RSS MB':>11} {'alloc KB/req':>12} {'retained B/req':>14}")
+    for result in results:
+        print(f"{result['scenario']:<15} {result['throughput_rps']:>8.1f} {result['p50_ms']:>8.1f} "
+              f"{result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['errors']:>6} "
+              f"{result['peak_rss_mb']:>11.1f} {result['alloc_peak_kb']:>12.1f} {result['alloc_retained_bytes']:>14.0f}")
+
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'config': {
+            name: value for name, value in vars(args).items()
+            if name not in ('output', 'baseline', 'tolerance', 'child')
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
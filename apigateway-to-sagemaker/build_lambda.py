@@ -0,0 +1,60 @@
+"""Stage the Lambda deployment packages with only the files the functions need at runtime.
+
+The stack calls build_package() at synth time; it can also be run on its own to inspect
+the packages:
+
+    python build_lambda.py
+"""
+import os
+import shutil
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+BUILD_DIR = os.path.join(PROJECT_DIR, 'build')
+
+# Modules imported by sample_lambda.lambda_handler; boto3 comes with the Lambda runtime
+HANDLER_FILES = (
+    'sample_lambda.py',
+    'async_inference.py',
+    'endpoint_router.py',
+    'image_preprocessing.py',
+    'prediction_cache.py',
+    'response_encoding.py',
+    'telemetry.py',
+)
+
+# The streaming function also runs stream_server.py through run.sh behind the Lambda Web Adapter
+STREAMING_FILES = HANDLER_FILES + (
+    'stream_server.py',
+    'run.sh',
+)
+
+PACKAGES = {
+    'handler': HANDLER_FILES,
+    'streaming': STREAMING_FILES,
+}
+
+
+def build_package(name, build_dir=BUILD_DIR):
+    """Copy the files of package ``name`` into a clean ``build_dir/name`` and return its path."""
+    package_dir = os.path.join(build_dir, name)
+    shutil.rmtree(package_dir, ignore_errors=True)
+    os.makedirs(package_dir)
+    for file_name in PACKAGES[name]:
+        # copy2 keeps run.sh executable
+        shutil.copy2(os.path.join(PROJECT_DIR, file_name), package_dir)
+    return package_dir
+
+
+def package_size(package_dir):
+    """Total size in bytes of the files in a package directory."""
+    return sum(
+        os.path.getsize(os.path.join(root, file_name))
+        for root, _, file_names in os.walk(package_dir)
+        for file_name in file_names
+    )
+
+
+if __name__ == '__main__':
+    for package_name in PACKAGES:
+        path = build_package(package_name)
+        print(f"{package_name:<10} {len(PACKAGES[package_name])} files  {package_size(path):>8,} bytes  {path}")
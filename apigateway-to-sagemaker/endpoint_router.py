@@ -0,0 +1,216 @@
+"""Route inference requests across SageMaker endpoints, production variants and models.
+
+Each Lambda container keeps its own view of the targets: an exponentially weighted moving
+average (EWMA) of their latency, the requests it has in flight on each, and a circuit
+breaker that stops sending to a target after repeated throttling or server errors. Requests
+go to the least-loaded target and fail over to the next one when a target is overloaded.
+"""
+import json
+import random
+import threading
+import time
+from typing import NamedTuple
+
+# Error codes that mean the target is overloaded or unhealthy, not that the request is bad
+RETRYABLE_ERROR_CODES = frozenset({
+    'ThrottlingException',
+    'ServiceUnavailable',
+    'InternalFailure',
+    'InternalDependencyException',
+    'ModelNotReadyException',
+})
+
+
+class RouteTarget(NamedTuple):
+    """One place a request can be sent: an endpoint, optionally pinned to a variant or a model."""
+    endpoint: str
+    variant: str = ''
+    model: str = ''
+    weight: float = 1.0
+
+    @property
+    def name(self):
+        return '/'.join(part for part in (self.endpoint, self.variant, self.model) if part)
+
+    def invoke_args(self):
+        """EndpointName plus the TargetVariant and TargetModel arguments of InvokeEndpoint."""
+        args = {'EndpointName': self.endpoint}
+        if self.variant:
+            args['TargetVariant'] = self.variant
+        if self.model:
+            args['TargetModel'] = self.model
+        return args
+
+
+def parse_targets(raw_targets, default_endpoint='', default_variant=''):
+    """Build RouteTargets from a JSON string or list of ``{"endpoint", "variant", "model", "weight"}``.
+
+    Without targets, the single ``default_endpoint`` (and ``default_variant``) is used.
+    Raises ValueError for malformed entries, and for targets naming different models: the
+    targets share one prediction cache scope, so they must all serve the same predictions.
+    """
+    if isinstance(raw_targets, str):
+        raw_targets = json.loads(raw_targets) if raw_targets.strip() else []
+    if not raw_targets:
+        if not default_endpoint:
+            raise ValueError('No SageMaker endpoint configured')
+        return [RouteTarget(default_endpoint, default_variant)]
+    if not isinstance(raw_targets, list):
+        raise ValueError('SageMaker targets must be a JSON array')
+
+    targets = []
+    for raw_target in raw_targets:
+        if isinstance(raw_target, str):
+            raw_target = {'endpoint': raw_target}
+        if not isinstance(raw_target, dict) or not raw_target.get('endpoint'):
+            raise ValueError(f'Invalid SageMaker target {raw_target!r}: an endpoint is required')
+        weight = raw_target.get('weight', 1)
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight <= 0:
+            raise ValueError(f'Invalid SageMaker target {raw_target!r}: weight must be a positive number')
+        targets.append(RouteTarget(
+            str(raw_target['endpoint']),
+            str(raw_target.get('variant') or ''),
+            str(raw_target.get('model') or ''),
+            float(weight)
+        ))
+    if len({target[:3] for target in targets}) != len(targets):
+        raise ValueError('Duplicate SageMaker targets')
+    models = {target.model for target in targets if target.model}
+    if len(models) > 1:
+        raise ValueError(f'SageMaker targets must serve one model, got {", ".join(sorted(models))}')
+    return targets
+
+
+def is_retryable_error(error):
+    """Return True for throttling (429), server (5xx) and connection errors, which another target may not have."""
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        code = response.get('Error', {}).get('Code', '')
+        status = response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0)
+        return code in RETRYABLE_ERROR_CODES or status == 429 or status >= 500
+    # botocore is imported by the runtime client before any error can be raised
+    from botocore.exceptions import ConnectionError, ReadTimeoutError
+    return isinstance(error, (ConnectionError, ReadTimeoutError))
+
+
+class _TargetHealth:
+    __slots__ = ('ewma_ms', 'in_flight', 'failures', 'open_until')
+
+    def __init__(self):
+        self.ewma_ms = None
+        self.in_flight = 0
+        self.failures = 0
+        self.open_until = 0.0
+
+
+class EndpointRouter:
+    """Least-loaded routing with per-target latency EWMA and circuit breakers.
+
+    A target's load score is its latency EWMA times the requests in flight on it (plus the
+    new one), divided by its weight; targets not measured yet score zero and are tried
+    first. After ``failure_threshold`` consecutive retryable errors a target's circuit opens
+    for ``open_seconds``; then it is half-open and the next failure opens it again, while a
+    success closes it. If every circuit is open, the target that reopens first is used.
+    """
+
+    def __init__(self, targets, ewma_alpha=0.3, failure_threshold=3, open_seconds=30,
+                 clock=time.monotonic, rng=None):
+        if not targets:
+            raise ValueError('EndpointRouter needs at least one target')
+        self.targets = list(targets)
+        self.ewma_alpha = ewma_alpha
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self._health = {target: _TargetHealth() for target in self.targets}
+        self._lock = threading.Lock()
+
+    @property
+    def cache_scope(self):
+        """Identifies the model behind the targets, which all serve the same predictions.
+
+        Every target shares this scope, which is why parse_targets() rejects targets naming
+        different models.
+        """
+        return ','.join(target.name for target in self.targets)
+
+    def _score(self, target, health):
+        return (health.ewma_ms or 0.0) * (health.in_flight + 1) / target.weight
+
+    def acquire(self, exclude=()):
+        """Pick the target for one request and count it as in flight; release() it afterwards."""
+        with self._lock:
+            now = self.clock()
+            candidates = [target for target in self.targets if target not in exclude]
+            if not candidates:
+                raise ValueError('Every target has been excluded')
+            closed = [target for target in candidates if self._health[target].open_until <= now]
+            if closed:
+                scores = {target: self._score(target, self._health[target]) for target in closed}
+                best = min(scores.values())
+                # Ties (typically unmeasured targets) are broken by weight
+                tied = [target for target in closed if scores[target] == best]
+                target = self.rng.choices(tied, weights=[t.weight for t in tied])[0] if len(tied) > 1 else tied[0]
+            else:
+                target = min(candidates, key=lambda t: self._health[t].open_until)
+            self._health[target].in_flight += 1
+            return target
+
+    def release(self, target, latency_ms, error=None):
+        """Record the outcome of a request started with acquire().
+
+        Only retryable errors count against the target; a request the endpoint rejected as
+        invalid says nothing about its health, so it only updates the in-flight count.
+        """
+        with self._lock:
+            health = self._health[target]
+            health.in_flight -= 1
+            if error is None:
+                health.ewma_ms = latency_ms if health.ewma_ms is None else (
+                    self.ewma_alpha * latency_ms + (1 - self.ewma_alpha) * health.ewma_ms
+                )
+                health.failures = 0
+                health.open_until = 0.0
+            elif is_retryable_error(error):
+                health.failures += 1
+                if health.failures >= self.failure_threshold:
+                    health.open_until = self.clock() + self.open_seconds
+
+    def invoke(self, call, on_failover=None):
+        """Run ``call(target)`` on the best target, failing over on retryable errors.
+
+        Each target is tried at most once. Returns ``(target, result)``; the last error is
+        raised when every target failed, and non-retryable errors are raised at once.
+        ``on_failover(target, error)`` is called before moving to the next target.
+        """
+        tried = set()
+        while True:
+            target = self.acquire(exclude=tried)
+            start = self.clock()
+            try:
+                result = call(target)
+            except Exception as error:
+                self.release(target, (self.clock() - start) * 1000, error)
+                tried.add(target)
+                if not is_retryable_error(error) or len(tried) == len(self.targets):
+                    raise
+                if on_failover is not None:
+                    on_failover(target, error)
+                continue
+            self.release(target, (self.clock() - start) * 1000)
+            return target, result
+
+    def snapshot(self):
+        """Current health of every target, for logging and benchmarks."""
+        with self._lock:
+            now = self.clock()
+            return {
+                target.name: {
+                    'ewmaMs': health.ewma_ms,
+                    'inFlight': health.in_flight,
+                    'failures': health.failures,
+                    'open': health.open_until > now
+                }
+                for target, health in self._health.items()
+            }
@@ -0,0 +1,62 @@
+import io
+import os
+
+
+def _load_pillow():
+    """Import Pillow on first use, or return None when it is not installed.
+
+    Pillow is optional: it is not part of the Lambda package and is supplied through a layer
+    when server-side preprocessing is enabled. Importing it lazily keeps it out of the cold
+    start of functions that have the layer but leave preprocessing disabled.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+
+def downscale_image(image_bytes, max_dimension, image_format='JPEG', quality=85):
+    """Shrink an image so its longest side is at most ``max_dimension`` and re-encode it.
+
+    Images that are already small enough and in ``image_format`` are returned unchanged.
+    """
+    Image = _load_pillow()
+    # Pillow reports formats in upper case
+    image_format = image_format.upper()
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        if max(image.size) <= max_dimension and image.format == image_format:
+            return image_bytes
+        # Let the JPEG decoder downscale while decoding, which is much cheaper than a full decode
+        image.draft('RGB', (max_dimension, max_dimension))
+        image.thumbnail((max_dimension, max_dimension))
+        if image.mode not in ('RGB', 'L'):
+            # JPEG has no alpha channel
+            image = image.convert('RGB')
+        output = io.BytesIO()
+        image.save(output, format=image_format, quality=quality)
+    return output.getvalue()
+
+
+def preprocess_image(image_bytes):
+    """Apply the server-side downscaling configured through environment variables.
+
+    Disabled when ``IMAGE_MAX_DIMENSION`` is unset or 0, or when Pillow is not installed.
+    Images Pillow cannot decode are forwarded unchanged so the endpoint can report on them.
+    """
+    max_dimension = int(os.environ.get('IMAGE_MAX_DIMENSION', '0'))
+    if max_dimension <= 0:
+        return image_bytes
+    if _load_pillow() is None:
+        print("IMAGE_MAX_DIMENSION is set but Pillow is not installed; skipping preprocessing")
+        return image_bytes
+    try:
+        return downscale_image(
+            image_bytes,
+            max_dimension,
+            os.environ.get('IMAGE_FORMAT', 'JPEG'),
+            int(os.environ.get('IMAGE_QUALITY', '85'))
+        )
+    except Exception as e:
+        print(f"Image preprocessing failed, forwarding the original image: {e}")
+        return image_bytes
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Container-wide prediction cache, built on first use from environment variables
+_prediction_cache = None
+
+
+def cache_key(image_bytes, scope):
+    """Content address of a prediction: the image bytes plus the model scope (EndpointRouter.cache_scope)."""
+    digest = hashlib.sha256(image_bytes)
+    digest.update(b'\0' + scope.encode())
+    return digest.hexdigest()
+
+
+class LruTtlCache:
+    """In-process LRU cache whose entries expire ``ttl_seconds`` after they are stored."""
+
+    def __init__(self, max_entries, ttl_seconds, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class DynamoDbCacheTier:
+    """Shared cache tier backed by a DynamoDB table keyed on ``cache_key`` with an ``expires_at`` TTL.
+
+    Errors are swallowed so an unavailable table or a corrupt item degrades to a cache miss
+    instead of failing the prediction.
+    """
+
+    def __init__(self, table_name, ttl_seconds, client=None, clock=time.time):
+        self.table_name = table_name
+        self.ttl_seconds = ttl_seconds
+        if client is None:
+            # boto3 is imported on first use to keep it out of the module's import time
+            import boto3
+            client = boto3.client('dynamodb')
+        self.client = client
+        self.clock = clock
+
+    def get(self, key):
+        try:
+            response = self.client.get_item(
+                TableName=self.table_name,
+                Key={'cache_key': {'S': key}}
+            )
+        except Exception as e:
+            print(f"Prediction cache read failed: {e}")
+            return None
+        item = response.get('Item')
+        if not item:
+            return None
+        try:
+            # DynamoDB deletes expired items lazily, so check the TTL ourselves
+            if int(item['expires_at']['N']) <= self.clock():
+                return None
+            return json.loads(item['prediction']['S'])
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Ignoring unreadable prediction cache item: {e!r}")
+            return None
+
+    def put(self, key, value):
+        try:
+            self.client.put_item(
+                TableName=self.table_name,
+                Item={
+                    'cache_key': {'S': key},
+                    'prediction': {'S': json.dumps(value)},
+                    'expires_at': {'N': str(int(self.clock() + self.ttl_seconds))}
+                }
+            )
+        except Exception as e:
+            print(f"Prediction cache write failed: {e}")
+
+
+class PredictionCache:
+    """Two-tier prediction cache: an in-process LRU in front of an optional shared tier."""
+
+    def __init__(self, local, shared=None):
+        self.local = local
+        self.shared = shared
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        if self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                # Promote shared hits so the next lookup in this container stays local
+                self.local.put(key, value)
+                return value
+        return None
+
+    def put(self, key, value):
+        self.local.put(key, value)
+        if self.shared is not None:
+            self.shared.put(key, value)
+
+
+def get_prediction_cache():
+    """Return the container-wide prediction cache, or None when caching is disabled."""
+    global _prediction_cache
+    if _prediction_cache is None:
+        max_entries = int(os.environ.get('PREDICTION_CACHE_MAX_ENTRIES', '256'))
+        ttl_seconds = int(os.environ.get('PREDICTION_CACHE_TTL_SECONDS', '300'))
+        table_name = os.environ.get('PREDICTION_CACHE_TABLE_NAME', '')
+        if max_entries <= 0 and not table_name:
+            return None
+        shared = DynamoDbCacheTier(table_name, ttl_seconds) if table_name else None
+        _prediction_cache = PredictionCache(LruTtlCache(max(max_entries, 0), ttl_seconds), shared)
+    return _prediction_cache
@@ -0,0 +1,152 @@
+"""Content negotiation and compact encodings for /predict responses.
+
+Clients pick the response format with the ``Accept`` header:
+
+- ``application/json`` (the default, also for ``*/*`` and unknown types): ``{"prediction": ...}``.
+- ``application/x-prediction-raw``: the endpoint's response body as it is, with the
+  endpoint's content type, so it is neither parsed nor re-serialized.
+- ``application/x-prediction-float32``: ``{"prediction": ...}`` with every numeric array of
+  at least FLOAT32_MIN_LENGTH values (nested, rectangular lists included) packed as
+  little-endian float32 instead of JSON numbers.
+
+The float32 format is a 4-byte little-endian header length, a JSON header and the packed
+values. In the header each packed array is replaced by
+``{"__float32__": [offset, count], "shape": [...]}``, with the offset and count in values.
+Arrays of integers only stay JSON, since float32 cannot hold every integer exactly.
+"""
+import array
+import base64
+import json
+import struct
+import sys
+
+JSON_TYPE = 'application/json'
+RAW_TYPE = 'application/x-prediction-raw'
+FLOAT32_TYPE = 'application/x-prediction-float32'
+SUPPORTED_TYPES = (JSON_TYPE, RAW_TYPE, FLOAT32_TYPE)
+
+# Registered as binary media types on the API, so API Gateway returns binary bodies as bytes
+BINARY_TYPES = (RAW_TYPE, FLOAT32_TYPE)
+
+# Shorter arrays are left as JSON, where packing would save next to nothing
+FLOAT32_MIN_LENGTH = 16
+FLOAT32_MARKER = '__float32__'
+
+
+def negotiate(accept):
+    """Return the supported media type the ``Accept`` header ranks highest, JSON by default."""
+    best_type, best_quality = JSON_TYPE, 0.0
+    for media_range in (accept or '').split(','):
+        media_type, _, parameters = media_range.partition(';')
+        media_type = media_type.strip().lower()
+        if media_type not in SUPPORTED_TYPES:
+            continue
+        quality = 1.0
+        for parameter in parameters.split(';'):
+            name, _, value = parameter.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    pass
+        # Equal qualities keep the client's order
+        if quality > best_quality and quality > 0:
+            best_type, best_quality = media_type, quality
+    return best_type
+
+
+def _numeric_array(value):
+    """Return ``(values, shape, has_float)`` for a rectangular list of numbers, else None."""
+    if not value:
+        return None
+    if isinstance(value[0], list):
+        parts = [_numeric_array(item) if isinstance(item, list) else None for item in value]
+        if any(part is None or part[1] != parts[0][1] for part in parts):
+            return None
+        values = [number for part in parts for number in part[0]]
+        return values, [len(value)] + parts[0][1], any(part[2] for part in parts)
+    has_float = False
+    for number in value:
+        number_type = type(number)
+        # bool is a subclass of int, but not a number here
+        if number_type is float:
+            has_float = True
+        elif number_type is not int:
+            return None
+    return value, [len(value)], has_float
+
+
+def _pack(value, data):
+    if isinstance(value, dict):
+        return {key: _pack(item, data) for key, item in value.items()}
+    if isinstance(value, list):
+        numeric = _numeric_array(value)
+        if numeric is not None and numeric[2] and len(numeric[0]) >= FLOAT32_MIN_LENGTH:
+            offset = len(data)
+            data.extend(numeric[0])
+            return {FLOAT32_MARKER: [offset, len(numeric[0])], 'shape': numeric[1]}
+        return [_pack(item, data) for item in value]
+    return value
+
+
+def pack_float32(prediction):
+    """Encode ``{"prediction": prediction}`` in the float32 format."""
+    data = array.array('f')
+    header = json.dumps({'prediction': _pack(prediction, data)}, separators=(',', ':')).encode()
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return struct.pack('<I', len(header)) + header + data.tobytes()
+
+
+def _reshape(values, shape):
+    if len(shape) == 1:
+        return values
+    step = len(values) // shape[0]
+    return [_reshape(values[i:i + step], shape[1:]) for i in range(0, len(values), step)]
+
+
+def _unpack(value, data):
+    if isinstance(value, dict):
+        if FLOAT32_MARKER in value:
+            offset, count = value[FLOAT32_MARKER]
+            return _reshape(data[offset:offset + count].tolist(), value['shape'])
+        return {key: _unpack(item, data) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_unpack(item, data) for item in value]
+    return value
+
+
+def unpack_float32(body):
+    """Decode a float32-format body back into ``{"prediction": ...}``."""
+    (header_length,) = struct.unpack_from('<I', body)
+    header = json.loads(body[4:4 + header_length])
+    data = array.array('f')
+    data.frombytes(body[4 + header_length:])
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return _unpack(header, data)
+
+
+def _is_text(content_type):
+    content_type = (content_type or '').lower()
+    return content_type.startswith('text/') or 'json' in content_type
+
+
+def encode_response(media_type, prediction=None, raw_body=None, raw_content_type=None):
+    """Return ``(headers, body, is_base64_encoded)`` of a /predict response in ``media_type``.
+
+    Raw responses send ``raw_body`` with ``raw_content_type``, the others encode
+    ``prediction``. Binary bodies, and text bodies that are not valid UTF-8, are base64
+    encoded for the Lambda proxy integration.
+    """
+    if media_type == RAW_TYPE:
+        if _is_text(raw_content_type):
+            try:
+                return {'Content-Type': raw_content_type}, raw_body.decode(), False
+            except UnicodeDecodeError:
+                pass
+        content_type = raw_content_type or 'application/octet-stream'
+        return {'Content-Type': content_type}, base64.b64encode(raw_body).decode(), True
+    if media_type == FLOAT32_TYPE:
+        return {'Content-Type': FLOAT32_TYPE}, base64.b64encode(pack_float32(prediction)).decode(), True
+    return {'Content-Type': JSON_TYPE}, json.dumps({'prediction': prediction}), False
@@ -0,0 +1,3 @@
+#!/bin/bash
+# Entry point for the streaming Lambda; the Lambda Web Adapter proxies invocations to this server
+exec python3 stream_server.py
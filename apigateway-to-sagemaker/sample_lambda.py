@@ -1,52 +1,446 @@
 import json
-import boto3
 import base64
+import math
 import os
+import async_inference
+from endpoint_router import EndpointRouter, parse_targets
+from image_preprocessing import preprocess_image
+from prediction_cache import cache_key, get_prediction_cache
+from response_encoding import RAW_TYPE, encode_response, negotiate
+from telemetry import Metrics
+
+# API Gateway resource that accepts many images in one request
+BATCH_RESOURCE = '/predict/batch'
+
+# API Gateway resources of the asynchronous mode for large images and slow models
+ASYNC_RESOURCE = '/predict/async'
+RESULT_RESOURCE = '/predict/result/{id}'
+
+# CloudWatch namespace of the per-phase latency and payload size metrics
+METRICS_NAMESPACE = 'SageMakerInference'
+
+# SageMaker runtime client, built once per container and reused across warm invocations.
+# boto3 and botocore are imported when the client is built, so importing this module stays
+# cheap; set LAMBDA_PREWARM to build it during the init phase instead (see the end of file).
+_runtime_client = None
+
+
+# Router over the configured endpoints/variants, with this container's view of their health
+_router = None
+
+
+def _runtime_client_config():
+    """Build the botocore Config for the SageMaker runtime client from environment variables.
+
+    With several routing targets botocore makes a single attempt, so a throttled or failing
+    target is left to the router to fail over instead of being retried with backoff first.
+    """
+    from botocore.config import Config
+    max_attempts = int(os.environ.get('SAGEMAKER_MAX_ATTEMPTS', '3'))
+    if len(get_router().targets) > 1:
+        # botocore's max_attempts counts retries on top of the first attempt
+        max_attempts = 0
+    return Config(
+        max_pool_connections=int(os.environ.get('SAGEMAKER_MAX_POOL_CONNECTIONS', '10')),
+        connect_timeout=float(os.environ.get('SAGEMAKER_CONNECT_TIMEOUT', '2')),
+        read_timeout=float(os.environ.get('SAGEMAKER_READ_TIMEOUT', '25')),
+        tcp_keepalive=True,
+        retries={
+            'max_attempts': max_attempts,
+            'mode': os.environ.get('SAGEMAKER_RETRY_MODE', 'adaptive')
+        }
+    )
+
+
+def get_runtime_client():
+    """Return the container-wide SageMaker runtime client, creating it on first use."""
+    global _runtime_client
+    if _runtime_client is None:
+        import boto3
+        _runtime_client = boto3.client('runtime.sagemaker', config=_runtime_client_config())
+    return _runtime_client
+
+
+def get_router():
+    """Return the container-wide endpoint router, built on first use from environment variables.
+
+    ``SAGEMAKER_TARGETS`` holds a JSON array of ``{"endpoint", "variant", "model", "weight"}``
+    targets; without it every request goes to ``SAGEMAKER_ENDPOINT_NAME`` (and
+    ``SAGEMAKER_TARGET_VARIANT``).
+    """
+    global _router
+    if _router is None:
+        _router = EndpointRouter(
+            parse_targets(
+                os.environ.get('SAGEMAKER_TARGETS', ''),
+                os.environ.get('SAGEMAKER_ENDPOINT_NAME', ''),
+                os.environ.get('SAGEMAKER_TARGET_VARIANT', '')
+            ),
+            ewma_alpha=float(os.environ.get('SAGEMAKER_ROUTER_EWMA_ALPHA', '0.3')),
+            failure_threshold=int(os.environ.get('SAGEMAKER_CIRCUIT_FAILURE_THRESHOLD', '3')),
+            open_seconds=float(os.environ.get('SAGEMAKER_CIRCUIT_OPEN_SECONDS', '30'))
+        )
+    return _router
+
+
+def _log_failover(target, error):
+    print(f"Target {target.name} failed ({error}); failing over")
+
+
+def _is_binary_request(event):
+    """Return True when API Gateway delivered the body as binary (a binary media type was sent)."""
+    if not event.get('isBase64Encoded'):
+        return False
+    headers = event.get('headers') or {}
+    content_type = next((v for k, v in headers.items() if k.lower() == 'content-type'), '')
+    return not content_type.startswith('application/json')
+
+
+def _cache_bypassed(event):
+    """Return True when the client asked to skip the prediction cache with ``Cache-Control: no-cache``."""
+    headers = event.get('headers') or {}
+    cache_control = next((v for k, v in headers.items() if k.lower() == 'cache-control'), '')
+    return 'no-cache' in cache_control.lower()
+
+
+def _accepted_type(event):
+    """Return the /predict response media type negotiated from the ``Accept`` header."""
+    headers = event.get('headers') or {}
+    return negotiate(next((v for k, v in headers.items() if k.lower() == 'accept'), ''))
+
+
+def _extract_image(event, metrics):
+    """Return the raw image bytes carried by the event.
+
+    Binary requests (``image/*`` or ``application/octet-stream``) arrive base64 encoded by
+    API Gateway and are decoded exactly once, without a JSON round-trip. JSON requests keep
+    the original ``{"image": "<base64>"}`` contract.
+    """
+    body = event.get('body') or ''
+    if _is_binary_request(event):
+        with metrics.timer('Base64Decode'):
+            return base64.b64decode(body)
+
+    with metrics.timer('BodyParse'):
+        image_data = json.loads(body).get('image', '') if body else ''
+    if not image_data:
+        return b''
+    # Decode the base64 image
+    with metrics.timer('Base64Decode'):
+        return base64.b64decode(image_data)
+
+
+def _pack_mini_batches(items, batch_size):
+    """Split ``items`` into consecutive mini-batches of at most ``batch_size`` entries."""
+    return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+
+def _invoke_mini_batch(runtime_client, router, content_type, batch):
+    """Run one mini-batch of ``(index, image_bytes)`` pairs through the endpoint.
+
+    Images are preprocessed like /predict images first. ``application/json`` sends the batch
+    as a JSON array of base64 strings in a single call and expects a JSON array of predictions
+    back (optionally under a ``predictions`` key). ``application/x-image`` sends each image as
+    its own raw body. Failures are returned as per-item errors instead of being raised. Every
+    call is routed, and fails over, on its own.
+    """
+    batch = [(index, preprocess_image(image_bytes)) for index, image_bytes in batch]
+    if content_type != 'application/json':
+        results = []
+        for index, image_bytes in batch:
+            try:
+                _, response = router.invoke(lambda target: runtime_client.invoke_endpoint(
+                    ContentType=content_type,
+                    Body=image_bytes,
+                    Accept='application/json',
+                    **target.invoke_args()
+                ), _log_failover)
+                results.append((index, {'prediction': json.loads(response['Body'].read().decode())}))
+            except Exception as e:
+                results.append((index, {'error': str(e)}))
+        return results
+
+    try:
+        body = json.dumps([base64.b64encode(image_bytes).decode() for _, image_bytes in batch])
+        _, response = router.invoke(lambda target: runtime_client.invoke_endpoint(
+            ContentType=content_type,
+            Body=body,
+            Accept='application/json',
+            **target.invoke_args()
+        ), _log_failover)
+        predictions = json.loads(response['Body'].read().decode())
+        if isinstance(predictions, dict):
+            predictions = predictions.get('predictions')
+        if not isinstance(predictions, list) or len(predictions) != len(batch):
+            raise ValueError(f'Expected {len(batch)} predictions from the endpoint')
+    except Exception as e:
+        return [(index, {'error': str(e)}) for index, _ in batch]
+
+    return [(index, {'prediction': prediction}) for (index, _), prediction in zip(batch, predictions)]
+
+
+def _handle_batch(runtime_client, router, event, metrics):
+    """Run every image of a ``{"images": [...]}`` request and return results in input order.
+
+    Each image goes through the prediction cache like a /predict image, so only cache misses
+    are sent to the endpoint.
+    """
+    try:
+        images = json.loads(event.get('body') or '{}')['images']
+    except (json.JSONDecodeError, KeyError, TypeError):
+        return {
+            'statusCode': 400,
+            'body': json.dumps('Expected a JSON body of the form {"images": [...]}')
+        }
+    if not isinstance(images, list) or not images:
+        return {
+            'statusCode': 400,
+            'body': json.dumps('No images provided')
+        }
+
+    batch_size = max(1, int(os.environ.get('SAGEMAKER_BATCH_SIZE', '8')))
+    concurrency = max(1, int(os.environ.get('SAGEMAKER_BATCH_CONCURRENCY', '4')))
+    content_type = os.environ.get('SAGEMAKER_BATCH_CONTENT_TYPE', 'application/json')
+    cache = get_prediction_cache()
+    bypass_cache = _cache_bypassed(event)
+
+    results = [None] * len(images)
+    pending = []
+    keys = {}
+    for index, image_data in enumerate(images):
+        if not isinstance(image_data, str) or not image_data:
+            results[index] = {'error': 'No image data provided'}
+            continue
+        try:
+            image_bytes = base64.b64decode(image_data)
+        except ValueError as e:
+            results[index] = {'error': f'Invalid base64 image: {e}'}
+            continue
+        if cache:
+            keys[index] = cache_key(image_bytes, router.cache_scope)
+            if not bypass_cache:
+                prediction = cache.get(keys[index])
+                metrics.put('CacheHit', 0 if prediction is None else 1, 'Count')
+                if prediction is not None:
+                    results[index] = {'prediction': prediction}
+                    continue
+        pending.append((index, image_bytes))
+
+    batches = _pack_mini_batches(pending, batch_size)
+    if batches:
+        # Mini-batches run concurrently; the shared client is thread-safe
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(batches))) as executor:
+            batch_results = executor.map(
+                lambda batch: _invoke_mini_batch(runtime_client, router, content_type, batch),
+                batches
+            )
+            for batch_result in batch_results:
+                for index, result in batch_result:
+                    results[index] = result
+                    if cache and 'prediction' in result:
+                        cache.put(keys[index], result['prediction'])
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'predictions': [dict(index=index, **result) for index, result in enumerate(results)]
+        })
+    }
+
+
+def stream_prediction(runtime_client, router, image_bytes, accept='application/jsonlines'):
+    """Yield the endpoint's response payload parts as they arrive from InvokeEndpointWithResponseStream.
+
+    Starting the stream is routed and fails over like any other call; once parts have been
+    sent, a failing stream is raised to the caller.
+    """
+    _, response = router.invoke(lambda target: runtime_client.invoke_endpoint_with_response_stream(
+        ContentType='application/x-image',
+        Body=image_bytes,
+        Accept=accept,
+        **target.invoke_args()
+    ), _log_failover)
+    for stream_event in response['Body']:
+        if 'PayloadPart' in stream_event:
+            yield stream_event['PayloadPart']['Bytes']
+        elif 'ModelStreamError' in stream_event or 'InternalStreamFailure' in stream_event:
+            error = stream_event.get('ModelStreamError') or stream_event.get('InternalStreamFailure')
+            raise RuntimeError(error.get('Message', 'Model stream failed'))
+
 
 def lambda_handler(event, context):
-    # Initialize SageMaker runtime client
-    runtime_client = boto3.client('runtime.sagemaker')
-    
+    # Per-phase latencies and payload sizes are written as one EMF record per invocation
+    metrics = Metrics(METRICS_NAMESPACE, 'SageMakerLambda')
+    metrics.set_property('requestId', getattr(context, 'aws_request_id', None))
+    try:
+        response = _handle_request(event, metrics)
+    except Exception as e:
+        response = {
+            'statusCode': 500,
+            'body': json.dumps({
+                'error': str(e)
+            })
+        }
+    metrics.put('Errors', 1 if response['statusCode'] >= 500 else 0, 'Count')
+    metrics.flush()
+    return response
+
+
+def _handle_request(event, metrics):
+    # Reuse the SageMaker runtime client across warm invocations
+    runtime_client = get_runtime_client()
+
+    # Requests are routed across the configured endpoints/variants
+    router = get_router()
+    metrics.put('RequestBytes', len(event.get('body') or ''), 'Bytes')
+
+    if event.get('resource') == BATCH_RESOURCE:
+        with metrics.timer('BatchInvoke'):
+            return _handle_batch(runtime_client, router, event, metrics)
+
+    if event.get('resource') == RESULT_RESOURCE:
+        return _handle_result(event, metrics)
+
+    # Get the image data from the event, either as a raw binary body or
+    # as a base64 encoded string in a JSON body
     try:
-        # Get the endpoint name from environment variable
-        endpoint_name = os.environ['SAGEMAKER_ENDPOINT_NAME']
-        
-        # Get the image data from the event
-        # Assuming the image is passed as base64 encoded string
-        print(event)
-        body = json.loads(event.get("body",""))
-        image_data = body.get('image',"")
-        if not image_data:
+        image_bytes = _extract_image(event, metrics)
+    except (ValueError, AttributeError, TypeError) as e:
+        # Malformed JSON or base64 (json.JSONDecodeError and binascii.Error are ValueErrors)
+        return {
+            'statusCode': 400,
+            'body': json.dumps(f'Invalid request body: {e}')
+        }
+    if not image_bytes:
+        return {
+            'statusCode': 400,
+            'body': json.dumps('No image data provided')
+        }
+    metrics.put('ImageBytes', len(image_bytes), 'Bytes')
+
+    if event.get('resource') == ASYNC_RESOURCE:
+        return _handle_async(runtime_client, router, image_bytes, metrics)
+
+    media_type = _accepted_type(event)
+    metrics.set_property('responseType', media_type)
+
+    # Serve repeated images from the prediction cache unless the client bypasses it. The cache
+    # holds parsed predictions, so raw responses, which pass the endpoint's body through
+    # untouched, never use it.
+    cache = get_prediction_cache() if media_type != RAW_TYPE else None
+    key = cache_key(image_bytes, router.cache_scope) if cache else None
+    bypass_cache = _cache_bypassed(event)
+    if cache and not bypass_cache:
+        prediction = cache.get(key)
+        metrics.put('CacheHit', 0 if prediction is None else 1, 'Count')
+        if prediction is not None:
+            headers, body, is_base64 = encode_response(media_type, prediction)
             return {
-                'statusCode': 400,
-                'body': json.dumps('No image data provided')
+                'statusCode': 200,
+                'headers': {'X-Cache': 'HIT', **headers},
+                'body': body,
+                'isBase64Encoded': is_base64
             }
-            
-        # Decode the base64 image
-        image_bytes = base64.b64decode(image_data)
-        
-        # Invoke the SageMaker endpoint
-        response = runtime_client.invoke_endpoint(
-            EndpointName=endpoint_name,
+
+    # Downscale and re-encode large images when server-side preprocessing is enabled
+    with metrics.timer('Preprocess'):
+        image_bytes = preprocess_image(image_bytes)
+
+    # Invoke the least-loaded target, failing over when it is throttled or unhealthy
+    def on_failover(target, error):
+        _log_failover(target, error)
+        metrics.put('Failovers', 1, 'Count')
+
+    with metrics.timer('InvokeEndpoint'):
+        target, response = router.invoke(lambda target: runtime_client.invoke_endpoint(
             ContentType='application/x-image',
             Body=image_bytes,
-            Accept='application/json'
+            Accept='application/json',
+            **target.invoke_args()
+        ), on_failover)
+    metrics.set_property('endpoint', target.name)
+
+    # Get the prediction results; raw responses pass the body through unparsed
+    with metrics.timer('ResponseParse'):
+        response_body = response['Body'].read()
+        prediction = None
+        if media_type != RAW_TYPE:
+            prediction = json.loads(response_body.decode())
+    metrics.put('ResponseBytes', len(response_body), 'Bytes')
+
+    if cache:
+        cache.put(key, prediction)
+
+    with metrics.timer('ResponseEncode'):
+        headers, body, is_base64 = encode_response(
+            media_type, prediction, response_body, response.get('ContentType')
         )
-        
-        # Get the prediction results
-        prediction = json.loads(response['Body'].read().decode())
-        
+    metrics.put('EncodedResponseBytes', len(body), 'Bytes')
+
+    return {
+        'statusCode': 200,
+        'headers': {'X-Cache': ('BYPASS' if bypass_cache else 'MISS') if cache else 'DISABLED', **headers},
+        'body': body,
+        'isBase64Encoded': is_base64
+    }
+
+
+def _handle_async(runtime_client, router, image_bytes, metrics):
+    """Start an asynchronous inference and return its request ID without waiting for the model."""
+    with metrics.timer('Preprocess'):
+        image_bytes = preprocess_image(image_bytes)
+    # Async inference needs an endpoint created with an AsyncInferenceConfig
+    endpoint_name = os.environ.get('SAGEMAKER_ASYNC_ENDPOINT_NAME') or router.targets[0].endpoint
+    metrics.set_property('endpoint', endpoint_name)
+    with metrics.timer('AsyncSubmit'):
+        request_id = async_inference.submit(runtime_client, endpoint_name, image_bytes)
+    return {
+        'statusCode': 202,
+        'body': json.dumps({
+            'requestId': request_id,
+            'status': async_inference.PENDING,
+            'resultPath': RESULT_RESOURCE.replace('{id}', request_id)
+        })
+    }
+
+
+def _handle_result(event, metrics):
+    """Return the outcome of an async request, waiting up to ``?wait=<seconds>`` while it is pending."""
+    request_id = (event.get('pathParameters') or {}).get('id', '')
+    try:
+        wait_seconds = float((event.get('queryStringParameters') or {}).get('wait') or 0)
+    except ValueError:
+        wait_seconds = math.nan
+    if not math.isfinite(wait_seconds):
         return {
-            'statusCode': 200,
-            'body': json.dumps({
-                'prediction': prediction
-            })
+            'statusCode': 400,
+            'body': json.dumps('wait must be a number of seconds')
         }
-        
-    except Exception as e:
+    wait_seconds = max(0.0, min(wait_seconds, async_inference.MAX_WAIT_SECONDS))
+    with metrics.timer('AsyncResult'):
+        result = async_inference.get_result(request_id, wait_seconds) if request_id else None
+    if result is None:
         return {
-            'statusCode': 500,
-            'body': json.dumps({
-                'error': str(e)
-            })
+            'statusCode': 404,
+            'body': json.dumps('Unknown or expired request ID')
         }
+    return {
+        'statusCode': 202 if result['status'] == async_inference.PENDING else 200,
+        'body': json.dumps(result)
+    }
+
+
+def prewarm():
+    """Build the runtime client, router and prediction cache ahead of the first request.
+
+    Called at import time when ``LAMBDA_PREWARM`` is true, so the work happens in the init
+    phase, which provisioned concurrency and SnapStart run before any traffic arrives.
+    """
+    get_runtime_client()
+    get_router()
+    get_prediction_cache()
+
+
+if os.environ.get('LAMBDA_PREWARM', 'false').lower() == 'true':
+    prewarm()
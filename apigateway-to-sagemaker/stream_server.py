@@ -0,0 +1,90 @@
+import base64
+import json
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from image_preprocessing import preprocess_image
+from sample_lambda import get_router, get_runtime_client, stream_prediction
+
+# Streaming mode runs behind the AWS Lambda Web Adapter, which forwards each invocation
+# to this HTTP server and relays the chunked response back as a Lambda response stream.
+# Python managed runtimes cannot stream responses on their own.
+
+
+class StreamingPredictHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        # Readiness check used by the Lambda Web Adapter
+        self._send_json(200, {'status': 'ok'})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        content_type = self.headers.get('Content-Type', 'application/json')
+        accept = os.environ.get('SAGEMAKER_STREAM_ACCEPT', 'application/jsonlines')
+
+        try:
+            # Raw binary uploads are forwarded as-is; JSON keeps the {"image": "<base64>"} contract
+            if content_type.startswith('application/json'):
+                image_bytes = base64.b64decode(json.loads(body or b'{}').get('image', ''))
+            else:
+                image_bytes = body
+        except (ValueError, AttributeError, TypeError) as e:
+            # Malformed JSON and base64 (json.JSONDecodeError and binascii.Error are ValueErrors)
+            # or JSON that is not an object are client errors, as on the buffered /predict route
+            self._send_json(400, {'error': f'Invalid request body: {e}'})
+            return
+        if not image_bytes:
+            self._send_json(400, 'No image data provided')
+            return
+
+        try:
+            chunks = stream_prediction(
+                get_runtime_client(),
+                get_router(),
+                preprocess_image(image_bytes),
+                accept
+            )
+            # Pull the first chunk before committing to a 200 so invoke errors still map to a 500
+            first_chunk = next(chunks, b'')
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', accept)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            self._write_chunk(first_chunk)
+            for chunk in chunks:
+                self._write_chunk(chunk)
+        except Exception as e:
+            # The status line is already sent, so report late failures in-band
+            self._write_chunk(json.dumps({'error': str(e)}).encode() + b'\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, chunk):
+        if chunk:
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.flush()
+
+    def _send_json(self, status_code, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        print(f"stream_server: {format % args}")
+
+
+def main():
+    port = int(os.environ.get('PORT', '8080'))
+    ThreadingHTTPServer(('0.0.0.0', port), StreamingPredictHandler).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Per-invocation performance telemetry as CloudWatch Embedded Metric Format (EMF) records.
+
+The same module ships with the inference Lambda (apigateway-to-sagemaker) and the KB sync
+Lambdas (bedrock-kb-sync/lambda/kb_sync); keep the two copies identical.
+
+Metrics are collected on a Metrics object during an invocation and written to stdout as
+EMF JSON lines by ``flush()``; CloudWatch turns them into metrics without any API calls.
+When the AWS X-Ray SDK is available and ``TELEMETRY_XRAY_SAMPLE_RATE`` is above zero, a
+sampled share of invocations also records every timed phase as an X-Ray subsegment.
+"""
+import contextlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+# EMF allows at most 100 values per metric in one record
+MAX_VALUES_PER_RECORD = 100
+
+# True until the first invocation of this container has flushed its metrics
+_cold_start = True
+
+
+def _xray_recorder():
+    """Import the X-Ray SDK on first use, or return None when it is not installed."""
+    try:
+        from aws_xray_sdk.core import xray_recorder
+    except ImportError:  # the X-Ray SDK is optional
+        return None
+    return xray_recorder
+
+
+class Metrics:
+    """Metrics of one invocation, emitted as EMF records with a single ``Service`` dimension."""
+
+    def __init__(self, namespace, service, xray_sample_rate=None, stream=None):
+        if xray_sample_rate is None:
+            xray_sample_rate = float(os.environ.get('TELEMETRY_XRAY_SAMPLE_RATE', '0'))
+        self.namespace = namespace
+        self.service = service
+        self.stream = stream
+        # Only sampled invocations pay for importing the X-Ray SDK
+        self._recorder = _xray_recorder() if random.random() < xray_sample_rate else None
+        self.traced = self._recorder is not None
+        self._values = {}
+        self._units = {}
+        self._properties = {}
+        self._lock = threading.Lock()
+        self.put('ColdStart', 1 if _cold_start else 0, 'Count')
+
+    def put(self, name, value, unit='Milliseconds'):
+        """Record one value; a metric put several times keeps every value."""
+        with self._lock:
+            self._values.setdefault(name, []).append(value)
+            self._units[name] = unit
+
+    def set_property(self, name, value):
+        """Attach a searchable, non-metric field (request ID, endpoint, ...) to the records."""
+        with self._lock:
+            self._properties[name] = value
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """Time the block in milliseconds as metric ``name`` (and as an X-Ray subsegment when sampled)."""
+        with self._subsegment(name):
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.put(name, (time.perf_counter() - start) * 1000)
+
+    def _subsegment(self, name):
+        if not self.traced:
+            return contextlib.nullcontext()
+        return self._recorder.in_subsegment(name)
+
+    def records(self):
+        """Build the EMF records, splitting metrics with more than 100 values across records."""
+        with self._lock:
+            values = {name: list(metric_values) for name, metric_values in self._values.items()}
+            units = dict(self._units)
+            properties = dict(self._properties)
+
+        records = []
+        chunk = 0
+        while True:
+            metrics = {
+                name: metric_values[chunk * MAX_VALUES_PER_RECORD:(chunk + 1) * MAX_VALUES_PER_RECORD]
+                for name, metric_values in values.items()
+            }
+            metrics = {name: metric_values for name, metric_values in metrics.items() if metric_values}
+            if not metrics:
+                return records
+            record = {
+                '_aws': {
+                    'Timestamp': int(time.time() * 1000),
+                    'CloudWatchMetrics': [{
+                        'Namespace': self.namespace,
+                        'Dimensions': [['Service']],
+                        'Metrics': [{'Name': name, 'Unit': units[name]} for name in metrics]
+                    }]
+                },
+                'Service': self.service,
+                **properties
+            }
+            for name, metric_values in metrics.items():
+                record[name] = metric_values[0] if len(metric_values) == 1 else metric_values
+            records.append(record)
+            chunk += 1
+
+    def flush(self):
+        """Write the EMF records as JSON lines; later invocations of this container are warm."""
+        global _cold_start
+        stream = self.stream or sys.stdout
+        for record in self.records():
+            stream.write(json.dumps(record, separators=(',', ':')) + '\n')
+        stream.flush()
+        _cold_start = False
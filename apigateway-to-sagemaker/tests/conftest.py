@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+from botocore.stub import Stubber
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The handler modules are deployed as a flat package, so import them the same way; the
+# local SageMaker stand-ins of the benchmarks double as test fakes
+sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'benchmarks'))
+
+# Keep botocore away from real credentials
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+import prediction_cache  # noqa: E402
+import sample_lambda  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def handler_environment(monkeypatch):
+    """Point the handler at a test endpoint and give every test fresh container-wide state."""
+    monkeypatch.setenv('SAGEMAKER_ENDPOINT_NAME', 'test-endpoint')
+    monkeypatch.setenv('PREDICTION_CACHE_MAX_ENTRIES', '0')
+    for name in ('SAGEMAKER_TARGETS', 'SAGEMAKER_TARGET_VARIANT', 'PREDICTION_CACHE_TABLE_NAME', 'IMAGE_MAX_DIMENSION'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(sample_lambda, '_runtime_client', None)
+    monkeypatch.setattr(sample_lambda, '_router', None)
+    monkeypatch.setattr(prediction_cache, '_prediction_cache', None)
+
+
+@pytest.fixture
+def runtime_stubber():
+    """Stub the handler's SageMaker runtime client; every queued response must be used."""
+    stubber = Stubber(sample_lambda.get_runtime_client())
+    stubber.activate()
+    yield stubber
+    stubber.assert_no_pending_responses()
+    stubber.deactivate()
@@ -0,0 +1,243 @@
+import io
+import json
+
+import boto3
+import pytest
+from botocore.response import StreamingBody
+from botocore.stub import ANY, Stubber
+
+import async_inference
+import sample_lambda
+
+OUTPUT = 's3://async-output/results/req-1.out'
+FAILURE = 's3://async-output/failures/req-1-error.out'
+NOW = 1700000000
+
+
+def request_item(status=async_inference.PENDING, **attributes):
+    item = {
+        'request_id': {'S': 'req-1'},
+        'status': {'S': status},
+        'output_location': {'S': OUTPUT},
+        'failure_location': {'S': FAILURE},
+        'created_at': {'N': str(NOW)},
+        'expires_at': {'N': str(NOW + 3600)},
+    }
+    item.update({name: {'S': value} for name, value in attributes.items()})
+    return {'Item': item}
+
+
+def s3_object(payload):
+    return {'Body': StreamingBody(io.BytesIO(payload), len(payload))}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def s3():
+    stubber = Stubber(boto3.client('s3'))
+    stubber.activate()
+    yield stubber
+    stubber.assert_no_pending_responses()
+    stubber.deactivate()
+
+
+@pytest.fixture
+def dynamodb(monkeypatch):
+    monkeypatch.setenv('ASYNC_REQUEST_TABLE_NAME', 'async-requests')
+    monkeypatch.setattr(async_inference, '_dynamodb_client', boto3.client('dynamodb'))
+    stubber = Stubber(async_inference._dynamodb_client)
+    stubber.activate()
+    yield stubber
+    stubber.assert_no_pending_responses()
+    stubber.deactivate()
+
+
+def store(dynamodb):
+    return async_inference.AsyncRequestStore('async-requests', 3600, client=dynamodb.client, clock=lambda: NOW)
+
+
+def expect_get(dynamodb, response):
+    dynamodb.add_response('get_item', response, {
+        'TableName': 'async-requests', 'Key': {'request_id': {'S': 'req-1'}}, 'ConsistentRead': True
+    })
+
+
+def expect_head(s3, location, found):
+    bucket, key = async_inference.parse_s3_uri(location)
+    if found:
+        s3.add_response('head_object', {}, {'Bucket': bucket, 'Key': key})
+    else:
+        s3.add_client_error('head_object', '404', 'Not Found', 404, expected_params={'Bucket': bucket, 'Key': key})
+
+
+def expect_read(s3, location, payload):
+    bucket, key = async_inference.parse_s3_uri(location)
+    s3.add_response('get_object', s3_object(payload), {'Bucket': bucket, 'Key': key})
+
+
+def get_result(s3, dynamodb, wait_seconds=0, clock=None):
+    clock = clock or FakeClock()
+    return async_inference.get_result(
+        'req-1', wait_seconds, s3_client=s3.client, store=store(dynamodb), clock=clock, sleep=clock.sleep
+    )
+
+
+def test_pending_request_without_output_stays_pending(s3, dynamodb):
+    expect_get(dynamodb, request_item())
+    expect_head(s3, OUTPUT, found=False)
+    expect_head(s3, FAILURE, found=False)
+
+    assert get_result(s3, dynamodb) == {'requestId': 'req-1', 'status': 'PENDING'}
+
+
+def test_long_poll_returns_once_the_notification_arrives(s3, dynamodb, monkeypatch):
+    monkeypatch.setenv('ASYNC_RESULT_POLL_SECONDS', '1')
+    expect_get(dynamodb, request_item())
+    expect_head(s3, OUTPUT, found=False)
+    expect_head(s3, FAILURE, found=False)
+    expect_get(dynamodb, request_item())
+    expect_get(dynamodb, request_item(async_inference.COMPLETED))
+    expect_read(s3, OUTPUT, b'{"label": "cat"}')
+    clock = FakeClock()
+
+    result = get_result(s3, dynamodb, wait_seconds=5, clock=clock)
+
+    assert result == {'requestId': 'req-1', 'status': 'COMPLETED', 'prediction': {'label': 'cat'}}
+    # The output location is checked once per call, later rounds only re-read the table
+    assert clock.now == 2
+
+
+def test_output_object_completes_a_request_without_notifications(s3, dynamodb):
+    expect_get(dynamodb, request_item())
+    expect_head(s3, OUTPUT, found=True)
+    expect_read(s3, OUTPUT, b'{"label": "cat"}')
+
+    assert get_result(s3, dynamodb) == {'requestId': 'req-1', 'status': 'COMPLETED', 'prediction': {'label': 'cat'}}
+
+
+def test_failure_object_fails_a_request_without_notifications(s3, dynamodb):
+    expect_get(dynamodb, request_item())
+    expect_head(s3, OUTPUT, found=False)
+    expect_head(s3, FAILURE, found=True)
+    expect_read(s3, FAILURE, b'Model container crashed')
+
+    assert get_result(s3, dynamodb) == {'requestId': 'req-1', 'status': 'FAILED', 'error': 'Model container crashed'}
+
+
+def test_failed_notification_is_returned_without_reading_s3(s3, dynamodb):
+    expect_get(dynamodb, request_item(async_inference.FAILED, failure_reason='Out of memory'))
+
+    assert get_result(s3, dynamodb) == {'requestId': 'req-1', 'status': 'FAILED', 'error': 'Out of memory'}
+
+
+def test_unknown_and_expired_requests_are_not_found(s3, dynamodb):
+    expect_get(dynamodb, {})
+    expired = request_item()
+    expired['Item']['expires_at'] = {'N': str(NOW)}
+    expect_get(dynamodb, expired)
+
+    assert get_result(s3, dynamodb) is None
+    assert get_result(s3, dynamodb) is None
+
+
+def test_result_route_answers_202_while_pending(s3, dynamodb, monkeypatch):
+    monkeypatch.setattr(async_inference, '_s3_client', s3.client)
+    # The handler's store checks the TTL against the real clock
+    item = request_item()
+    item['Item']['expires_at'] = {'N': str(2 ** 40)}
+    expect_get(dynamodb, item)
+    expect_head(s3, OUTPUT, found=False)
+    expect_head(s3, FAILURE, found=False)
+    event = {'resource': sample_lambda.RESULT_RESOURCE, 'pathParameters': {'id': 'req-1'}}
+
+    response = sample_lambda.lambda_handler(event, None)
+
+    assert response['statusCode'] == 202
+    assert json.loads(response['body'])['status'] == 'PENDING'
+
+
+def result_event(wait):
+    return {
+        'resource': sample_lambda.RESULT_RESOURCE,
+        'pathParameters': {'id': 'req-1'},
+        'queryStringParameters': {'wait': wait}
+    }
+
+
+@pytest.mark.parametrize('wait', ['soon', 'nan', 'inf', '-inf'])
+def test_result_route_rejects_a_malformed_wait(monkeypatch, wait):
+    monkeypatch.setattr(async_inference, 'get_result', pytest.fail)
+
+    response = sample_lambda.lambda_handler(result_event(wait), None)
+
+    assert response['statusCode'] == 400
+
+
+@pytest.mark.parametrize('wait, expected', [('-5', 0), ('2.5', 2.5), ('3600', async_inference.MAX_WAIT_SECONDS)])
+def test_result_route_clamps_the_wait(monkeypatch, wait, expected):
+    waits = []
+    monkeypatch.setattr(async_inference, 'get_result', lambda request_id, wait_seconds: waits.append(wait_seconds))
+
+    sample_lambda.lambda_handler(result_event(wait), None)
+
+    assert waits == [expected]
+
+
+def notification(status, **fields):
+    return {'Sns': {'Message': json.dumps(dict(fields, invocationStatus=status))}}
+
+
+def expect_finish(dynamodb, values, updates):
+    dynamodb.add_response('update_item', {}, {
+        'TableName': 'async-requests',
+        'Key': {'request_id': {'S': 'req-1'}},
+        'UpdateExpression': 'SET ' + updates,
+        'ConditionExpression': 'attribute_exists(request_id)',
+        'ExpressionAttributeNames': {'#status': 'status'},
+        'ExpressionAttributeValues': values
+    })
+
+
+def test_completion_handler_records_successful_requests(dynamodb):
+    expect_finish(
+        dynamodb,
+        {':status': {'S': 'COMPLETED'}, ':output_location': {'S': OUTPUT}},
+        '#status = :status, output_location = :output_location'
+    )
+    event = {'Records': [notification('Completed', inferenceId='req-1', responseParameters={'outputLocation': OUTPUT})]}
+
+    assert async_inference.completion_handler(event, None) == {'processed': 1}
+
+
+def test_completion_handler_records_failed_requests(dynamodb):
+    expect_finish(
+        dynamodb,
+        {':status': {'S': 'FAILED'}, ':failure_reason': {'S': 'Out of memory'}},
+        '#status = :status, failure_reason = :failure_reason'
+    )
+    event = {'Records': [notification('Failed', inferenceId='req-1', failureReason='Out of memory')]}
+
+    assert async_inference.completion_handler(event, None) == {'processed': 1}
+
+
+def test_completion_handler_skips_unknown_requests(dynamodb):
+    dynamodb.add_client_error('update_item', 'ConditionalCheckFailedException', expected_params={
+        'TableName': 'async-requests', 'Key': {'request_id': {'S': 'req-1'}}, 'UpdateExpression': ANY,
+        'ConditionExpression': ANY, 'ExpressionAttributeNames': ANY, 'ExpressionAttributeValues': ANY
+    })
+    event = {'Records': [
+        notification('Completed', inferenceId='req-1', responseParameters={'outputLocation': OUTPUT}),
+        notification('Completed', responseParameters={'outputLocation': OUTPUT}),
+    ]}
+
+    assert async_inference.completion_handler(event, None) == {'processed': 2}
@@ -0,0 +1,171 @@
+import random
+
+import pytest
+from botocore.exceptions import ClientError
+
+from endpoint_router import EndpointRouter, RouteTarget, parse_targets
+
+A, B, C = RouteTarget('endpoint-a'), RouteTarget('endpoint-b'), RouteTarget('endpoint-c')
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def error(code, status):
+    return ClientError({'Error': {'Code': code}, 'ResponseMetadata': {'HTTPStatusCode': status}}, 'InvokeEndpoint')
+
+
+class FakeTargets:
+    """Answers ``call(target)`` after each target's latency, or raises the error queued for it."""
+
+    def __init__(self, clock, latencies_ms=None, errors=None):
+        self.clock = clock
+        self.latencies_ms = latencies_ms or {}
+        self.errors = errors or {}
+        self.calls = []
+
+    def __call__(self, target):
+        self.calls.append(target)
+        self.clock.now += self.latencies_ms.get(target, 10) / 1000
+        if self.errors.get(target):
+            raise self.errors[target].pop(0)
+        return target.name
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def router(clock, targets=(A, B), **kwargs):
+    return EndpointRouter(list(targets), clock=clock, rng=random.Random(0), **kwargs)
+
+
+def test_unmeasured_targets_are_tried_before_the_lowest_ewma(clock):
+    routing = router(clock, (A, B, C))
+    fake = FakeTargets(clock, {A: 50, B: 20, C: 80})
+
+    first_round = [routing.invoke(fake)[0] for _ in range(3)]
+    after = [routing.invoke(fake)[0] for _ in range(2)]
+
+    assert sorted(first_round) == sorted([A, B, C])
+    assert after == [B, B]
+
+
+def test_ewma_weights_the_newest_latency_by_alpha(clock):
+    routing = router(clock, (A,), ewma_alpha=0.5)
+    fake = FakeTargets(clock, {A: 100})
+    routing.invoke(fake)
+    fake.latencies_ms[A] = 200
+
+    routing.invoke(fake)
+
+    assert routing.snapshot()['endpoint-a']['ewmaMs'] == pytest.approx(150)
+
+
+def test_requests_in_flight_move_traffic_to_a_slower_idle_target(clock):
+    routing = router(clock)
+    fake = FakeTargets(clock, {A: 15, B: 25})
+    routing.invoke(fake)
+    routing.invoke(fake)
+
+    held = [routing.acquire() for _ in range(2)]
+
+    # A scores 15 ms x 2 in flight once the first request holds it, B 25 ms x 1
+    assert held == [A, B]
+    assert routing.snapshot()['endpoint-a']['inFlight'] == 1
+
+
+def test_circuit_opens_after_consecutive_retryable_errors(clock):
+    routing = router(clock, failure_threshold=2, open_seconds=30)
+    for _ in range(2):
+        target = routing.acquire(exclude={B})
+        routing.release(target, 5, error('ThrottlingException', 429))
+
+    assert routing.snapshot()['endpoint-a']['open'] is True
+    assert [routing.acquire() for _ in range(3)] == [B, B, B]
+
+
+def test_half_open_circuit_reopens_on_failure_and_closes_on_success(clock):
+    routing = router(clock, (A,), failure_threshold=2, open_seconds=30)
+    for _ in range(2):
+        routing.release(routing.acquire(), 5, error('ServiceUnavailable', 503))
+
+    clock.now += 30
+    assert routing.snapshot()['endpoint-a']['open'] is False
+    routing.release(routing.acquire(), 5, error('ServiceUnavailable', 503))
+    assert routing.snapshot()['endpoint-a']['open'] is True
+
+    clock.now += 30
+    routing.release(routing.acquire(), 5)
+    assert routing.snapshot()['endpoint-a'] == {'ewmaMs': 5, 'inFlight': 0, 'failures': 0, 'open': False}
+
+
+def test_every_circuit_open_uses_the_target_that_reopens_first(clock):
+    routing = router(clock, failure_threshold=1, open_seconds=30)
+    routing.release(routing.acquire(exclude={B}), 5, error('ThrottlingException', 429))
+    clock.now += 10
+    routing.release(routing.acquire(exclude={A}), 5, error('ThrottlingException', 429))
+
+    assert routing.acquire() == A
+
+
+@pytest.mark.parametrize('failure', [
+    error('ThrottlingException', 429),
+    error('ModelError', 503),
+    error('InternalFailure', 500),
+])
+def test_retryable_errors_fail_over_to_the_next_target(clock, failure):
+    routing = router(clock)
+    fake = FakeTargets(clock, {A: 10, B: 50})
+    routing.invoke(fake)
+    routing.invoke(fake)
+    fake.errors[A] = [failure]
+    failovers = []
+
+    target, result = routing.invoke(fake, on_failover=lambda t, e: failovers.append((t, e)))
+
+    assert (target, result) == (B, 'endpoint-b')
+    assert fake.calls[-2:] == [A, B]
+    assert failovers == [(A, failure)]
+
+
+def test_client_errors_are_raised_without_failover(clock):
+    routing = router(clock)
+    fake = FakeTargets(clock, {A: 10, B: 50})
+    routing.invoke(fake)
+    routing.invoke(fake)
+    fake.errors[A] = [error('ValidationError', 400)]
+
+    with pytest.raises(ClientError, match='ValidationError'):
+        routing.invoke(fake, on_failover=pytest.fail)
+
+    assert fake.calls[-1] == A
+    assert len(fake.calls) == 3
+    # A rejected request says nothing about the target's health
+    assert routing.snapshot()['endpoint-a']['failures'] == 0
+
+
+def test_last_error_is_raised_when_every_target_fails(clock):
+    routing = router(clock)
+    failures = {A: error('ThrottlingException', 429), B: error('ServiceUnavailable', 503)}
+    fake = FakeTargets(clock, errors={target: [failure] for target, failure in failures.items()})
+
+    with pytest.raises(ClientError) as raised:
+        routing.invoke(fake)
+
+    assert sorted(fake.calls) == [A, B]
+    assert raised.value is failures[fake.calls[-1]]
+
+
+def test_targets_must_serve_one_model():
+    targets = parse_targets('[{"endpoint": "a"}, {"endpoint": "mme", "model": "m1.tar.gz"}]')
+    assert [target.model for target in targets] == ['', 'm1.tar.gz']
+
+    with pytest.raises(ValueError, match='one model'):
+        parse_targets('[{"endpoint": "mme", "model": "m1.tar.gz"}, {"endpoint": "mme", "model": "m2.tar.gz"}]')
@@ -0,0 +1,33 @@
+import io
+
+from PIL import Image
+
+from image_preprocessing import downscale_image, preprocess_image
+
+
+def encode(size, image_format):
+    output = io.BytesIO()
+    Image.new('RGB', size, 'red').save(output, format=image_format)
+    return output.getvalue()
+
+
+def test_large_images_are_downscaled_and_re_encoded():
+    image = encode((64, 32), 'PNG')
+
+    with Image.open(io.BytesIO(downscale_image(image, 16))) as result:
+        assert result.format == 'JPEG'
+        assert result.size == (16, 8)
+
+
+def test_small_images_in_the_target_format_are_left_alone():
+    image = encode((16, 16), 'JPEG')
+
+    assert downscale_image(image, 16, 'JPEG') is image
+    # Format names are case-insensitive, as in the IMAGE_FORMAT setting
+    assert downscale_image(image, 16, 'jpeg') is image
+
+
+def test_undecodable_images_are_forwarded_unchanged(monkeypatch):
+    monkeypatch.setenv('IMAGE_MAX_DIMENSION', '16')
+
+    assert preprocess_image(b'not an image') == b'not an image'
@@ -0,0 +1,129 @@
+import base64
+import json
+
+import pytest
+
+import prediction_cache
+import sample_lambda
+from fake_sagemaker import FakeDynamoDbClient, FakeSageMakerRuntime
+from prediction_cache import DynamoDbCacheTier, LruTtlCache, PredictionCache, cache_key
+
+IMAGE = b'image'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def predict_event(headers=None):
+    return {'headers': headers or {}, 'body': json.dumps({'image': base64.b64encode(IMAGE).decode()})}
+
+
+def test_cache_key_depends_on_the_image_and_the_scope():
+    assert cache_key(IMAGE, 'endpoint-a') == cache_key(IMAGE, 'endpoint-a')
+    assert cache_key(IMAGE, 'endpoint-a') != cache_key(IMAGE, 'endpoint-b')
+    assert cache_key(IMAGE, 'endpoint-a') != cache_key(b'other', 'endpoint-a')
+
+
+def test_lru_entries_expire_after_their_ttl():
+    clock = FakeClock()
+    cache = LruTtlCache(4, 60, clock=clock)
+    cache.put('a', {'label': 'cat'})
+
+    clock.now += 59
+    assert cache.get('a') == {'label': 'cat'}
+    clock.now += 1
+    assert cache.get('a') is None
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = LruTtlCache(2, 60, clock=FakeClock())
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+
+    cache.put('c', 3)
+
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+
+
+def test_shared_hits_are_promoted_to_the_local_tier():
+    shared = DynamoDbCacheTier('cache', 300, client=FakeDynamoDbClient(), clock=FakeClock())
+    shared.put('a', {'label': 'cat'})
+    cache = PredictionCache(LruTtlCache(4, 300, clock=FakeClock()), shared)
+
+    assert cache.get('a') == {'label': 'cat'}
+    assert cache.local.get('a') == {'label': 'cat'}
+
+
+@pytest.mark.parametrize('item', [
+    {'prediction': {'S': '{not json'}, 'expires_at': {'N': '2000'}},
+    {'prediction': {'S': '{}'}},
+    {'prediction': {'S': '{}'}, 'expires_at': {'N': 'soon'}},
+])
+def test_unreadable_shared_items_are_misses(item):
+    client = FakeDynamoDbClient()
+    client.items[('cache', 'a')] = dict(item, cache_key={'S': 'a'})
+
+    assert DynamoDbCacheTier('cache', 300, client=client, clock=FakeClock()).get('a') is None
+
+
+def test_expired_shared_items_are_misses():
+    clock = FakeClock()
+    shared = DynamoDbCacheTier('cache', 300, client=FakeDynamoDbClient(), clock=clock)
+    shared.put('a', {'label': 'cat'})
+
+    clock.now += 300
+    assert shared.get('a') is None
+
+
+@pytest.fixture
+def runtime(monkeypatch):
+    monkeypatch.setenv('PREDICTION_CACHE_MAX_ENTRIES', '16')
+    runtime = FakeSageMakerRuntime(prediction={'label': 'cat'})
+    monkeypatch.setattr(sample_lambda, '_runtime_client', runtime)
+    return runtime
+
+
+def test_predict_serves_repeated_images_from_the_cache(runtime):
+    responses = [sample_lambda.lambda_handler(predict_event(), None) for _ in range(2)]
+
+    assert [r['headers']['X-Cache'] for r in responses] == ['MISS', 'HIT']
+    assert responses[0]['body'] == responses[1]['body']
+    assert len(runtime.calls) == 1
+
+
+def test_predict_cache_bypass_skips_the_lookup_and_refreshes_the_entry(runtime):
+    sample_lambda.lambda_handler(predict_event(), None)
+    runtime.prediction = {'label': 'dog'}
+
+    bypassed = sample_lambda.lambda_handler(predict_event({'Cache-Control': 'no-cache'}), None)
+    cached = sample_lambda.lambda_handler(predict_event(), None)
+
+    assert bypassed['headers']['X-Cache'] == 'BYPASS'
+    assert cached['headers']['X-Cache'] == 'HIT'
+    assert json.loads(cached['body']) == {'prediction': {'label': 'dog'}}
+    assert len(runtime.calls) == 2
+
+
+def test_predict_treats_a_corrupt_shared_item_as_a_miss(runtime, monkeypatch):
+    client = FakeDynamoDbClient()
+    key = cache_key(IMAGE, sample_lambda.get_router().cache_scope)
+    client.items[('cache', key)] = {
+        'cache_key': {'S': key},
+        'prediction': {'S': '{not json'},
+        'expires_at': {'N': str(2 ** 40)}
+    }
+    monkeypatch.setattr(prediction_cache, '_prediction_cache', PredictionCache(
+        LruTtlCache(16, 300), DynamoDbCacheTier('cache', 300, client=client)
+    ))
+
+    response = sample_lambda.lambda_handler(predict_event(), None)
+
+    assert response['statusCode'] == 200
+    assert response['headers']['X-Cache'] == 'MISS'
+    assert len(runtime.calls) == 1
@@ -0,0 +1,81 @@
+import base64
+import json
+import struct
+
+import pytest
+
+from response_encoding import (
+    FLOAT32_MIN_LENGTH, FLOAT32_TYPE, JSON_TYPE, RAW_TYPE, encode_response, negotiate, pack_float32, unpack_float32
+)
+
+
+def header(body):
+    (header_length,) = struct.unpack_from('<I', body)
+    return json.loads(body[4:4 + header_length])
+
+
+@pytest.mark.parametrize('accept, expected', [
+    (None, JSON_TYPE),
+    ('*/*', JSON_TYPE),
+    ('image/png, text/html', JSON_TYPE),
+    (FLOAT32_TYPE, FLOAT32_TYPE),
+    ('APPLICATION/X-PREDICTION-RAW', RAW_TYPE),
+    (f'{JSON_TYPE};q=0.5, {FLOAT32_TYPE};q=0.9', FLOAT32_TYPE),
+    (f'{FLOAT32_TYPE};q=0.2, {RAW_TYPE}', RAW_TYPE),
+    (f'{RAW_TYPE}, {FLOAT32_TYPE}', RAW_TYPE),
+    (f'{FLOAT32_TYPE};q=0, {RAW_TYPE};q=0', JSON_TYPE),
+    (f'{FLOAT32_TYPE};q=high', FLOAT32_TYPE),
+])
+def test_negotiate_picks_the_highest_ranked_supported_type(accept, expected):
+    assert negotiate(accept) == expected
+
+
+def test_float32_round_trips_nested_arrays():
+    prediction = {
+        'embedding': [0.5] * FLOAT32_MIN_LENGTH,
+        'mask': [[0.25, 0.75] * 4 for _ in range(3)],
+        'scores': [{'label': 'cat', 'logits': [float(i) for i in range(20)]}],
+        'label': 'cat'
+    }
+
+    body = pack_float32(prediction)
+
+    assert unpack_float32(body) == {'prediction': prediction}
+    assert header(body)['prediction']['mask'] == {'__float32__': [16, 24], 'shape': [3, 8]}
+
+
+@pytest.mark.parametrize('value', [
+    list(range(FLOAT32_MIN_LENGTH)),
+    [0.5] * (FLOAT32_MIN_LENGTH - 1),
+    [0.5] * FLOAT32_MIN_LENGTH + ['x'],
+    [0.5] * FLOAT32_MIN_LENGTH + [True],
+    [[0.5] * 8, [0.5] * 9],
+])
+def test_integer_short_and_mixed_arrays_stay_json(value):
+    body = pack_float32({'value': value})
+
+    assert header(body) == {'prediction': {'value': value}}
+    assert unpack_float32(body) == {'prediction': {'value': value}}
+
+
+def test_float32_packs_arrays_mixing_integers_and_floats():
+    value = [1, 2.5] * (FLOAT32_MIN_LENGTH // 2)
+
+    assert unpack_float32(pack_float32(value)) == {'prediction': value}
+
+
+def test_raw_text_bodies_are_sent_as_text():
+    headers, body, is_base64 = encode_response(RAW_TYPE, raw_body=b'{"label": "cat"}', raw_content_type=JSON_TYPE)
+
+    assert (headers, body, is_base64) == ({'Content-Type': JSON_TYPE}, '{"label": "cat"}', False)
+
+
+@pytest.mark.parametrize('payload, content_type', [
+    (b'\x00\x01', None),
+    (b'{"label": "\xff"}', JSON_TYPE),
+])
+def test_raw_binary_and_undecodable_bodies_are_base64_encoded(payload, content_type):
+    headers, body, is_base64 = encode_response(RAW_TYPE, raw_body=payload, raw_content_type=content_type)
+
+    assert headers == {'Content-Type': content_type or 'application/octet-stream'}
+    assert (base64.b64decode(body), is_base64) == (payload, True)
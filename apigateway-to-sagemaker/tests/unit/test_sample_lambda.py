@@ -0,0 +1,270 @@
+import base64
+import io
+import json
+
+import boto3
+import pytest
+from botocore.response import StreamingBody
+
+import sample_lambda
+from fake_sagemaker import FakeSageMakerRuntime, invoke_endpoint_response
+from response_encoding import JSON_TYPE, RAW_TYPE
+
+
+def batch_event(body):
+    return {'resource': sample_lambda.BATCH_RESOURCE, 'body': body}
+
+
+def encoded(*images):
+    return [base64.b64encode(image).decode() for image in images]
+
+
+def predictions(response):
+    assert response['statusCode'] == 200, response
+    return json.loads(response['body'])['predictions']
+
+
+def test_runtime_client_is_built_once_per_container(monkeypatch):
+    created = []
+    real_client = boto3.client
+
+    def counting_client(*args, **kwargs):
+        created.append(args)
+        return real_client(*args, **kwargs)
+
+    monkeypatch.setattr(boto3, 'client', counting_client)
+
+    first = sample_lambda.get_runtime_client()
+    second = sample_lambda.get_runtime_client()
+
+    assert first is second
+    assert created == [('runtime.sagemaker',)]
+
+
+def test_runtime_client_is_reused_across_warm_invocations(runtime_stubber):
+    client = sample_lambda.get_runtime_client()
+    for _ in range(2):
+        runtime_stubber.add_response('invoke_endpoint', invoke_endpoint_response({'label': 'cat'}))
+    event = {'body': json.dumps({'image': encoded(b'image')[0]})}
+
+    responses = [sample_lambda.lambda_handler(event, None) for _ in range(2)]
+
+    assert [r['statusCode'] for r in responses] == [200, 200]
+    assert sample_lambda.get_runtime_client() is client
+
+
+def test_runtime_client_config_comes_from_the_environment(monkeypatch):
+    monkeypatch.setenv('SAGEMAKER_MAX_POOL_CONNECTIONS', '32')
+    monkeypatch.setenv('SAGEMAKER_CONNECT_TIMEOUT', '1.5')
+    monkeypatch.setenv('SAGEMAKER_READ_TIMEOUT', '10')
+    monkeypatch.setenv('SAGEMAKER_MAX_ATTEMPTS', '5')
+    monkeypatch.setenv('SAGEMAKER_RETRY_MODE', 'standard')
+
+    config = sample_lambda.get_runtime_client().meta.config
+
+    assert config.max_pool_connections == 32
+    assert config.connect_timeout == 1.5
+    assert config.read_timeout == 10
+    assert config.tcp_keepalive is True
+    assert config.retries['mode'] == 'standard'
+    # botocore counts the first attempt on top of the configured retries
+    assert config.retries['total_max_attempts'] == 6
+
+
+def test_runtime_client_leaves_retries_to_the_router_with_several_targets(monkeypatch):
+    monkeypatch.setenv('SAGEMAKER_TARGETS', '[{"endpoint": "endpoint-a"}, {"endpoint": "endpoint-b"}]')
+    monkeypatch.setenv('SAGEMAKER_MAX_ATTEMPTS', '5')
+
+    config = sample_lambda.get_runtime_client().meta.config
+
+    assert config.retries['total_max_attempts'] == 1
+
+
+def test_batch_packs_images_into_mini_batches_in_input_order(runtime_stubber, monkeypatch):
+    monkeypatch.setenv('SAGEMAKER_BATCH_SIZE', '2')
+    monkeypatch.setenv('SAGEMAKER_BATCH_CONCURRENCY', '1')
+    images = encoded(b'a', b'b', b'c')
+    for batch, labels in ((images[:2], ['a', 'b']), (images[2:], ['c'])):
+        runtime_stubber.add_response(
+            'invoke_endpoint',
+            invoke_endpoint_response([{'label': label} for label in labels]),
+            {
+                'EndpointName': 'test-endpoint',
+                'ContentType': 'application/json',
+                'Body': json.dumps(batch),
+                'Accept': 'application/json'
+            }
+        )
+
+    results = predictions(sample_lambda.lambda_handler(batch_event(json.dumps({'images': images})), None))
+
+    assert results == [
+        {'index': 0, 'prediction': {'label': 'a'}},
+        {'index': 1, 'prediction': {'label': 'b'}},
+        {'index': 2, 'prediction': {'label': 'c'}},
+    ]
+
+
+def test_batch_reports_per_item_errors(monkeypatch):
+    monkeypatch.setenv('SAGEMAKER_BATCH_CONTENT_TYPE', 'application/x-image')
+    monkeypatch.setattr(sample_lambda, '_runtime_client', FakeSageMakerRuntime(prediction={'label': 'cat'}))
+    body = json.dumps({'images': [encoded(b'a')[0], '', 42]})
+
+    results = predictions(sample_lambda.lambda_handler(batch_event(body), None))
+
+    assert results[0] == {'index': 0, 'prediction': {'label': 'cat'}}
+    assert results[1] == {'index': 1, 'error': 'No image data provided'}
+    assert results[2] == {'index': 2, 'error': 'No image data provided'}
+
+
+def test_batch_endpoint_failure_fails_only_its_mini_batch(runtime_stubber, monkeypatch):
+    monkeypatch.setenv('SAGEMAKER_BATCH_SIZE', '1')
+    monkeypatch.setenv('SAGEMAKER_BATCH_CONCURRENCY', '1')
+    runtime_stubber.add_client_error('invoke_endpoint', 'ValidationError', 'Bad image', 400)
+    runtime_stubber.add_response('invoke_endpoint', invoke_endpoint_response([{'label': 'b'}]))
+
+    results = predictions(sample_lambda.lambda_handler(
+        batch_event(json.dumps({'images': encoded(b'a', b'b')})), None
+    ))
+
+    assert 'Bad image' in results[0]['error']
+    assert results[1] == {'index': 1, 'prediction': {'label': 'b'}}
+
+
+@pytest.mark.parametrize('body', ['not json', '{"image": "abc"}', '["abc"]', '"abc"'])
+def test_malformed_batch_body_is_a_client_error(body):
+    response = sample_lambda.lambda_handler(batch_event(body), None)
+
+    assert response['statusCode'] == 400
+
+
+@pytest.mark.parametrize('images', [[], 'abc'])
+def test_batch_without_images_is_a_client_error(images):
+    response = sample_lambda.lambda_handler(batch_event(json.dumps({'images': images})), None)
+
+    assert response['statusCode'] == 400
+
+
+def png_image(size):
+    from PIL import Image
+    output = io.BytesIO()
+    Image.new('RGB', (size, size), 'red').save(output, format='PNG')
+    return output.getvalue()
+
+
+def test_batch_images_are_preprocessed_like_predict_images(monkeypatch):
+    monkeypatch.setenv('IMAGE_MAX_DIMENSION', '16')
+    monkeypatch.setenv('SAGEMAKER_BATCH_CONTENT_TYPE', 'application/x-image')
+    runtime = FakeSageMakerRuntime()
+    monkeypatch.setattr(sample_lambda, '_runtime_client', runtime)
+    [image] = encoded(png_image(64))
+
+    sample_lambda.lambda_handler({'body': json.dumps({'image': image})}, None)
+    predictions(sample_lambda.lambda_handler(batch_event(json.dumps({'images': [image]})), None))
+
+    predict_body, batch_body = (call['Body'] for call in runtime.calls)
+    assert batch_body == predict_body
+    assert predict_body.startswith(b'\xff\xd8')
+
+
+def test_batch_images_share_the_prediction_cache(monkeypatch):
+    monkeypatch.setenv('PREDICTION_CACHE_MAX_ENTRIES', '16')
+    runtime = FakeSageMakerRuntime(prediction={'label': 'cat'})
+    monkeypatch.setattr(sample_lambda, '_runtime_client', runtime)
+    image_a, image_b = encoded(b'a', b'b')
+    body = json.dumps({'images': [image_a, image_b, image_a]})
+
+    sample_lambda.lambda_handler({'body': json.dumps({'image': image_a})}, None)
+    first = predictions(sample_lambda.lambda_handler(batch_event(body), None))
+    second = predictions(sample_lambda.lambda_handler(batch_event(body), None))
+
+    # /predict cached a; the first batch only sends b, the second nothing
+    assert [call['Body'] for call in runtime.calls[1:]] == [json.dumps([image_b])]
+    assert first == second == [{'index': i, 'prediction': {'label': 'cat'}} for i in range(3)]
+
+
+def test_batch_cache_bypass_still_refreshes_the_cache(monkeypatch):
+    monkeypatch.setenv('PREDICTION_CACHE_MAX_ENTRIES', '16')
+    runtime = FakeSageMakerRuntime(prediction={'label': 'cat'})
+    monkeypatch.setattr(sample_lambda, '_runtime_client', runtime)
+    body = json.dumps({'images': encoded(b'a')})
+
+    for headers in ({}, {'Cache-Control': 'no-cache'}, {}):
+        predictions(sample_lambda.lambda_handler(dict(batch_event(body), headers=headers), None))
+
+    assert len(runtime.calls) == 2
+
+
+def test_invalid_base64_batch_item_is_a_per_item_error(monkeypatch):
+    monkeypatch.setattr(sample_lambda, '_runtime_client', FakeSageMakerRuntime())
+
+    results = predictions(sample_lambda.lambda_handler(batch_event(json.dumps({'images': ['abc']})), None))
+
+    assert 'Invalid base64 image' in results[0]['error']
+
+
+def predict_event(accept):
+    return {'headers': {'Accept': accept}, 'body': json.dumps({'image': encoded(b'image')[0]})}
+
+
+def raw_endpoint_response(payload, content_type):
+    return {'Body': StreamingBody(io.BytesIO(payload), len(payload)), 'ContentType': content_type}
+
+
+@pytest.mark.parametrize('payload, content_type', [
+    (b'\x00\x01 not json', 'application/octet-stream'),
+    (b'{"label":  "cat", "score": 1.0}', 'application/json'),
+    (b'{"label": "\xff"}', 'application/json'),
+])
+def test_raw_responses_pass_the_endpoint_body_through_with_the_cache_on(runtime_stubber, monkeypatch,
+                                                                        payload, content_type):
+    monkeypatch.setenv('PREDICTION_CACHE_MAX_ENTRIES', '16')
+    for _ in range(2):
+        runtime_stubber.add_response('invoke_endpoint', raw_endpoint_response(payload, content_type))
+
+    responses = [sample_lambda.lambda_handler(predict_event(RAW_TYPE), None) for _ in range(2)]
+
+    for response in responses:
+        assert response['statusCode'] == 200
+        assert response['headers']['Content-Type'] == content_type
+        assert response['headers']['X-Cache'] == 'DISABLED'
+        body = base64.b64decode(response['body']) if response['isBase64Encoded'] else response['body'].encode()
+        # Byte for byte, not re-serialized
+        assert body == payload
+
+
+def test_raw_responses_do_not_fill_the_prediction_cache(runtime_stubber, monkeypatch):
+    monkeypatch.setenv('PREDICTION_CACHE_MAX_ENTRIES', '16')
+    runtime_stubber.add_response('invoke_endpoint', raw_endpoint_response(b'{"label": "raw"}', 'application/json'))
+    runtime_stubber.add_response('invoke_endpoint', invoke_endpoint_response({'label': 'json'}))
+
+    sample_lambda.lambda_handler(predict_event(RAW_TYPE), None)
+    response = sample_lambda.lambda_handler(predict_event(JSON_TYPE), None)
+
+    assert response['headers']['X-Cache'] == 'MISS'
+    assert json.loads(response['body']) == {'prediction': {'label': 'json'}}
+
+
+@pytest.mark.parametrize('content_type_header', ['Content-Type', 'content-type'])
+def test_binary_upload_reaches_the_endpoint_unchanged(monkeypatch, content_type_header):
+    runtime = FakeSageMakerRuntime(prediction={'label': 'cat'})
+    monkeypatch.setattr(sample_lambda, '_runtime_client', runtime)
+    image = png_image(8) + bytes(range(256))
+    event = {
+        'headers': {content_type_header: 'image/png'},
+        'body': base64.b64encode(image).decode(),
+        'isBase64Encoded': True
+    }
+
+    response = sample_lambda.lambda_handler(event, None)
+
+    assert json.loads(response['body']) == {'prediction': {'label': 'cat'}}
+    assert [call['Body'] for call in runtime.calls] == [image]
+    assert runtime.calls[0]['ContentType'] == 'application/x-image'
+
+
+@pytest.mark.parametrize('body', ['{bad', '{"image": "abc"}', '["abc"]', '{"image": 42}'])
+def test_malformed_predict_bodies_are_client_errors(body):
+    response = sample_lambda.lambda_handler({'body': body}, None)
+
+    assert response['statusCode'] == 400
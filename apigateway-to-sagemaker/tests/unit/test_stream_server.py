@@ -0,0 +1,62 @@
+import base64
+import http.client
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import sample_lambda
+from fake_sagemaker import FakeSageMakerRuntime
+from stream_server import StreamingPredictHandler
+
+
+@pytest.fixture
+def server(monkeypatch):
+    runtime = FakeSageMakerRuntime(prediction=[{'token': 'a'}, {'token': 'b'}])
+    monkeypatch.setattr(sample_lambda, '_runtime_client', runtime)
+    monkeypatch.setattr(StreamingPredictHandler, 'log_message', lambda *args: None)
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StreamingPredictHandler)
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True)
+    thread.start()
+    yield httpd, runtime
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def post(httpd, body, content_type='application/json'):
+    connection = http.client.HTTPConnection(*httpd.server_address, timeout=5)
+    connection.request('POST', '/predict/stream', body=body, headers={'Content-Type': content_type})
+    response = connection.getresponse()
+    data = response.read()
+    connection.close()
+    return response.status, data
+
+
+def test_streams_the_prediction_parts(server):
+    httpd, runtime = server
+
+    status, data = post(httpd, json.dumps({'image': base64.b64encode(b'image').decode()}))
+
+    assert status == 200
+    assert [json.loads(line) for line in data.splitlines()] == [{'token': 'a'}, {'token': 'b'}]
+    assert runtime.calls[0]['Body'] == b'image'
+
+
+def test_binary_uploads_are_forwarded_as_is(server):
+    httpd, runtime = server
+
+    status, _ = post(httpd, b'\x89PNG raw bytes', 'image/png')
+
+    assert status == 200
+    assert runtime.calls[0]['Body'] == b'\x89PNG raw bytes'
+
+
+@pytest.mark.parametrize('body', [b'{bad', b'{"image": "abc"}', b'["abc"]', b'{"image": 42}', b'\xff\xfe'])
+def test_malformed_bodies_are_client_errors(server, body):
+    httpd, runtime = server
+
+    status, _ = post(httpd, body)
+
+    assert status == 400
+    assert runtime.calls == []
@@ -6,14 +6,38 @@ from bedrock_kb_sync.bedrock_kb_sync_stack import BedrockKbSyncStack
 app = cdk.App()
 
 # Get configuration from context or use defaults
-schedule_expression = app.node.try_get_context('schedule_expression') or 'cron(0 0 * * ? *)'
+schedule_expression = app.node.try_get_context('schedule_expression') or 'rate(15 minutes)'
 kb_ids_parameter_name = app.node.try_get_context('kb_ids_parameter_name') or '/bedrock/kb/autosync/ids'
+kb_config_parameter_path = app.node.try_get_context('kb_config_parameter_path')
+max_concurrency = int(app.node.try_get_context('max_concurrency') or 8)
+start_job_tps = float(app.node.try_get_context('start_job_tps') or 0.1)
+default_interval_minutes = int(app.node.try_get_context('default_interval_minutes') or 1440)
+default_max_concurrent_jobs = int(app.node.try_get_context('default_max_concurrent_jobs') or 0)
+fan_out = str(app.node.try_get_context('fan_out')).lower() == 'true'
+shard_size = int(app.node.try_get_context('shard_size') or 0)
+shard_strategy = app.node.try_get_context('shard_strategy') or 'hash'
+worker_reserved_concurrency = int(app.node.try_get_context('worker_reserved_concurrency') or 2)
+xray_tracing = str(app.node.try_get_context('xray_tracing')).lower() == 'true'
+xray_sdk_layer_arn = app.node.try_get_context('xray_sdk_layer_arn')
+poll_schedule_expression = app.node.try_get_context('poll_schedule_expression') or 'rate(5 minutes)'
 
 BedrockKbSyncStack(
     app, 
     "BedrockKbSyncStack",
     schedule_expression=schedule_expression,
     kb_ids_parameter_name=kb_ids_parameter_name,
+    kb_config_parameter_path=kb_config_parameter_path,
+    max_concurrency=max_concurrency,
+    start_job_tps=start_job_tps,
+    poll_schedule_expression=poll_schedule_expression,
+    default_interval_minutes=default_interval_minutes,
+    default_max_concurrent_jobs=default_max_concurrent_jobs,
+    fan_out=fan_out,
+    shard_size=shard_size,
+    shard_strategy=shard_strategy,
+    worker_reserved_concurrency=worker_reserved_concurrency,
+    xray_tracing=xray_tracing,
+    xray_sdk_layer_arn=xray_sdk_layer_arn,
     env=cdk.Environment(
         account=os.environ.get("CDK_DEFAULT_ACCOUNT"),
         region=os.environ.get("CDK_DEFAULT_REGION")
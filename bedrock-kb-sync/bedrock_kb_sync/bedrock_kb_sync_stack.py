@@ -1,60 +1,266 @@
 from aws_cdk import (
     Duration,
+    RemovalPolicy,
     Stack,
+    aws_dynamodb as dynamodb,
     aws_lambda as lambda_,
     aws_events as events,
     aws_events_targets as targets,
     aws_iam as iam,
+    aws_lambda_event_sources as lambda_event_sources,
+    aws_sqs as sqs,
 )
 from constructs import Construct
 
+# Shard messages a worker invocation receives; one, so a shard has the whole timeout to itself
+SHARD_BATCH_SIZE = 1
+
+# Part of the worker timeout kept for change detection, state writes and the deadline margin
+WORKER_HEADROOM_SECONDS = 60
+
 class BedrockKbSyncStack(Stack):
 
     def __init__(self, scope: Construct, construct_id: str, 
                  schedule_expression: str = None,
                  kb_ids_parameter_name: str = None,
+                 kb_config_parameter_path: str = None,
+                 max_concurrency: int = None,
+                 start_job_tps: float = None,
+                 poll_schedule_expression: str = None,
+                 default_interval_minutes: int = None,
+                 default_max_concurrent_jobs: int = None,
+                 fan_out: bool = False,
+                 shard_size: int = None,
+                 shard_strategy: str = None,
+                 worker_reserved_concurrency: int = None,
+                 xray_tracing: bool = False,
+                 xray_sdk_layer_arn: str = None,
                  **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
-        # Default schedule is daily at midnight UTC if not specified
-        schedule_expression = schedule_expression or 'cron(0 0 * * ? *)'
+        # The sync Lambda runs on a frequent tick and only syncs the pairs that are due;
+        # pairs without their own intervalMinutes are due daily by default
+        schedule_expression = schedule_expression or 'rate(15 minutes)'
+        default_interval_minutes = default_interval_minutes or 1440
+        # Concurrent ingestion jobs per vector store for entries without maxConcurrentJobs (0: no limit)
+        default_max_concurrent_jobs = default_max_concurrent_jobs or 0
         kb_ids_parameter_name = kb_ids_parameter_name or '/bedrock/kb/ids'
+        # Optional path holding one parameter per KB; replaces the single parameter when set
+        kb_config_parameter_path = (kb_config_parameter_path or '').rstrip('/')
+        # Concurrent StartIngestionJob calls and the requests-per-second limit they share.
+        # Set start_job_tps to your account's StartIngestionJob quota.
+        max_concurrency = max_concurrency or 8
+        start_job_tps = start_job_tps or 0.1
+        # How often in-flight ingestion jobs are checked for completion
+        poll_schedule_expression = poll_schedule_expression or 'rate(5 minutes)'
+        # Fan-out mode: the scheduled run only enqueues shards of pairs for worker Lambdas.
+        # Without shard_size, shards are as large as a worker can start within its timeout.
+        shard_strategy = shard_strategy or 'hash'
+        worker_reserved_concurrency = worker_reserved_concurrency or 2
+        # Optional X-Ray active tracing; with the aws-xray-sdk layer every timed phase
+        # (change detection, StartIngestionJob, GetIngestionJob) is also a subsegment
+        self._tracing = lambda_.Tracing.ACTIVE if xray_tracing else None
+        self._layers = [
+            lambda_.LayerVersion.from_layer_version_arn(self, 'XRaySdkLayer', xray_sdk_layer_arn)
+        ] if xray_sdk_layer_arn else []
         
+        # Per-data-source sync state (content fingerprints, in-flight jobs and last job results)
+        state_table = dynamodb.Table(
+            self, 'BedrockKbSyncStateTable',
+            partition_key=dynamodb.Attribute(
+                name='dataSourceKey',
+                type=dynamodb.AttributeType.STRING
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=RemovalPolicy.DESTROY
+        )
+
+        sync_environment = {
+            'KB_IDS_PARAMETER_NAME': kb_ids_parameter_name,
+            'KB_SYNC_MAX_CONCURRENCY': str(max_concurrency),
+            'KB_SYNC_START_JOB_TPS': str(start_job_tps),
+            'KB_SYNC_STATE_TABLE_NAME': state_table.table_name,
+            'KB_SYNC_DEFAULT_INTERVAL_MINUTES': str(default_interval_minutes),
+            'KB_SYNC_DEFAULT_MAX_CONCURRENT_JOBS': str(default_max_concurrent_jobs),
+            'TELEMETRY_XRAY_SAMPLE_RATE': '1' if xray_tracing and xray_sdk_layer_arn else '0'
+        }
+        if kb_config_parameter_path:
+            sync_environment['KB_CONFIG_PARAMETER_PATH'] = kb_config_parameter_path
+
         # Create the Lambda function that will trigger the KB sync
         sync_lambda = lambda_.Function(
             self, 'BedrockKbSyncLambda',
             runtime=lambda_.Runtime.PYTHON_3_9,
             handler='kb_sync_handler.handler',
             code=lambda_.Code.from_asset('lambda/kb_sync'),
-            environment={
-                'KB_IDS_PARAMETER_NAME': kb_ids_parameter_name
-            },
-            timeout=Duration.minutes(5)
+            environment=sync_environment,
+            tracing=self._tracing,
+            layers=self._layers,
+            # Rate-limited dispatch of many pairs can take a while; the handler stops
+            # starting new jobs shortly before this timeout
+            timeout=Duration.minutes(15),
+            # One tick at a time, so overlapping runs cannot exceed the vector store limits
+            reserved_concurrent_executions=1
         )
         
         # Grant the Lambda function permission to read from SSM Parameter Store
-        sync_lambda.add_to_role_policy(iam.PolicyStatement(
-            actions=['ssm:GetParameter'],
-            resources=[
-                f'arn:aws:ssm:{self.region}:{self.account}:parameter{kb_ids_parameter_name}'
-            ]
-        ))
+        if kb_config_parameter_path:
+            sync_lambda.add_to_role_policy(iam.PolicyStatement(
+                actions=['ssm:GetParametersByPath'],
+                resources=[
+                    f'arn:aws:ssm:{self.region}:{self.account}:parameter{kb_config_parameter_path}',
+                    f'arn:aws:ssm:{self.region}:{self.account}:parameter{kb_config_parameter_path}/*'
+                ]
+            ))
+        else:
+            sync_lambda.add_to_role_policy(iam.PolicyStatement(
+                actions=['ssm:GetParameter'],
+                resources=[
+                    f'arn:aws:ssm:{self.region}:{self.account}:parameter{kb_ids_parameter_name}'
+                ]
+            ))
         
         # Grant the Lambda function permission to start ingestion jobs
         sync_lambda.add_to_role_policy(iam.PolicyStatement(
             actions=[
                 'bedrock:StartIngestionJob',
-                'bedrock:GetIngestionJob'
+                'bedrock:GetIngestionJob',
+                'bedrock:GetDataSource'
             ],
             resources=['*']  # You can restrict this to specific knowledge bases if needed
         ))
+
+        # Grant the Lambda function permission to list data source buckets for change detection
+        # and to keep the sync state
+        sync_lambda.add_to_role_policy(iam.PolicyStatement(
+            actions=['s3:ListBucket'],
+            resources=['*']  # You can restrict this to the data source buckets if needed
+        ))
+        state_table.grant_read_write_data(sync_lambda)
         
+        if fan_out:
+            self._add_shard_workers(
+                sync_lambda, sync_environment, state_table,
+                shard_size, shard_strategy, worker_reserved_concurrency, start_job_tps
+            )
+
         # Create the EventBridge rule to trigger the Lambda on schedule
         rule = events.Rule(
             self, 'BedrockKbSyncRule',
             schedule=events.Schedule.expression(schedule_expression),
-            description='Triggers the Bedrock Knowledge Base sync on a schedule'
+            description='Triggers the Bedrock Knowledge Base sync scheduler tick'
         )
         
         # Add the Lambda as a target for the rule
         rule.add_target(targets.LambdaFunction(sync_lambda))
+
+        # Create the Lambda function that tracks started ingestion jobs until they finish
+        poller_lambda = lambda_.Function(
+            self, 'BedrockKbIngestionJobPollerLambda',
+            runtime=lambda_.Runtime.PYTHON_3_9,
+            handler='ingestion_job_poller.handler',
+            code=lambda_.Code.from_asset('lambda/kb_sync'),
+            environment={
+                'KB_SYNC_MAX_CONCURRENCY': str(max_concurrency),
+                'KB_SYNC_STATE_TABLE_NAME': state_table.table_name,
+                'TELEMETRY_XRAY_SAMPLE_RATE': sync_environment['TELEMETRY_XRAY_SAMPLE_RATE']
+            },
+            tracing=self._tracing,
+            layers=self._layers,
+            timeout=Duration.minutes(5)
+        )
+
+        # Grant the poller permission to read ingestion job status and record results
+        poller_lambda.add_to_role_policy(iam.PolicyStatement(
+            actions=['bedrock:GetIngestionJob'],
+            resources=['*']  # You can restrict this to specific knowledge bases if needed
+        ))
+        state_table.grant_read_write_data(poller_lambda)
+
+        # Create the EventBridge rule to poll in-flight ingestion jobs
+        poll_rule = events.Rule(
+            self, 'BedrockKbIngestionJobPollRule',
+            schedule=events.Schedule.expression(poll_schedule_expression),
+            description='Checks in-flight Bedrock Knowledge Base ingestion jobs for completion'
+        )
+        poll_rule.add_target(targets.LambdaFunction(poller_lambda))
+
+    def _add_shard_workers(self, sync_lambda, sync_environment, state_table,
+                           shard_size, shard_strategy, worker_reserved_concurrency, start_job_tps):
+        """Add the shard queue and the worker Lambdas that consume it."""
+        worker_timeout = Duration.minutes(15)
+
+        # Workers run side by side, so they split the account's StartIngestionJob quota. At
+        # that pace every pair of a batch of shards has to be started before the timeout;
+        # otherwise the batch keeps timing out and ends up on the dead-letter queue.
+        worker_start_job_tps = start_job_tps / worker_reserved_concurrency
+        start_budget_seconds = worker_timeout.to_seconds() - WORKER_HEADROOM_SECONDS
+        max_shard_size = int(worker_start_job_tps * start_budget_seconds / SHARD_BATCH_SIZE)
+        if max_shard_size < 1:
+            raise ValueError(
+                f'A worker gets {worker_start_job_tps:g} StartIngestionJob calls per second and cannot start '
+                f'even one pair per shard in time; raise start_job_tps or lower worker_reserved_concurrency'
+            )
+        shard_size = shard_size or max_shard_size
+        if shard_size > max_shard_size:
+            raise ValueError(
+                f'shard_size {shard_size} is too large: at {worker_start_job_tps:g} StartIngestionJob calls per '
+                f'second per worker, a worker can start at most {max_shard_size} pairs per shard before its '
+                f'{int(worker_timeout.to_seconds())} s timeout'
+            )
+
+        # Shards that keep failing end up here; workers also park pairs that ran out of retries
+        shard_dead_letter_queue = sqs.Queue(
+            self, 'BedrockKbSyncShardDeadLetterQueue',
+            retention_period=Duration.days(14)
+        )
+        shard_queue = sqs.Queue(
+            self, 'BedrockKbSyncShardQueue',
+            # Lambda recommends six times the function timeout for SQS event sources
+            visibility_timeout=Duration.minutes(90),
+            dead_letter_queue=sqs.DeadLetterQueue(max_receive_count=3, queue=shard_dead_letter_queue)
+        )
+
+        sync_lambda.add_environment('KB_SYNC_SHARD_QUEUE_URL', shard_queue.queue_url)
+        sync_lambda.add_environment('KB_SYNC_SHARD_SIZE', str(shard_size))
+        sync_lambda.add_environment('KB_SYNC_SHARD_STRATEGY', shard_strategy)
+        shard_queue.grant_send_messages(sync_lambda)
+
+        worker_environment = dict(
+            sync_environment,
+            KB_SYNC_SHARD_QUEUE_URL=shard_queue.queue_url,
+            KB_SYNC_SHARD_DLQ_URL=shard_dead_letter_queue.queue_url,
+            KB_SYNC_START_JOB_TPS=str(worker_start_job_tps)
+        )
+        worker_lambda = lambda_.Function(
+            self, 'BedrockKbSyncShardWorkerLambda',
+            runtime=lambda_.Runtime.PYTHON_3_9,
+            handler='kb_sync_handler.shard_worker_handler',
+            code=lambda_.Code.from_asset('lambda/kb_sync'),
+            environment=worker_environment,
+            tracing=self._tracing,
+            layers=self._layers,
+            timeout=worker_timeout,
+            reserved_concurrent_executions=worker_reserved_concurrency
+        )
+        worker_lambda.add_event_source(lambda_event_sources.SqsEventSource(
+            shard_queue,
+            batch_size=SHARD_BATCH_SIZE,
+            report_batch_item_failures=True
+        ))
+        shard_queue.grant_send_messages(worker_lambda)
+        shard_dead_letter_queue.grant_send_messages(worker_lambda)
+
+        worker_lambda.add_to_role_policy(iam.PolicyStatement(
+            actions=[
+                'bedrock:StartIngestionJob',
+                'bedrock:GetIngestionJob',
+                'bedrock:GetDataSource'
+            ],
+            resources=['*']  # You can restrict this to specific knowledge bases if needed
+        ))
+        worker_lambda.add_to_role_policy(iam.PolicyStatement(
+            actions=['s3:ListBucket'],
+            resources=['*']  # You can restrict this to the data source buckets if needed
+        ))
+        state_table.grant_read_write_data(worker_lambda)
@@ -0,0 +1,76 @@
+"""
+Wall-clock time to start ingestion jobs for many KB/data source pairs.
+
+Runs kb_sync_handler against a stubbed SSM client and a local bedrock-agent stand-in
+with simulated per-call latency, at several concurrency levels. The EMF metric records the
+handler writes to stdout are discarded, or appended to the file named by ``BENCH_EMF_LOG``:
+
+    python benchmarks/bench_parallel_dispatch.py --pairs 500 --latency 0.05 --tps 50
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'lambda', 'kb_sync'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+from botocore.stub import Stubber  # noqa: E402
+
+import kb_sync_handler  # noqa: E402
+from tests.fakes import FakeBedrockAgentClient  # noqa: E402
+
+
+class BenchmarkContext:
+    def get_remaining_time_in_millis(self):
+        return 15 * 60 * 1000
+
+
+def run(pairs, concurrency, latency):
+    configs = [{'knowledgeBaseId': f'kb-{i}', 'dataSourceId': f'ds-{i}'} for i in range(pairs)]
+    os.environ['KB_SYNC_MAX_CONCURRENCY'] = str(concurrency)
+    fake = FakeBedrockAgentClient(latency=latency)
+    kb_sync_handler.bedrock_agent_client = fake
+
+    with Stubber(kb_sync_handler.ssm_client) as stubber:
+        stubber.add_response('get_parameter', {'Parameter': {'Value': json.dumps(configs)}})
+        with open(os.environ.get('BENCH_EMF_LOG') or os.devnull, 'a') as log, contextlib.redirect_stdout(log):
+            start = time.perf_counter()
+            response = kb_sync_handler.handler({}, BenchmarkContext())
+            elapsed = time.perf_counter() - start
+
+    results = json.loads(response['body'])['results']
+    started = sum(1 for r in results if r['status'] == 'started')
+    in_order = [r['knowledgeBaseId'] for r in results] == [c['knowledgeBaseId'] for c in configs]
+    return elapsed, started, in_order
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pairs', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.05, help='Simulated seconds per StartIngestionJob call')
+    parser.add_argument('--tps', type=float, default=50, help='StartIngestionJob requests per second allowed')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    args = parser.parse_args()
+
+    os.environ['KB_SYNC_START_JOB_TPS'] = str(args.tps)
+    os.environ['KB_SYNC_START_JOB_BURST'] = '1'
+    # Keep the per-pair log lines out of the report
+    kb_sync_handler.logger.setLevel('WARNING')
+
+    floor = args.pairs / args.tps
+    print(f"{args.pairs} pairs, {args.latency * 1000:.0f} ms per call, {args.tps} TPS limit (floor {floor:.1f}s)")
+    for concurrency in args.concurrency:
+        elapsed, started, in_order = run(args.pairs, concurrency, args.latency)
+        print(f"concurrency={concurrency:<4} {elapsed:7.2f}s started={started} in_order={in_order}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Deterministic simulation of the tick scheduler over a synthetic fleet of knowledge bases.
+
+Drives scheduler.plan_tick with a simulated clock: content changes at per-tier rates,
+StartIngestionJob calls are capped by the TPS limit and the Lambda run time, and jobs
+take a fixed per-KB duration. The tiered schedule (hourly hot KBs, six-hourly warm KBs,
+weekly cold archives, priorities and per-vector-store limits) is compared with the old
+single daily schedule:
+
+    python benchmarks/simulate_scheduling.py --kbs 1000 --days 3
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambda', 'kb_sync'))
+
+from kb_config import KbDataSource  # noqa: E402
+from scheduler import plan_tick, vector_store_key  # noqa: E402
+
+# name: (share of the fleet, interval minutes, priority, changes per day, job minutes range)
+TIERS = {
+    'hot': (0.05, 60, 10, 12.0, (5, 15)),
+    'warm': (0.25, 6 * 60, 5, 1.0, (10, 30)),
+    'cold': (0.70, 7 * 24 * 60, 0, 1 / 30, (20, 90)),
+}
+
+
+def build_fleet(kb_count, vector_stores, max_concurrent_jobs, seed):
+    """Return ``[(tier, KbDataSource, job_seconds, changes_per_second)]`` for a seeded synthetic fleet."""
+    rng = random.Random(seed)
+    fleet = []
+    for tier, (share, interval, priority, changes_per_day, job_minutes) in TIERS.items():
+        for _ in range(round(kb_count * share)):
+            index = len(fleet)
+            entry = KbDataSource(
+                f'kb-{index:05d}', f'ds-{index:05d}',
+                interval_minutes=interval,
+                priority=priority,
+                vector_store=f'store-{index % vector_stores}',
+                max_concurrent_jobs=max_concurrent_jobs
+            )
+            fleet.append((tier, entry, 60 * rng.uniform(*job_minutes), changes_per_day / 86400))
+    return fleet
+
+
+def simulate(fleet, days, tick_minutes, start_job_tps, run_seconds, seed, step_minutes=5):
+    """
+    Run the fleet for ``days``, advancing content changes and job completions every
+    ``step_minutes`` and the scheduler every ``tick_minutes``. The same ``seed`` produces the
+    same content changes whatever the schedule.
+    """
+    rng = random.Random(seed)
+    step_seconds = step_minutes * 60
+    tick_steps = max(1, tick_minutes // step_minutes)
+    max_starts_per_tick = max(1, int(start_job_tps * run_seconds))
+    entries = [entry for _, entry, _, _ in fleet]
+    by_pair = {entry[:2]: (tier, job_seconds, change_rate) for tier, entry, job_seconds, change_rate in fleet}
+
+    states = {}
+    dirty_since = {}
+    running = {}  # pair -> finish time
+    started, no_op_checks, backlog = 0, 0, []
+    freshness_lag = defaultdict(list)
+    peak_per_store = Counter()
+
+    for step in range(int(days * 86400 / step_seconds)):
+        now = step * step_seconds
+        # Jobs that finished since the last step; the poller has cleared their jobId
+        for pair, finish in list(running.items()):
+            if finish <= now:
+                del running[pair]
+                states[pair].pop('jobId', None)
+        # Content changes since the last step (one draw per pair, so every schedule sees the same changes)
+        for pair, (_, _, change_rate) in by_pair.items():
+            changed = rng.random() < change_rate * step_seconds
+            if changed and pair not in dirty_since:
+                dirty_since[pair] = now
+
+        if step % tick_steps:
+            continue
+
+        plan = plan_tick(entries, states, now)
+        starts = 0
+        waiting = len(plan.deferred)
+        for entry in plan.selected:
+            pair = entry[:2]
+            if pair in running:
+                continue
+            state = states.setdefault(pair, {})
+            if pair not in dirty_since:
+                # Change detection finds nothing new: no job, no embedding cost
+                state['lastCheckedAt'] = str(now)
+                no_op_checks += 1
+                continue
+            if starts == max_starts_per_tick:
+                # Out of StartIngestionJob budget for this run; still due on the next tick
+                waiting += 1
+                continue
+            state.update(lastCheckedAt=str(now), jobId=f'job-{started}')
+            tier, job_seconds, _ = by_pair[pair]
+            freshness_lag[tier].append((now - dirty_since.pop(pair)) / 60)
+            running[pair] = now + job_seconds
+            started += 1
+            starts += 1
+        backlog.append(waiting)
+
+        for store, count in Counter(vector_store_key(entry) for entry in entries if entry[:2] in running).items():
+            peak_per_store[store] = max(peak_per_store[store], count)
+
+    return {
+        'jobs': started,
+        'jobs_per_hour': started / (days * 24),
+        'no_op_checks': no_op_checks,
+        'mean_backlog': statistics.mean(backlog),
+        'max_backlog': max(backlog),
+        'peak_jobs_per_store': max(peak_per_store.values()) if peak_per_store else 0,
+        'freshness_lag': {
+            tier: (statistics.median(lags), sorted(lags)[int(0.95 * (len(lags) - 1))])
+            for tier, lags in freshness_lag.items()
+        },
+        'stale': {tier: sum(1 for pair in dirty_since if by_pair[pair][0] == tier) for tier in TIERS}
+    }
+
+
+def daily_fleet(fleet):
+    """The same fleet on the old schedule: every KB once a day, no priorities, no limits."""
+    return [
+        (tier, entry._replace(interval_minutes=24 * 60, priority=0, max_concurrent_jobs=None), job_seconds, rate)
+        for tier, entry, job_seconds, rate in fleet
+    ]
+
+
+def report(name, result):
+    print(f"{name}: {result['jobs']} jobs ({result['jobs_per_hour']:.1f}/h), {result['no_op_checks']} no-op checks, "
+          f"backlog mean {result['mean_backlog']:.1f} max {result['max_backlog']}, "
+          f"peak {result['peak_jobs_per_store']} jobs per vector store")
+    for tier in TIERS:
+        p50, p95 = result['freshness_lag'].get(tier, (float('nan'), float('nan')))
+        print(f"    {tier:<5} change-to-ingestion lag p50 {p50:7.0f} min  p95 {p95:7.0f} min  "
+              f"still stale at the end: {result['stale'][tier]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--kbs', type=int, default=1000)
+    parser.add_argument('--days', type=float, default=3)
+    parser.add_argument('--vector-stores', type=int, default=10)
+    parser.add_argument('--max-concurrent-jobs', type=int, default=4, help='Ingestion jobs per vector store')
+    parser.add_argument('--tick-minutes', type=int, default=15)
+    parser.add_argument('--tps', type=float, default=0.1, help='StartIngestionJob requests per second allowed')
+    parser.add_argument('--run-seconds', type=int, default=840, help='Time each scheduler run has to start jobs')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    fleet = build_fleet(args.kbs, args.vector_stores, args.max_concurrent_jobs, args.seed)
+    print(f"{args.kbs} KBs on {args.vector_stores} vector stores over {args.days:g} days, "
+          f"{args.tps} TPS for {args.run_seconds}s per run")
+    report(f'tiered, {args.tick_minutes}-minute tick',
+           simulate(fleet, args.days, args.tick_minutes, args.tps, args.run_seconds, args.seed))
+    report('daily, one run a day',
+           simulate(daily_fleet(fleet), args.days, 24 * 60, args.tps, args.run_seconds, args.seed))
+
+
+if __name__ == '__main__':
+    main()
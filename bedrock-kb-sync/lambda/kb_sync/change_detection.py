@@ -0,0 +1,50 @@
+import hashlib
+import time
+
+
+def s3_fingerprint(s3_client, bucket, prefixes=None, expected_bucket_owner=None, deadline=None, clock=time.monotonic):
+    """
+    Digest of every object under ``prefixes`` in ``bucket`` (key, ETag, size, last modified).
+
+    Listing is paginated and each page is folded into the hash as it arrives, so memory
+    stays constant no matter how many objects the data source holds. Raises TimeoutError
+    when the listing has not finished by ``deadline`` (a value of ``clock``), so a very
+    large bucket cannot use up the whole invocation.
+    """
+    digest = hashlib.sha256()
+    paginator = s3_client.get_paginator('list_objects_v2')
+    extra_args = {'ExpectedBucketOwner': expected_bucket_owner} if expected_bucket_owner else {}
+    for prefix in sorted(prefixes or ['']):
+        digest.update(b'prefix\0' + prefix.encode() + b'\n')
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix, **extra_args):
+            for obj in page.get('Contents', ()):
+                digest.update(
+                    f"{obj['Key']}\0{obj.get('ETag', '')}\0{obj.get('Size', 0)}\0{obj.get('LastModified', '')}\n".encode()
+                )
+            if deadline is not None and clock() >= deadline:
+                raise TimeoutError(f'Listing s3://{bucket}/{prefix} did not finish before the deadline')
+    return digest.hexdigest()
+
+
+def data_source_fingerprint(bedrock_agent_client, s3_client, kb_id, data_source_id, deadline=None):
+    """
+    Fingerprint the contents of an S3 data source, stopping at ``deadline`` (see s3_fingerprint).
+
+    Returns None for data sources that are not backed by S3 (web crawler, Confluence, ...),
+    which are always synced.
+    """
+    data_source = bedrock_agent_client.get_data_source(
+        knowledgeBaseId=kb_id,
+        dataSourceId=data_source_id
+    )['dataSource']
+    s3_configuration = data_source.get('dataSourceConfiguration', {}).get('s3Configuration')
+    if not s3_configuration:
+        return None
+    bucket = s3_configuration['bucketArn'].split(':::', 1)[-1]
+    return s3_fingerprint(
+        s3_client,
+        bucket,
+        s3_configuration.get('inclusionPrefixes'),
+        s3_configuration.get('bucketOwnerAccountId'),
+        deadline
+    )
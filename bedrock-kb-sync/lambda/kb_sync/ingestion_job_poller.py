@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import boto3
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+
+from ingestion_jobs import IN_FLIGHT_STATUSES, call_with_backoff, record_job_result
+from rate_limiter import TokenBucket
+from sync_state import SyncStateStore
+from telemetry import Metrics
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Initialize clients. Throttled GetIngestionJob calls are retried by call_with_backoff.
+bedrock_agent_client = boto3.client(
+    'bedrock-agent',
+    config=Config(
+        retries={'max_attempts': 1, 'mode': 'standard'},
+        max_pool_connections=int(os.environ.get('KB_SYNC_MAX_CONCURRENCY', '8'))
+    )
+)
+dynamodb_client = boto3.client('dynamodb')
+
+# CloudWatch namespace shared with the sync Lambda's metrics
+METRICS_NAMESPACE = 'BedrockKbSync'
+
+# Stop polling this many seconds before the Lambda times out
+DEADLINE_SAFETY_MARGIN_SECONDS = 10
+
+
+def next_poll_at(poll_count, now):
+    """Epoch seconds of the next check of a job that has been polled ``poll_count`` times."""
+    base_interval = float(os.environ.get('KB_SYNC_POLL_BASE_INTERVAL', '60'))
+    max_interval = float(os.environ.get('KB_SYNC_POLL_MAX_INTERVAL', '1800'))
+    return now + min(max_interval, base_interval * 2 ** poll_count)
+
+
+def poll_job(state_store, kb_id, data_source_id, state, rate_limiter, deadline, now, metrics):
+    """
+    Check one tracked ingestion job and return its result record.
+
+    Finished jobs have their status, duration and statistics recorded in the sync state.
+    Running jobs are checked again after an exponentially growing interval. Both writes are
+    conditional on the state still tracking the job, so a result the sync Lambda recorded,
+    or a job it started, since the state was read is not overwritten.
+    """
+    job_id = state['jobId']
+    try:
+        with metrics.timer('GetIngestionJobLatency'):
+            job = call_with_backoff(
+                lambda: bedrock_agent_client.get_ingestion_job(
+                    knowledgeBaseId=kb_id,
+                    dataSourceId=data_source_id,
+                    ingestionJobId=job_id
+                ),
+                rate_limiter,
+                deadline,
+                f'get ingestion job {job_id} for KB {kb_id}, Data Source {data_source_id}',
+                metrics
+            )['ingestionJob']
+
+        if job['status'] in IN_FLIGHT_STATUSES:
+            poll_count = int(state.get('pollCount', '0')) + 1
+            state_store.put(kb_id, data_source_id, dict(
+                state,
+                jobStatus=job['status'],
+                pollCount=poll_count,
+                nextPollAt=int(next_poll_at(poll_count, now))
+            ), expected_job_id=job_id)
+            return {
+                'knowledgeBaseId': kb_id,
+                'dataSourceId': data_source_id,
+                'jobId': job_id,
+                'status': job['status']
+            }
+
+        new_state = record_job_result(state, job)
+        if not state_store.put(kb_id, data_source_id, new_state, expected_job_id=job_id):
+            logger.info(f"Ingestion job {job_id} for KB: {kb_id}, Data Source: {data_source_id} was recorded by the sync Lambda")
+        if new_state.get('lastJobDurationSeconds') is not None:
+            metrics.put('IngestionJobDuration', new_state['lastJobDurationSeconds'], 'Seconds')
+        metrics.put('JobsFailed' if job['status'] == 'FAILED' else 'JobsFinished', 1, 'Count')
+        logger.info(
+            f"Ingestion job {job_id} for KB: {kb_id}, Data Source: {data_source_id} finished with status "
+            f"{job['status']} after {new_state['lastJobDurationSeconds']}s, statistics: {new_state['lastJobStatistics']}"
+        )
+        return {
+            'knowledgeBaseId': kb_id,
+            'dataSourceId': data_source_id,
+            'jobId': job_id,
+            'status': job['status'],
+            'durationSeconds': new_state['lastJobDurationSeconds'],
+            'statistics': job.get('statistics') or {}
+        }
+
+    except Exception as poll_error:
+        metrics.put('Errors', 1, 'Count')
+        logger.error(f"Error polling job {job_id} for KB {kb_id}, Data Source {data_source_id}: {str(poll_error)}")
+        return {
+            'knowledgeBaseId': kb_id,
+            'dataSourceId': data_source_id,
+            'jobId': job_id,
+            'status': 'error',
+            'error': str(poll_error)
+        }
+
+
+def handler(event, context):
+    """
+    Lambda handler that tracks the ingestion jobs started by the sync Lambda until they finish.
+
+    Every data source with a job in flight is read from the sync state table, and the jobs
+    that are due are checked with GetIngestionJob concurrently, under a token bucket that keeps
+    the calls within the configured requests-per-second limit. Final status, duration and
+    document statistics are recorded in the state table and logged.
+    """
+    metrics = Metrics(METRICS_NAMESPACE, 'KbIngestionJobPoller')
+    try:
+        state_store = SyncStateStore(os.environ['KB_SYNC_STATE_TABLE_NAME'], dynamodb_client)
+        max_concurrency = int(os.environ.get('KB_SYNC_MAX_CONCURRENCY', '8'))
+        rate_limiter = TokenBucket(
+            rate=float(os.environ.get('KB_SYNC_GET_JOB_TPS', '5')),
+            capacity=float(os.environ.get('KB_SYNC_GET_JOB_BURST', '5'))
+        )
+
+        deadline = None
+        if context is not None:
+            remaining_seconds = context.get_remaining_time_in_millis() / 1000
+            deadline = time.monotonic() + remaining_seconds - DEADLINE_SAFETY_MARGIN_SECONDS
+
+        now = time.time()
+        tracked_jobs = list(state_store.list_tracked_jobs())
+        due_jobs = [job for job in tracked_jobs if float(job[2].get('nextPollAt', '0')) <= now]
+        logger.info(f"Tracking {len(tracked_jobs)} ingestion jobs, {len(due_jobs)} due for a check")
+        metrics.put('TrackedJobs', len(tracked_jobs), 'Count')
+
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            results = list(executor.map(
+                lambda job: poll_job(state_store, *job, rate_limiter, deadline, now, metrics),
+                due_jobs
+            ))
+
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'message': f'Checked {len(due_jobs)} of {len(tracked_jobs)} tracked ingestion jobs',
+                'results': results
+            })
+        }
+
+    except Exception as e:
+        logger.error(f"Error in ingestion job polling: {str(e)}")
+        metrics.put('Errors', 1, 'Count')
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'message': 'Error in ingestion job polling',
+                'error': str(e)
+            })
+        }
+
+    finally:
+        metrics.flush()
@@ -0,0 +1,91 @@
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+# Error codes that mean "slow down" rather than "this request is wrong"
+THROTTLING_ERROR_CODES = ('ThrottlingException', 'TooManyRequestsException')
+
+# Ingestion job statuses that mean the job may still be running
+IN_FLIGHT_STATUSES = ('STARTING', 'IN_PROGRESS', 'STOPPING')
+
+
+def call_with_backoff(call, rate_limiter, deadline, description, metrics=None):
+    """
+    Make one bedrock-agent call under the shared rate limiter.
+
+    Throttled calls are retried with exponential backoff and full jitter, and counted as
+    ``Throttles`` on ``metrics``. Raises TimeoutError if the rate limiter cannot grant a
+    call before ``deadline``.
+    """
+    max_attempts = int(os.environ.get('KB_SYNC_MAX_ATTEMPTS', '5'))
+    base_delay = float(os.environ.get('KB_SYNC_RETRY_BASE_DELAY', '1'))
+    max_delay = float(os.environ.get('KB_SYNC_RETRY_MAX_DELAY', '20'))
+
+    for attempt in range(max_attempts):
+        if not rate_limiter.acquire(deadline):
+            raise TimeoutError(f'Not enough time left in this run to {description}')
+        try:
+            return call()
+        except ClientError as e:
+            if e.response['Error']['Code'] not in THROTTLING_ERROR_CODES or attempt == max_attempts - 1:
+                raise
+            if metrics is not None:
+                metrics.put('Throttles', 1, 'Count')
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            logger.warning(f"Throttled trying to {description}; retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _timestamp(value):
+    """Return an API timestamp (datetime from boto3, string from stubs) as an ISO 8601 string."""
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _parse_timestamp(value):
+    if isinstance(value, datetime) or value is None:
+        return value
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+def job_duration_seconds(job):
+    """Seconds between a job's start and its last status change, or None if either is unknown."""
+    started_at = _parse_timestamp(job.get('startedAt'))
+    updated_at = _parse_timestamp(job.get('updatedAt'))
+    if started_at is None or updated_at is None:
+        return None
+    return round((updated_at - started_at).total_seconds(), 3)
+
+
+def record_job_result(state, job):
+    """
+    Return the sync state after a tracked ingestion job has finished.
+
+    The job's status, duration and statistics become the ``lastJob*`` attributes. When the
+    job completed, the fingerprint it ingested becomes the last successful one.
+    """
+    new_state = {
+        name: value for name, value in state.items()
+        if name not in ('jobId', 'jobStatus', 'jobStartedAt', 'pendingFingerprint', 'nextPollAt', 'pollCount')
+    }
+    if job['status'] == 'COMPLETE' and state.get('pendingFingerprint'):
+        new_state['fingerprint'] = state['pendingFingerprint']
+    new_state.update({
+        'lastJobId': job['ingestionJobId'],
+        'lastJobStatus': job['status'],
+        'lastJobStartedAt': _timestamp(job.get('startedAt')),
+        'lastJobEndedAt': _timestamp(job.get('updatedAt')),
+        'lastJobDurationSeconds': job_duration_seconds(job),
+        'lastJobStatistics': json.dumps(job.get('statistics') or {}, sort_keys=True),
+        'lastJobFailureReasons': json.dumps(job['failureReasons']) if job.get('failureReasons') else None
+    })
+    return new_state
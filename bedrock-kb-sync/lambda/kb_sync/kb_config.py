@@ -0,0 +1,160 @@
+import json
+import logging
+import time
+from typing import NamedTuple, Optional, Tuple
+
+logger = logging.getLogger()
+
+
+class KbDataSource(NamedTuple):
+    """
+    One validated knowledge base and data source pair to sync, with its scheduling metadata.
+
+    ``interval_minutes`` is how often the pair is due (None uses the deployment default),
+    ``priority`` orders due pairs (higher first), and ``vector_store`` names the vector
+    backend the KB writes to, which runs at most ``max_concurrent_jobs`` ingestion jobs at
+    a time.
+    """
+    knowledge_base_id: str
+    data_source_id: str
+    interval_minutes: Optional[int] = None
+    priority: int = 0
+    vector_store: Optional[str] = None
+    max_concurrent_jobs: Optional[int] = None
+
+
+def _optional_int(kb_config, name, minimum=None):
+    value = kb_config.get(name)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f'{name} must be an integer')
+    if minimum is not None and value < minimum:
+        raise ValueError(f'{name} must be at least {minimum}')
+    return value
+
+
+class KbConfig(NamedTuple):
+    """
+    Parsed KB configuration.
+
+    ``entries`` are the valid pairs in configuration order; ``rejected`` holds a ready-made
+    result record for every entry that could not be used.
+    """
+    entries: Tuple[KbDataSource, ...]
+    rejected: Tuple[dict, ...]
+
+
+def parse_kb_configs(raw_configs):
+    """Validate raw configuration entries once into a KbConfig."""
+    entries = []
+    rejected = []
+    seen = set()
+    for kb_config in raw_configs:
+        # Current format: object with knowledgeBaseId and dataSourceId
+        if (
+            isinstance(kb_config, dict)
+            and isinstance(kb_config.get('knowledgeBaseId'), str) and kb_config['knowledgeBaseId']
+            and isinstance(kb_config.get('dataSourceId'), str) and kb_config['dataSourceId']
+        ):
+            try:
+                entry = KbDataSource(
+                    kb_config['knowledgeBaseId'],
+                    kb_config['dataSourceId'],
+                    interval_minutes=_optional_int(kb_config, 'intervalMinutes', 1),
+                    priority=_optional_int(kb_config, 'priority') or 0,
+                    vector_store=kb_config.get('vectorStore') or None,
+                    max_concurrent_jobs=_optional_int(kb_config, 'maxConcurrentJobs', 1)
+                )
+                if entry.vector_store is not None and not isinstance(entry.vector_store, str):
+                    raise ValueError('vectorStore must be a string')
+            except ValueError as config_error:
+                logger.error(f"Invalid KB configuration {kb_config}: {str(config_error)}")
+                rejected.append({
+                    'config': kb_config,
+                    'status': 'error',
+                    'reason': f'Invalid configuration: {str(config_error)}'
+                })
+                continue
+
+            pair = entry[:2]
+            if pair in seen:
+                logger.warning(f"Duplicate KB configuration for {entry.knowledge_base_id}, Data Source {entry.data_source_id} ignored")
+                continue
+            seen.add(pair)
+            entries.append(entry)
+
+        # Legacy format: just the KB ID string
+        elif isinstance(kb_config, str):
+            logger.warning(f"Legacy KB ID format detected for {kb_config}. Please update to new format with dataSourceId.")
+            rejected.append({
+                'knowledgeBaseId': kb_config,
+                'status': 'skipped',
+                'reason': 'Missing dataSourceId. Please update parameter store with new format.'
+            })
+
+        else:
+            logger.error(f"Invalid KB configuration format: {kb_config}")
+            rejected.append({
+                'config': kb_config,
+                'status': 'error',
+                'reason': 'Invalid configuration format'
+            })
+    return KbConfig(tuple(entries), tuple(rejected))
+
+
+class KbConfigLoader:
+    """
+    Loads the KB configuration from SSM Parameter Store and caches it in the warm container.
+
+    The configuration is read from either one parameter holding a JSON array of entries, or
+    from every parameter under a path (one entry, or a JSON array of entries, per parameter),
+    which lifts the 8 KB parameter size limit on the number of pairs. Parsed configurations
+    are reused for ``ttl_seconds``.
+    """
+
+    def __init__(self, ssm_client, ttl_seconds=300, clock=time.monotonic):
+        self.ssm_client = ssm_client
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._cached = {}
+
+    def load(self, parameter_name=None, parameter_path=None):
+        source = ('path', parameter_path) if parameter_path else ('parameter', parameter_name)
+        cached = self._cached.get(source)
+        if cached is not None and self.clock() < cached[0]:
+            return cached[1]
+
+        if parameter_path:
+            raw_configs = self._read_path(parameter_path)
+        else:
+            raw_configs = self._read_parameter(parameter_name)
+        config = parse_kb_configs(raw_configs)
+        self._cached[source] = (self.clock() + self.ttl_seconds, config)
+        return config
+
+    def _read_parameter(self, parameter_name):
+        logger.info(f"Retrieving KB config from parameter: {parameter_name}")
+        response = self.ssm_client.get_parameter(
+            Name=parameter_name,
+            WithDecryption=True
+        )
+        return json.loads(response['Parameter']['Value'])
+
+    def _read_path(self, parameter_path):
+        logger.info(f"Retrieving KB config from parameters under: {parameter_path}")
+        parameters = []
+        paginator = self.ssm_client.get_paginator('get_parameters_by_path')
+        for page in paginator.paginate(Path=parameter_path, Recursive=True, WithDecryption=True):
+            parameters.extend(page['Parameters'])
+
+        # Order by parameter name so results are reported in a stable order
+        raw_configs = []
+        for parameter in sorted(parameters, key=lambda p: p['Name']):
+            try:
+                value = json.loads(parameter['Value'])
+            except ValueError:
+                logger.error(f"Parameter {parameter['Name']} does not hold valid JSON")
+                value = {'parameter': parameter['Name']}
+            raw_configs.extend(value if isinstance(value, list) else [value])
+        return raw_configs
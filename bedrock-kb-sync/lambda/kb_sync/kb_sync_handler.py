@@ -1,101 +1,386 @@
 import os
 import json
+import time
 import boto3
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from botocore.config import Config
+
+from change_detection import data_source_fingerprint
+from ingestion_jobs import IN_FLIGHT_STATUSES, call_with_backoff, record_job_result
+from kb_config import KbConfigLoader
+from rate_limiter import TokenBucket
+from scheduler import plan_tick, vector_store_key
+from shard_planner import enqueue_shards, parse_shard_message, plan_shards, shard_message
+from sync_state import SyncStateStore
+from telemetry import Metrics
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize clients
+# Initialize clients. Throttled StartIngestionJob calls are retried by start_ingestion_job
+# with our own backoff, so botocore does not retry on top of that.
 ssm_client = boto3.client('ssm')
-bedrock_agent_client = boto3.client('bedrock-agent')
+bedrock_agent_client = boto3.client(
+    'bedrock-agent',
+    config=Config(
+        retries={'max_attempts': 1, 'mode': 'standard'},
+        max_pool_connections=int(os.environ.get('KB_SYNC_MAX_CONCURRENCY', '8'))
+    )
+)
+s3_client = boto3.client(
+    's3',
+    config=Config(max_pool_connections=int(os.environ.get('KB_SYNC_MAX_CONCURRENCY', '8')))
+)
+dynamodb_client = boto3.client('dynamodb')
+sqs_client = boto3.client('sqs')
+
+# KB configuration loader, built once per container so the parsed config is reused while warm
+_config_loader = None
+
+# CloudWatch namespace of the dispatch latency and throttle metrics
+METRICS_NAMESPACE = 'BedrockKbSync'
+
+# Stop taking new work this many seconds before the Lambda times out
+DEADLINE_SAFETY_MARGIN_SECONDS = 10
+
+
+def get_config_loader():
+    """Return the container-wide KB config loader, creating it on first use."""
+    global _config_loader
+    if _config_loader is None:
+        _config_loader = KbConfigLoader(
+            ssm_client,
+            ttl_seconds=float(os.environ.get('KB_CONFIG_CACHE_TTL_SECONDS', '300'))
+        )
+    return _config_loader
+
+
+def start_ingestion_job(kb_id, data_source_id, rate_limiter, deadline, metrics=None):
+    """
+    Start one ingestion job under the shared rate limiter.
+
+    Throttled calls are retried with exponential backoff and full jitter. Raises
+    TimeoutError if the rate limiter cannot grant a call before ``deadline``.
+    """
+    return call_with_backoff(
+        lambda: bedrock_agent_client.start_ingestion_job(
+            knowledgeBaseId=kb_id,
+            dataSourceId=data_source_id
+        ),
+        rate_limiter,
+        deadline,
+        f'start the ingestion job for KB {kb_id}, Data Source {data_source_id}',
+        metrics
+    )
+
+
+def load_sync_state(state_store, kb_id, data_source_id):
+    """
+    Return the stored sync state for a data source.
+
+    If the job started by an earlier run has finished since the poller last looked at it,
+    its result is recorded first, so ``jobId`` is only left set while that job is running.
+    """
+    state = state_store.get(kb_id, data_source_id)
+    if state.get('jobId'):
+        job = bedrock_agent_client.get_ingestion_job(
+            knowledgeBaseId=kb_id,
+            dataSourceId=data_source_id,
+            ingestionJobId=state['jobId']
+        )['ingestionJob']
+        if job['status'] not in IN_FLIGHT_STATUSES:
+            new_state = record_job_result(state, job)
+            if state_store.put(kb_id, data_source_id, new_state, expected_job_id=state['jobId']):
+                return new_state
+            # The poller recorded the result first; its write is the current state
+            return state_store.get(kb_id, data_source_id)
+    return state
+
+
+def sync_kb_config(entry, rate_limiter, deadline, metrics, state_store=None, force=False):
+    """
+    Start the ingestion job for one validated KbDataSource entry and return its result record.
+
+    With a ``state_store``, data sources whose previous job is still running are skipped
+    before their contents are listed, and so are S3 data sources whose contents have not
+    changed since the last successful ingestion job unless ``force`` is set. Data sources
+    whose state cannot be loaded are skipped too, since a job may be running for them.
+    Change detection stops at ``deadline`` like the job start does.
+    """
+    kb_id, data_source_id = entry.knowledge_base_id, entry.data_source_id
+
+    state = {}
+    fingerprint = None
+    if state_store is not None:
+        try:
+            state = load_sync_state(state_store, kb_id, data_source_id)
+        except Exception as state_error:
+            logger.warning(f"Could not load the sync state of KB {kb_id}, Data Source {data_source_id}: {str(state_error)}")
+            # Still due, so a later tick tries again
+            return {
+                'knowledgeBaseId': kb_id,
+                'dataSourceId': data_source_id,
+                'status': 'skipped',
+                'reason': f'Sync state could not be loaded: {str(state_error)}'
+            }
+
+        if state.get('jobId'):
+            logger.info(f"Previous ingestion job {state['jobId']} for KB: {kb_id}, Data Source: {data_source_id} is still running; skipping")
+            return {
+                'knowledgeBaseId': kb_id,
+                'dataSourceId': data_source_id,
+                'jobId': state['jobId'],
+                'status': 'skipped',
+                'reason': 'Previous ingestion job is still in progress'
+            }
+
+        with metrics.timer('ChangeDetection'):
+            try:
+                fingerprint = data_source_fingerprint(bedrock_agent_client, s3_client, kb_id, data_source_id, deadline)
+            except TimeoutError as timeout_error:
+                # No time is left to start a job either; the pair stays due for a later run
+                logger.warning(f"Change detection for KB {kb_id}, Data Source {data_source_id} stopped: {str(timeout_error)}")
+                return {
+                    'knowledgeBaseId': kb_id,
+                    'dataSourceId': data_source_id,
+                    'status': 'error',
+                    'error': str(timeout_error)
+                }
+            except Exception as detection_error:
+                # Change detection fails open: if it cannot run, the data source is synced
+                logger.warning(f"Change detection failed for KB {kb_id}, Data Source {data_source_id}: {str(detection_error)}")
+
+        if not force and fingerprint is not None and fingerprint == state.get('fingerprint'):
+            logger.info(f"No changes for KB: {kb_id}, Data Source: {data_source_id}; skipping ingestion job")
+            # Checked: the scheduler waits a full interval before looking at it again. A job
+            # another run started in the meantime is left in place.
+            state_store.put(kb_id, data_source_id, dict(state, lastCheckedAt=int(time.time())), expected_job_id='')
+            return {
+                'knowledgeBaseId': kb_id,
+                'dataSourceId': data_source_id,
+                'status': 'skipped',
+                'reason': 'No changes since the last successful ingestion job'
+            }
+
+    try:
+        logger.info(f"Starting ingestion job for KB: {kb_id}, Data Source: {data_source_id}")
+
+        # Dispatch latency includes waiting for the rate limiter and throttle retries
+        with metrics.timer('DispatchLatency'):
+            response = start_ingestion_job(kb_id, data_source_id, rate_limiter, deadline, metrics)
+        job_id = response['ingestionJob']['ingestionJobId']
+
+        logger.info(f"Successfully started KB sync job for {kb_id}, Data Source: {data_source_id}, Job ID: {job_id}")
+
+        if state_store is not None:
+            # Tracked until the poller (or a later run) records the job's result
+            tracked = state_store.put(kb_id, data_source_id, dict(
+                state,
+                pendingFingerprint=fingerprint,
+                jobId=job_id,
+                jobStatus=response['ingestionJob'].get('status', 'STARTING'),
+                jobStartedAt=datetime.now(timezone.utc).isoformat(),
+                lastCheckedAt=int(time.time())
+            ), expected_job_id='')
+            if not tracked:
+                logger.warning(f"Another run is already tracking a job for KB {kb_id}, Data Source {data_source_id}; job {job_id} is not tracked")
+
+        return {
+            'knowledgeBaseId': kb_id,
+            'dataSourceId': data_source_id,
+            'jobId': job_id,
+            'status': 'started'
+        }
+
+    except Exception as kb_error:
+        logger.error(f"Error syncing KB {kb_id}, Data Source {data_source_id}: {str(kb_error)}")
+        return {
+            'knowledgeBaseId': kb_id,
+            'dataSourceId': data_source_id,
+            'status': 'error',
+            'error': str(kb_error)
+        }
+
+
+def get_deadline(context):
+    """Monotonic time after which no new work should be taken, or None without a Lambda context."""
+    if context is None:
+        return None
+    remaining_seconds = context.get_remaining_time_in_millis() / 1000
+    return time.monotonic() + remaining_seconds - DEADLINE_SAFETY_MARGIN_SECONDS
+
+
+def get_state_store():
+    """Return the sync state store, or None when no state table is configured."""
+    state_table_name = os.environ.get('KB_SYNC_STATE_TABLE_NAME')
+    return SyncStateStore(state_table_name, dynamodb_client) if state_table_name else None
+
+
+def plan_sync(entries, state_store, force=False):
+    """Plan this tick: which entries are due, in priority order, within vector store limits."""
+    states = {}
+    if state_store is not None:
+        states = {(kb_id, data_source_id): state for kb_id, data_source_id, state in state_store.list_states()}
+    plan = plan_tick(
+        entries,
+        states,
+        time.time(),
+        default_interval_minutes=int(os.environ.get('KB_SYNC_DEFAULT_INTERVAL_MINUTES', '1440')),
+        default_max_concurrent_jobs=int(os.environ.get('KB_SYNC_DEFAULT_MAX_CONCURRENT_JOBS', '0')),
+        force=force,
+        lease_seconds=60 * float(os.environ.get('KB_SYNC_ENQUEUE_LEASE_MINUTES', '360'))
+    )
+    logger.info(
+        f"{len(plan.selected)} pairs due, {len(plan.deferred)} deferred by vector store limits, "
+        f"{plan.leased} waiting in the shard queue, {plan.not_due} not due"
+    )
+    return plan
+
+
+def update_leases(state_store, entries, lease):
+    """Lease (``lease=True``) or release the given entries in the state table concurrently."""
+    if state_store is None or not entries:
+        return
+    now = time.time()
+
+    def update(entry):
+        if lease:
+            state_store.lease(entry.knowledge_base_id, entry.data_source_id, now)
+        else:
+            state_store.release(entry.knowledge_base_id, entry.data_source_id)
+
+    max_concurrency = int(os.environ.get('KB_SYNC_MAX_CONCURRENCY', '8'))
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        list(executor.map(update, entries))
+
+
+def deferred_result(entry):
+    return {
+        'knowledgeBaseId': entry.knowledge_base_id,
+        'dataSourceId': entry.data_source_id,
+        'status': 'deferred',
+        'reason': f'Vector store {vector_store_key(entry)} is at its concurrent ingestion job limit'
+    }
+
+
+def put_result_metrics(metrics, results):
+    """Count started, skipped and failed pairs of a sync_entries() call."""
+    for status, metric_name in (('started', 'JobsStarted'), ('skipped', 'PairsSkipped'), ('error', 'PairErrors')):
+        metrics.put(metric_name, sum(1 for result in results if result['status'] == status), 'Count')
+
+
+def sync_entries(entries, deadline, metrics, force=False):
+    """
+    Start ingestion jobs for KbDataSource entries concurrently and return their result records.
+
+    Jobs are started by a bounded thread pool, under a token bucket that keeps
+    StartIngestionJob calls within the configured requests-per-second limit; map() keeps
+    the results in the order of ``entries``.
+    """
+    max_concurrency = int(os.environ.get('KB_SYNC_MAX_CONCURRENCY', '8'))
+    rate_limiter = TokenBucket(
+        rate=float(os.environ.get('KB_SYNC_START_JOB_TPS', '0.1')),
+        capacity=float(os.environ.get('KB_SYNC_START_JOB_BURST', '1'))
+    )
+    state_store = get_state_store()
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        return list(executor.map(
+            lambda entry: sync_kb_config(entry, rate_limiter, deadline, metrics, state_store, force),
+            entries
+        ))
+
 
 def handler(event, context):
     """
     Lambda handler to trigger Bedrock Knowledge Base sync for specific KB and data source pairs.
-    
+
     This function retrieves a list of KB and data source pairs from SSM Parameter Store
-    and initiates a sync job for each specific pair.
+    (one JSON array parameter, or one parameter per KB under ``KB_CONFIG_PARAMETER_PATH``)
+    and initiates a sync job for each specific pair. Jobs are started concurrently by a
+    bounded thread pool, under a token bucket that keeps StartIngestionJob calls within
+    the configured requests-per-second limit.
+
+    The handler runs on a frequent tick and only syncs the pairs that are due by their
+    ``intervalMinutes``, highest ``priority`` first, without exceeding the concurrent job
+    limit of the vector store they write to; pairs over the limit are deferred to a later
+    tick.
+
+    When a sync state table is configured, data sources whose previous job is still running
+    are skipped, and so are S3 data sources that have not changed since their last
+    successful job. Pass ``{"force": true}`` in the event to sync every pair now, and to start
+    unchanged data sources regardless.
+
+    In fan-out mode (``KB_SYNC_SHARD_QUEUE_URL`` set) this invocation only plans: the pairs
+    are split into shards and enqueued for shard_worker_handler. Enqueued pairs are leased
+    in the state table, so later ticks do not enqueue them again before a worker has
+    handled them.
     """
+    metrics = Metrics(METRICS_NAMESPACE, 'KbSyncScheduler')
     try:
-        # Get the KB config from SSM Parameter Store
-        kb_ids_param_name = os.environ.get('KB_IDS_PARAMETER_NAME', '/bedrock/kb/autosync/ids')
-        logger.info(f"Retrieving KB config from parameter: {kb_ids_param_name}")
-        
-        response = ssm_client.get_parameter(
-            Name=kb_ids_param_name,
-            WithDecryption=True
-        )
-        
-        # Parse the JSON array of KB configs
-        kb_configs = json.loads(response['Parameter']['Value'])
-        logger.info(f"Retrieved {len(kb_configs)} Knowledge Base configurations")
-        
-        results = []
-        
-        # Start ingestion jobs for each knowledge base and data source pair
-        for kb_config in kb_configs:
-            # Check if the config is in the new format (object with knowledgeBaseId and dataSourceId)
-            if isinstance(kb_config, dict) and 'knowledgeBaseId' in kb_config and 'dataSourceId' in kb_config:
-                kb_id = kb_config['knowledgeBaseId']
-                data_source_id = kb_config['dataSourceId']
-                
+        # Get the KB config from SSM Parameter Store, or from the warm container's cache
+        with metrics.timer('ConfigLoad'):
+            kb_config = get_config_loader().load(
+                parameter_name=os.environ.get('KB_IDS_PARAMETER_NAME', '/bedrock/kb/autosync/ids'),
+                parameter_path=os.environ.get('KB_CONFIG_PARAMETER_PATH')
+            )
+        config_count = len(kb_config.entries) + len(kb_config.rejected)
+        logger.info(f"Retrieved {config_count} Knowledge Base configurations")
+        force = bool((event or {}).get('force'))
+
+        # Only pairs that are due are synced on this tick, highest priority first
+        with metrics.timer('Plan'):
+            plan = plan_sync(kb_config.entries, get_state_store(), force)
+        deferred = [deferred_result(entry) for entry in plan.deferred]
+        metrics.put('PairsDeferred', len(deferred), 'Count')
+
+        shard_queue_url = os.environ.get('KB_SYNC_SHARD_QUEUE_URL')
+        if shard_queue_url:
+            shards = plan_shards(
+                plan.selected,
+                int(os.environ.get('KB_SYNC_SHARD_SIZE', '50')),
+                os.environ.get('KB_SYNC_SHARD_STRATEGY', 'hash')
+            )
+            # Leased before they are sent, so a fast worker's release cannot be overtaken
+            state_store = get_state_store()
+            with metrics.timer('Enqueue'):
+                update_leases(state_store, plan.selected, lease=True)
                 try:
-                    logger.info(f"Starting ingestion job for KB: {kb_id}, Data Source: {data_source_id}")
-                    
-                    response = bedrock_agent_client.start_ingestion_job(
-                        knowledgeBaseId=kb_id,
-                        dataSourceId=data_source_id
-                    )
-                    
-                    logger.info(f"Successfully started KB sync job for {kb_id}, Data Source: {data_source_id}, Job ID: {response['ingestionJobId']}")
-                    
-                    results.append({
-                        'knowledgeBaseId': kb_id,
-                        'dataSourceId': data_source_id,
-                        'jobId': response['ingestionJobId'],
-                        'status': 'started'
-                    })
-                    
-                except Exception as kb_error:
-                    logger.error(f"Error syncing KB {kb_id}, Data Source {data_source_id}: {str(kb_error)}")
-                    results.append({
-                        'knowledgeBaseId': kb_id,
-                        'dataSourceId': data_source_id,
-                        'status': 'error',
-                        'error': str(kb_error)
-                    })
-            
-            # Handle legacy format (just KB ID string)
-            elif isinstance(kb_config, str):
-                kb_id = kb_config
-                logger.warning(f"Legacy KB ID format detected for {kb_id}. Please update to new format with dataSourceId.")
-                
-                results.append({
-                    'knowledgeBaseId': kb_id,
-                    'status': 'skipped',
-                    'reason': 'Missing dataSourceId. Please update parameter store with new format.'
+                    shard_count = enqueue_shards(sqs_client, shard_queue_url, shards, force)
+                except Exception:
+                    update_leases(state_store, plan.selected, lease=False)
+                    raise
+            metrics.put('ShardsEnqueued', shard_count, 'Count')
+            logger.info(f"Enqueued {len(plan.selected)} pairs in {shard_count} shards")
+            return {
+                'statusCode': 200,
+                'body': json.dumps({
+                    'message': f'Enqueued {len(plan.selected)} of {config_count} configurations in {shard_count} shards',
+                    'results': deferred + list(kb_config.rejected)
                 })
-            
-            else:
-                logger.error(f"Invalid KB configuration format: {kb_config}")
-                results.append({
-                    'config': kb_config,
-                    'status': 'error',
-                    'reason': 'Invalid configuration format'
-                })
-        
+            }
+
+        # Start ingestion jobs for the due pairs concurrently; results are in priority
+        # order, followed by the deferred and rejected entries
+        results = sync_entries(plan.selected, get_deadline(context), metrics, force)
+        put_result_metrics(metrics, results)
+        results.extend(deferred)
+        results.extend(kb_config.rejected)
+
         return {
             'statusCode': 200,
             'body': json.dumps({
-                'message': f'Knowledge base sync process completed for {len(kb_configs)} configurations',
+                'message': f'Knowledge base sync process completed for {config_count} configurations',
                 'results': results
             })
         }
-        
+
     except Exception as e:
         logger.error(f"Error in sync process: {str(e)}")
+        metrics.put('Errors', 1, 'Count')
         return {
             'statusCode': 500,
             'body': json.dumps({
@@ -103,3 +388,71 @@ def handler(event, context):
                 'error': str(e)
             })
         }
+
+    finally:
+        metrics.flush()
+
+
+def requeue_failed_pairs(shard_id, entries, attempt, force):
+    """
+    Send the pairs of a shard that failed back to the shard queue as a smaller shard.
+
+    Retries are delayed exponentially. After ``KB_SYNC_SHARD_MAX_ATTEMPTS`` attempts the
+    pairs go to the dead-letter queue instead, when one is configured.
+    """
+    max_attempts = int(os.environ.get('KB_SYNC_SHARD_MAX_ATTEMPTS', '3'))
+    if attempt + 1 >= max_attempts:
+        dead_letter_queue_url = os.environ.get('KB_SYNC_SHARD_DLQ_URL')
+        logger.error(f"Giving up on {len(entries)} pairs of shard {shard_id} after {attempt + 1} attempts")
+        if dead_letter_queue_url:
+            sqs_client.send_message(
+                QueueUrl=dead_letter_queue_url,
+                MessageBody=shard_message(shard_id, entries, attempt + 1, force)
+            )
+        return
+
+    base_delay = float(os.environ.get('KB_SYNC_SHARD_RETRY_DELAY', '60'))
+    sqs_client.send_message(
+        QueueUrl=os.environ['KB_SYNC_SHARD_QUEUE_URL'],
+        MessageBody=shard_message(shard_id, entries, attempt + 1, force),
+        # SQS caps message delays at 15 minutes
+        DelaySeconds=int(min(900, base_delay * 2 ** attempt))
+    )
+    logger.warning(f"Requeued {len(entries)} failed pairs of shard {shard_id} for attempt {attempt + 2}")
+
+
+def shard_worker_handler(event, context):
+    """
+    Lambda handler that syncs the shards enqueued by a fan-out scheduler run.
+
+    Each SQS record is one shard of KB and data source pairs. Pairs that fail are requeued
+    on their own, so successful pairs are not started again; the other pairs are released,
+    so the scheduler can select them again. Records that cannot be processed at all, or are
+    not reached before the Lambda timeout, are reported as batch item failures and
+    redelivered by SQS.
+    """
+    deadline = get_deadline(context)
+    metrics = Metrics(METRICS_NAMESPACE, 'KbSyncShardWorker')
+    batch_item_failures = []
+    for record in event.get('Records', []):
+        message_id = record['messageId']
+        if deadline is not None and time.monotonic() >= deadline:
+            batch_item_failures.append({'itemIdentifier': message_id})
+            continue
+        try:
+            shard_id, entries, attempt, force = parse_shard_message(record['body'])
+            logger.info(f"Syncing shard {shard_id} with {len(entries)} pairs (attempt {attempt + 1})")
+            results = sync_entries(entries, deadline, metrics, force)
+            put_result_metrics(metrics, results)
+            failed = [entry for entry, result in zip(entries, results) if result['status'] == 'error']
+            if failed:
+                requeue_failed_pairs(shard_id, failed, attempt, force)
+            # Failed pairs keep their lease while they are retried
+            update_leases(get_state_store(), [entry for entry in entries if entry not in failed], lease=False)
+        except Exception as e:
+            logger.error(f"Error processing shard message {message_id}: {str(e)}")
+            batch_item_failures.append({'itemIdentifier': message_id})
+
+    metrics.put('BatchItemFailures', len(batch_item_failures), 'Count')
+    metrics.flush()
+    return {'batchItemFailures': batch_item_failures}
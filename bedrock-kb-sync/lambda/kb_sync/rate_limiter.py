@@ -0,0 +1,43 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that allows ``rate`` calls per second with bursts of up to ``capacity``.
+
+    Used to keep concurrent StartIngestionJob calls under Bedrock's requests-per-second quota.
+    """
+
+    def __init__(self, rate, capacity=1, clock=time.monotonic, sleep=time.sleep):
+        if not rate > 0:
+            raise ValueError(f'Token bucket rate must be a positive number of calls per second, got {rate!r}')
+        if not capacity >= 1:
+            raise ValueError(f'Token bucket capacity must be at least 1, got {capacity!r}')
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline=None):
+        """
+        Take one token, waiting for it if necessary.
+
+        Returns False without taking a token if it would not become available before
+        ``deadline`` (a value of ``clock``).
+        """
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if deadline is not None and now + wait > deadline:
+                return False
+            # Reserve the token now and wait outside the lock so other threads can queue behind us
+            self._tokens -= 1
+        if wait:
+            self.sleep(wait)
+        return True
@@ -0,0 +1,93 @@
+from collections import Counter
+from typing import NamedTuple, Tuple
+
+from kb_config import KbDataSource
+
+
+class TickPlan(NamedTuple):
+    """
+    What one scheduler tick does with the configured pairs.
+
+    ``selected`` are the due pairs to sync now, highest priority first. ``deferred`` are
+    due pairs held back because their vector store is at its concurrent job limit.
+    ``not_due`` counts the pairs whose interval has not passed yet and ``leased`` the pairs
+    an earlier fan-out tick enqueued that no worker has handled yet.
+    """
+    selected: Tuple[KbDataSource, ...]
+    deferred: Tuple[KbDataSource, ...]
+    not_due: int
+    leased: int
+
+
+def vector_store_key(entry):
+    """Vector store an entry's jobs count against; KBs without one count against themselves."""
+    return entry.vector_store or f'kb:{entry.knowledge_base_id}'
+
+
+def vector_store_limits(entries, default_max_concurrent_jobs=0):
+    """
+    Concurrent job limit per vector store: the lowest ``max_concurrent_jobs`` among the
+    entries sharing it, or ``default_max_concurrent_jobs``. 0 means unlimited.
+    """
+    store_limits = {}
+    for entry in entries:
+        limit = entry.max_concurrent_jobs or default_max_concurrent_jobs
+        store_limits.setdefault(vector_store_key(entry), []).extend([limit] if limit else [])
+    return {store: min(limits) if limits else 0 for store, limits in store_limits.items()}
+
+
+def plan_tick(entries, states, now, default_interval_minutes=1440, default_max_concurrent_jobs=0, force=False,
+              lease_seconds=0):
+    """
+    Pick the pairs to sync on this tick.
+
+    ``states`` maps ``(kb_id, data_source_id)`` to the stored sync state. A pair is due once
+    its interval (``default_interval_minutes`` when it has none; 0 means every tick) has
+    passed since ``lastCheckedAt``. Pairs never checked are due at once, and ``force`` makes
+    every pair due. Due pairs are ordered by priority, then by how long they have waited,
+    and admitted while their vector store has fewer than its limit of jobs running or
+    already admitted.
+
+    Pairs enqueued less than ``lease_seconds`` ago (``enqueuedAt``) are still waiting for a
+    shard worker and are never selected again, even with ``force``; they count against their
+    vector store like running jobs. The lease expiring lets pairs whose shard was lost be
+    picked up again.
+    """
+    due = []
+    not_due = 0
+    leased = 0
+    in_flight = Counter()
+    for entry in entries:
+        state = states.get((entry.knowledge_base_id, entry.data_source_id), {})
+        if now - float(state.get('enqueuedAt', '0')) < lease_seconds:
+            # A queued pair starts a job once its shard worker gets to it, so it holds a slot
+            leased += 1
+            in_flight[vector_store_key(entry)] += 1
+            continue
+        running = bool(state.get('jobId'))
+        if running:
+            in_flight[vector_store_key(entry)] += 1
+        last_checked_at = float(state.get('lastCheckedAt', '0'))
+        interval_seconds = 60 * (entry.interval_minutes or default_interval_minutes)
+        if force or now - last_checked_at >= interval_seconds:
+            due.append((-entry.priority, last_checked_at, running, entry))
+        else:
+            not_due += 1
+
+    # Sorting on (priority, last check) only; ties keep configuration order
+    due.sort(key=lambda item: item[:2])
+
+    limits = vector_store_limits(entries, default_max_concurrent_jobs)
+    admitted = Counter(in_flight)
+    selected, deferred = [], []
+    for _, _, running, entry in due:
+        # A pair whose last known job is running already counts against its vector store;
+        # syncing it only refreshes that job's status, and starts a new one if it finished
+        store = vector_store_key(entry)
+        if not running:
+            if limits[store] and admitted[store] >= limits[store]:
+                deferred.append(entry)
+                continue
+            admitted[store] += 1
+        selected.append(entry)
+    return TickPlan(tuple(selected), tuple(deferred), not_due, leased)
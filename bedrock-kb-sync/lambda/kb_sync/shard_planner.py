@@ -0,0 +1,83 @@
+import hashlib
+import json
+import logging
+import math
+
+from kb_config import KbDataSource
+
+logger = logging.getLogger()
+
+# SQS accepts at most 10 messages per SendMessageBatch call
+SQS_BATCH_LIMIT = 10
+
+SHARD_STRATEGIES = ('hash', 'size')
+
+
+def _stable_hash(value):
+    """Hash that, unlike hash(), is the same in every process and run."""
+    return int.from_bytes(hashlib.sha256(value.encode()).digest()[:8], 'big')
+
+
+def plan_shards(entries, shard_size, strategy='hash'):
+    """
+    Split KbDataSource entries into shards of about ``shard_size`` pairs.
+
+    ``size`` cuts the configuration into consecutive chunks of exactly ``shard_size``.
+    ``hash`` assigns each pair by a stable hash of its ``knowledgeBaseId``, so all data
+    sources of a knowledge base land in the same shard and a KB keeps its shard from one
+    run to the next; shards are only roughly ``shard_size`` then. Empty shards are dropped.
+    """
+    if strategy not in SHARD_STRATEGIES:
+        raise ValueError(f'Unknown shard strategy {strategy!r}, expected one of {SHARD_STRATEGIES}')
+    shard_size = max(1, shard_size)
+    if strategy == 'size':
+        return [list(entries[i:i + shard_size]) for i in range(0, len(entries), shard_size)]
+
+    shard_count = max(1, math.ceil(len(entries) / shard_size))
+    shards = [[] for _ in range(shard_count)]
+    for entry in entries:
+        shards[_stable_hash(entry.knowledge_base_id) % shard_count].append(entry)
+    return [shard for shard in shards if shard]
+
+
+def shard_message(shard_id, entries, attempt=0, force=False):
+    """Serialize one shard as an SQS message body."""
+    return json.dumps({
+        'shardId': shard_id,
+        'pairs': [[entry.knowledge_base_id, entry.data_source_id] for entry in entries],
+        'attempt': attempt,
+        'force': force
+    })
+
+
+def parse_shard_message(body):
+    """Return ``(shard_id, entries, attempt, force)`` from an SQS message body."""
+    message = json.loads(body)
+    entries = [KbDataSource(kb_id, data_source_id) for kb_id, data_source_id in message['pairs']]
+    return message['shardId'], entries, int(message.get('attempt', 0)), bool(message.get('force'))
+
+
+def enqueue_shards(sqs_client, queue_url, shards, force=False):
+    """
+    Send every shard to the queue, 10 messages per SendMessageBatch call.
+
+    Entries SQS reports as failed are resent once; anything still failing raises, so the
+    scheduler run is reported as an error rather than silently dropping pairs.
+    """
+    messages = [
+        {'Id': str(index), 'MessageBody': shard_message(f'{index + 1}/{len(shards)}', shard, force=force)}
+        for index, shard in enumerate(shards)
+    ]
+    for start in range(0, len(messages), SQS_BATCH_LIMIT):
+        batch = messages[start:start + SQS_BATCH_LIMIT]
+        for attempt in range(2):
+            if attempt:
+                logger.warning(f"{len(batch)} shard messages were not accepted by SQS; retrying")
+            response = sqs_client.send_message_batch(QueueUrl=queue_url, Entries=batch)
+            failed_ids = {failure['Id'] for failure in response.get('Failed', [])}
+            batch = [message for message in batch if message['Id'] in failed_ids]
+            if not batch:
+                break
+        if batch:
+            raise RuntimeError(f"Failed to enqueue shards {', '.join(m['Id'] for m in batch)}")
+    return len(messages)
@@ -0,0 +1,109 @@
+from botocore.exceptions import ClientError
+
+
+class SyncStateStore:
+    """
+    Per-data-source sync state kept in DynamoDB, keyed on ``knowledgeBaseId#dataSourceId``.
+
+    Items are flat maps of string attributes:
+
+    - ``fingerprint``: data source fingerprint of the last successful ingestion job
+    - ``pendingFingerprint`` / ``jobId`` / ``jobStatus``: fingerprint, ID and last polled status
+      of the job that is still being tracked
+    - ``nextPollAt`` / ``pollCount``: when the poller checks that job next (epoch seconds) and
+      how many times it has checked it so far
+    - ``lastJob*``: status, timing and statistics of the most recent finished job
+    - ``lastCheckedAt``: when the scheduler last synced or checked the data source (epoch seconds)
+    - ``enqueuedAt``: when a fan-out tick enqueued the data source for a shard worker that has
+      not handled it yet (epoch seconds)
+    """
+
+    def __init__(self, table_name, client):
+        self.table_name = table_name
+        self.client = client
+
+    @staticmethod
+    def _key(kb_id, data_source_id):
+        return {'dataSourceKey': {'S': f'{kb_id}#{data_source_id}'}}
+
+    @staticmethod
+    def _from_item(item):
+        return {name: value['S'] for name, value in item.items() if name != 'dataSourceKey' and 'S' in value}
+
+    def get(self, kb_id, data_source_id):
+        response = self.client.get_item(
+            TableName=self.table_name,
+            Key=self._key(kb_id, data_source_id),
+            ConsistentRead=True
+        )
+        return self._from_item(response.get('Item', {}))
+
+    def put(self, kb_id, data_source_id, state, expected_job_id=None):
+        """
+        Replace the stored state of a data source.
+
+        The sync Lambda and the poller both write the row of a data source with a tracked
+        job. With ``expected_job_id`` the write only succeeds while the stored ``jobId`` is
+        still that job (``''``: while no job is tracked), so a writer holding a stale
+        snapshot cannot drop a job started in the meantime. Returns False when that
+        condition failed and nothing was written.
+        """
+        item = self._key(kb_id, data_source_id)
+        item.update({name: {'S': str(value)} for name, value in state.items() if value is not None})
+        put_args = {'TableName': self.table_name, 'Item': item}
+        if expected_job_id == '':
+            put_args['ConditionExpression'] = 'attribute_not_exists(jobId)'
+        elif expected_job_id is not None:
+            put_args['ConditionExpression'] = 'jobId = :expectedJobId'
+            put_args['ExpressionAttributeValues'] = {':expectedJobId': {'S': expected_job_id}}
+        try:
+            self.client.put_item(**put_args)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            return False
+        return True
+
+    def lease(self, kb_id, data_source_id, now):
+        """Mark a data source as enqueued, leaving the rest of its state as it is."""
+        self.client.update_item(
+            TableName=self.table_name,
+            Key=self._key(kb_id, data_source_id),
+            UpdateExpression='SET enqueuedAt = :now',
+            ExpressionAttributeValues={':now': {'S': str(int(now))}}
+        )
+
+    def release(self, kb_id, data_source_id):
+        """Remove the enqueued mark of a data source, if it has one."""
+        try:
+            self.client.update_item(
+                TableName=self.table_name,
+                Key=self._key(kb_id, data_source_id),
+                UpdateExpression='REMOVE enqueuedAt',
+                # Without the condition, releasing an unknown data source would create its item
+                ConditionExpression='attribute_exists(enqueuedAt)'
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+
+    def list_states(self):
+        """Yield ``(kb_id, data_source_id, state)`` for every data source in the table."""
+        return self._scan()
+
+    def list_tracked_jobs(self):
+        """Yield ``(kb_id, data_source_id, state)`` for every data source with a job still being tracked."""
+        return self._scan('attribute_exists(jobId)')
+
+    def _scan(self, filter_expression=None):
+        scan_args = {'TableName': self.table_name, 'ConsistentRead': True}
+        if filter_expression:
+            scan_args['FilterExpression'] = filter_expression
+        while True:
+            response = self.client.scan(**scan_args)
+            for item in response.get('Items', []):
+                kb_id, data_source_id = item['dataSourceKey']['S'].split('#', 1)
+                yield kb_id, data_source_id, self._from_item(item)
+            if 'LastEvaluatedKey' not in response:
+                return
+            scan_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
@@ -63,6 +63,31 @@ while true; do
     fi
 done
 
+# Large fleets can store one parameter per Knowledge Base under a path instead of one JSON array
+read -p "Store one parameter per Knowledge Base under a path instead of a single parameter? (y/n): " use_path
+if [[ $use_path == "y" || $use_path == "Y" ]]; then
+    read -p "Enter the parameter path for KB configurations [/bedrock/kb/autosync/kbs]: " kb_config_path
+    kb_config_path=${kb_config_path:-/bedrock/kb/autosync/kbs}
+    kb_config_path=${kb_config_path%/}
+
+    for kb_config in "${kb_configs[@]}"; do
+        kb_id=$(echo "$kb_config" | jq -r .knowledgeBaseId)
+        ds_id=$(echo "$kb_config" | jq -r .dataSourceId)
+        if ! aws ssm put-parameter \
+            --name "$kb_config_path/$kb_id/$ds_id" \
+            --value "$(echo "$kb_config" | jq -c .)" \
+            --type "SecureString" \
+            --overwrite > /dev/null; then
+            echo "Failed to store parameter. Please check your AWS credentials and permissions."
+            exit 1
+        fi
+    done
+
+    echo "Parameters stored successfully in SSM Parameter Store under $kb_config_path"
+    echo "You can now deploy the CDK stack with: cdk deploy --context kb_config_parameter_path=\"$kb_config_path\""
+    exit 0
+fi
+
 # Combine the JSON objects into a JSON array
 kb_configs_json=$(printf '%s\n' "${kb_configs[@]}" | jq -s .)
 
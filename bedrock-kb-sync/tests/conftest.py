@@ -0,0 +1,35 @@
+import json
+import os
+import sys
+
+import pytest
+from botocore.stub import Stubber
+
+# The Lambda source is deployed as a flat asset directory, so import it the same way
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambda', 'kb_sync'))
+
+# The handler creates boto3 clients at import time; keep them away from real credentials
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+import kb_sync_handler  # noqa: E402
+
+
+@pytest.fixture
+def ssm_configs(monkeypatch):
+    """Serve the given KB configs from a stubbed SSM client."""
+    monkeypatch.setattr(kb_sync_handler, '_config_loader', None)
+    monkeypatch.setenv('KB_CONFIG_CACHE_TTL_SECONDS', '0')
+    stubber = Stubber(kb_sync_handler.ssm_client)
+    stubber.activate()
+
+    def serve(configs):
+        stubber.add_response(
+            'get_parameter',
+            {'Parameter': {'Name': '/bedrock/kb/autosync/ids', 'Value': json.dumps(configs)}},
+            {'Name': '/bedrock/kb/autosync/ids', 'WithDecryption': True}
+        )
+
+    yield serve
+    stubber.deactivate()
@@ -0,0 +1,234 @@
+import itertools
+import random
+import re
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+
+def client_error(code, operation_name):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, operation_name)
+
+
+class FakeContext:
+    """Lambda context with a fixed remaining execution time."""
+
+    def __init__(self, remaining_ms=900000):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+class FakeBedrockAgentClient:
+    """
+    Thread-safe local stand-in for the bedrock-agent ingestion job API.
+
+    ``latency`` is the simulated service time per call (a ``(low, high)`` tuple picks a
+    random value per call) and ``throttle_first`` makes the first N StartIngestionJob calls
+    fail with a ThrottlingException, and pairs in ``fail_pairs`` always fail with a
+    ValidationException. ``data_sources`` maps ``(kb_id, data_source_id)`` to an
+    S3 ``(bucket, prefixes)`` pair; other data sources are reported as web crawlers.
+    """
+
+    def __init__(self, latency=0.0, throttle_first=0, data_sources=None, fail_pairs=()):
+        self.latency = latency
+        self.throttle_first = throttle_first
+        self.fail_pairs = set(fail_pairs)
+        self.data_sources = data_sources or {}
+        self.start_calls = []
+        self.get_calls = []
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _sleep(self):
+        latency = random.uniform(*self.latency) if isinstance(self.latency, tuple) else self.latency
+        if latency:
+            time.sleep(latency)
+
+    def start_ingestion_job(self, knowledgeBaseId, dataSourceId, **kwargs):
+        self._sleep()
+        with self._lock:
+            self.start_calls.append((knowledgeBaseId, dataSourceId))
+            if len(self.start_calls) <= self.throttle_first:
+                raise client_error('ThrottlingException', 'StartIngestionJob')
+            if (knowledgeBaseId, dataSourceId) in self.fail_pairs:
+                raise client_error('ValidationException', 'StartIngestionJob')
+            job_id = f'job-{next(self._ids)}'
+            job = {
+                'knowledgeBaseId': knowledgeBaseId,
+                'dataSourceId': dataSourceId,
+                'ingestionJobId': job_id,
+                'status': 'STARTING'
+            }
+            self.jobs[job_id] = job
+        return {'ingestionJob': dict(job)}
+
+    def get_ingestion_job(self, knowledgeBaseId, dataSourceId, ingestionJobId):
+        self._sleep()
+        with self._lock:
+            self.get_calls.append(ingestionJobId)
+            return {'ingestionJob': dict(self.jobs[ingestionJobId])}
+
+    def set_job_status(self, job_id, status, **fields):
+        with self._lock:
+            self.jobs[job_id].update(status=status, **fields)
+
+    def get_data_source(self, knowledgeBaseId, dataSourceId):
+        self._sleep()
+        s3_location = self.data_sources.get((knowledgeBaseId, dataSourceId))
+        if s3_location is None:
+            configuration = {'type': 'WEB', 'webConfiguration': {}}
+        else:
+            bucket, prefixes = s3_location
+            configuration = {
+                'type': 'S3',
+                's3Configuration': {'bucketArn': f'arn:aws:s3:::{bucket}', 'inclusionPrefixes': prefixes}
+            }
+        return {'dataSource': {
+            'knowledgeBaseId': knowledgeBaseId,
+            'dataSourceId': dataSourceId,
+            'dataSourceConfiguration': configuration
+        }}
+
+
+class FakeS3Client:
+    """
+    Local stand-in for S3 ListObjectsV2 pagination.
+
+    ``objects`` maps bucket name to a list of ``(key, etag)`` tuples; pages hold
+    ``page_size`` objects and ``list_calls`` counts the pages served.
+    """
+
+    def __init__(self, objects=None, page_size=1000):
+        self.objects = objects or {}
+        self.page_size = page_size
+        self.list_calls = 0
+
+    def get_paginator(self, operation_name):
+        assert operation_name == 'list_objects_v2'
+        return self
+
+    def paginate(self, Bucket, Prefix='', **kwargs):
+        matching = [obj for obj in sorted(self.objects.get(Bucket, [])) if obj[0].startswith(Prefix)]
+        for start in range(0, max(len(matching), 1), self.page_size):
+            self.list_calls += 1
+            yield {
+                'Contents': [
+                    {'Key': key, 'ETag': etag, 'Size': 1, 'LastModified': '2024-01-01T00:00:00Z'}
+                    for key, etag in matching[start:start + self.page_size]
+                ]
+            }
+
+
+class FakeDynamoDbClient:
+    """
+    Dict-backed stand-in for DynamoDB get_item/put_item/scan.
+
+    Scans return ``page_size`` items per page and understand ``attribute_exists(name)`` filters;
+    puts and updates understand ``attribute_exists(name)``, ``attribute_not_exists(name)`` and
+    ``name = :value`` conditions, and updates a single ``SET name = :value`` or ``REMOVE name``.
+    """
+
+    def __init__(self, page_size=100):
+        self.page_size = page_size
+        self.items = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(TableName, Key):
+        return TableName, tuple(sorted((name, value['S']) for name, value in Key.items()))
+
+    def get_item(self, TableName, Key, **kwargs):
+        with self._lock:
+            item = self.items.get(self._key(TableName, Key))
+        return {'Item': dict(item)} if item else {}
+
+    @staticmethod
+    def _matches(item, condition, values):
+        exists = re.fullmatch(r'attribute_(not_)?exists\((\w+)\)', condition)
+        if exists:
+            return (exists.group(2) in item) != bool(exists.group(1))
+        name, placeholder = re.fullmatch(r'(\w+) = (:\w+)', condition).groups()
+        return item.get(name) == values[placeholder]
+
+    def put_item(self, TableName, Item, ConditionExpression=None, ExpressionAttributeValues=None, **kwargs):
+        key = self._key(TableName, {'dataSourceKey': Item['dataSourceKey']})
+        with self._lock:
+            if ConditionExpression and not self._matches(
+                self.items.get(key, {}), ConditionExpression, ExpressionAttributeValues or {}
+            ):
+                raise client_error('ConditionalCheckFailedException', 'PutItem')
+            self.items[key] = dict(Item)
+        return {}
+
+    def update_item(self, TableName, Key, UpdateExpression, ConditionExpression=None,
+                    ExpressionAttributeValues=None, **kwargs):
+        key = self._key(TableName, Key)
+        values = ExpressionAttributeValues or {}
+        with self._lock:
+            item = dict(self.items.get(key, Key))
+            if ConditionExpression and not self._matches(item, ConditionExpression, values):
+                raise client_error('ConditionalCheckFailedException', 'UpdateItem')
+            action, name, *value = UpdateExpression.replace('=', ' ').split()
+            if action == 'SET':
+                item[name] = values[value[0]]
+            else:
+                item.pop(name, None)
+            self.items[key] = item
+        return {}
+
+    def scan(self, TableName, FilterExpression=None, ExclusiveStartKey=None, **kwargs):
+        with self._lock:
+            keys = sorted(key for key in self.items if key[0] == TableName)
+            items = {key: dict(self.items[key]) for key in keys}
+        if ExclusiveStartKey is not None:
+            start_key = self._key(TableName, ExclusiveStartKey)
+            keys = [key for key in keys if key > start_key]
+        page, rest = keys[:self.page_size], keys[self.page_size:]
+        required = re.match(r'attribute_exists\((\w+)\)', FilterExpression or '')
+        response = {'Items': [items[key] for key in page if not required or required.group(1) in items[key]]}
+        if rest:
+            response['LastEvaluatedKey'] = {'dataSourceKey': items[page[-1]]['dataSourceKey']}
+        return response
+
+
+class FakeSqsClient:
+    """
+    In-memory stand-in for the SQS calls of the shard fan-out.
+
+    ``queues`` maps queue URL to the list of sent messages; ``reject_first`` makes the first
+    N SendMessageBatch entries fail. ``lambda_event`` drains a queue into an SQS event.
+    """
+
+    def __init__(self, reject_first=0):
+        self.reject_first = reject_first
+        self.queues = {}
+        self._ids = itertools.count(1)
+
+    def send_message(self, QueueUrl, MessageBody, DelaySeconds=0):
+        message_id = f'msg-{next(self._ids)}'
+        self.queues.setdefault(QueueUrl, []).append(
+            {'messageId': message_id, 'body': MessageBody, 'delaySeconds': DelaySeconds}
+        )
+        return {'MessageId': message_id}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        successful, failed = [], []
+        for entry in Entries:
+            if self.reject_first > 0:
+                self.reject_first -= 1
+                failed.append({'Id': entry['Id'], 'SenderFault': False, 'Code': 'InternalError'})
+                continue
+            response = self.send_message(QueueUrl, entry['MessageBody'])
+            successful.append({'Id': entry['Id'], 'MessageId': response['MessageId']})
+        return {'Successful': successful, 'Failed': failed}
+
+    def lambda_event(self, queue_url):
+        messages, self.queues[queue_url] = self.queues.get(queue_url, []), []
+        return {'Records': [
+            {'messageId': message['messageId'], 'body': message['body'], 'eventSource': 'aws:sqs'}
+            for message in messages
+        ]}
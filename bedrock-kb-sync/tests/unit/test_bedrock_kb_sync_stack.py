@@ -1,5 +1,6 @@
 import aws_cdk as core
 import aws_cdk.assertions as assertions
+import pytest
 
 from bedrock_kb_sync.bedrock_kb_sync_stack import BedrockKbSyncStack
 
@@ -13,3 +14,150 @@ def test_sqs_queue_created():
 #     template.has_resource_properties("AWS::SQS::Queue", {
 #         "VisibilityTimeout": 300
 #     })
+
+
+def test_sync_lambda_dispatch_settings():
+    app = core.App()
+    stack = BedrockKbSyncStack(app, "bedrock-kb-sync", max_concurrency=16, start_job_tps=2)
+    template = assertions.Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Timeout": 900,
+        "Environment": {
+            "Variables": assertions.Match.object_like({
+                "KB_SYNC_MAX_CONCURRENCY": "16",
+                "KB_SYNC_START_JOB_TPS": "2"
+            })
+        }
+    })
+
+
+def test_sync_state_table():
+    app = core.App()
+    stack = BedrockKbSyncStack(app, "bedrock-kb-sync")
+    template = assertions.Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "KeySchema": [{"AttributeName": "dataSourceKey", "KeyType": "HASH"}],
+        "BillingMode": "PAY_PER_REQUEST"
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Environment": {
+            "Variables": assertions.Match.object_like({
+                "KB_SYNC_STATE_TABLE_NAME": assertions.Match.any_value()
+            })
+        }
+    })
+
+
+def test_ingestion_job_poller():
+    app = core.App()
+    stack = BedrockKbSyncStack(app, "bedrock-kb-sync", poll_schedule_expression="rate(10 minutes)")
+    template = assertions.Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "ingestion_job_poller.handler"
+    })
+    template.has_resource_properties("AWS::Events::Rule", {
+        "ScheduleExpression": "rate(10 minutes)"
+    })
+
+
+def test_kb_config_parameter_path():
+    app = core.App()
+    stack = BedrockKbSyncStack(app, "bedrock-kb-sync", kb_config_parameter_path="/bedrock/kb/autosync/kbs/")
+    template = assertions.Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Environment": {
+            "Variables": assertions.Match.object_like({
+                "KB_CONFIG_PARAMETER_PATH": "/bedrock/kb/autosync/kbs"
+            })
+        }
+    })
+    template.has_resource_properties("AWS::IAM::Policy", {
+        "PolicyDocument": {
+            "Statement": assertions.Match.array_with([
+                assertions.Match.object_like({"Action": "ssm:GetParametersByPath"})
+            ])
+        }
+    })
+
+
+def test_fan_out_mode():
+    app = core.App()
+    stack = BedrockKbSyncStack(app, "bedrock-kb-sync", fan_out=True, start_job_tps=2, worker_reserved_concurrency=4)
+    template = assertions.Template.from_stack(stack)
+
+    template.resource_count_is("AWS::SQS::Queue", 2)
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "kb_sync_handler.shard_worker_handler",
+        "ReservedConcurrentExecutions": 4,
+        "Environment": {
+            "Variables": assertions.Match.object_like({"KB_SYNC_START_JOB_TPS": "0.5"})
+        }
+    })
+    template.has_resource_properties("AWS::Lambda::EventSourceMapping", {
+        "FunctionResponseTypes": ["ReportBatchItemFailures"]
+    })
+
+
+def test_fan_out_shard_size_defaults_to_what_a_worker_can_start():
+    app = core.App()
+    # 0.1 TPS split over two workers: 0.05 calls per second for 840 s of the 900 s timeout
+    stack = BedrockKbSyncStack(app, "bedrock-kb-sync", fan_out=True)
+    template = assertions.Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "kb_sync_handler.handler",
+        "Environment": {
+            "Variables": assertions.Match.object_like({"KB_SYNC_SHARD_SIZE": "42"})
+        }
+    })
+    template.has_resource_properties("AWS::Lambda::EventSourceMapping", {"BatchSize": 1})
+
+
+def test_fan_out_rejects_shards_a_worker_cannot_start_in_time():
+    app = core.App()
+    with pytest.raises(ValueError, match="shard_size 50 is too large"):
+        BedrockKbSyncStack(app, "bedrock-kb-sync", fan_out=True, shard_size=50)
+
+
+def test_scheduler_tick_defaults():
+    app = core.App()
+    stack = BedrockKbSyncStack(app, "bedrock-kb-sync", default_max_concurrent_jobs=3)
+    template = assertions.Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::Events::Rule", {
+        "ScheduleExpression": "rate(15 minutes)"
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "kb_sync_handler.handler",
+        "ReservedConcurrentExecutions": 1,
+        "Environment": {
+            "Variables": assertions.Match.object_like({
+                "KB_SYNC_DEFAULT_INTERVAL_MINUTES": "1440",
+                "KB_SYNC_DEFAULT_MAX_CONCURRENT_JOBS": "3"
+            })
+        }
+    })
+
+
+def test_xray_tracing():
+    app = core.App()
+    stack = BedrockKbSyncStack(
+        app, "bedrock-kb-sync", fan_out=True, xray_tracing=True,
+        xray_sdk_layer_arn="arn:aws:lambda:us-east-1:123456789012:layer:aws-xray-sdk:1"
+    )
+    template = assertions.Template.from_stack(stack)
+
+    functions = template.find_resources("AWS::Lambda::Function", {
+        "Properties": {"TracingConfig": {"Mode": "Active"}}
+    })
+    assert len(functions) == 3
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "ingestion_job_poller.handler",
+        "Environment": {
+            "Variables": assertions.Match.object_like({"TELEMETRY_XRAY_SAMPLE_RATE": "1"})
+        }
+    })
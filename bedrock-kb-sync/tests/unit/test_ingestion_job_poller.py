@@ -0,0 +1,124 @@
+import io
+import json
+
+import pytest
+
+import ingestion_job_poller
+import kb_sync_handler
+from rate_limiter import TokenBucket
+from sync_state import SyncStateStore
+from telemetry import Metrics
+from tests.fakes import FakeBedrockAgentClient, FakeContext, FakeDynamoDbClient
+
+
+@pytest.fixture
+def tracked_jobs(monkeypatch):
+    """Start jobs for ``count`` data sources through the sync Lambda's code path, sharing fake clients with the poller."""
+    monkeypatch.setenv('KB_SYNC_STATE_TABLE_NAME', 'sync-state')
+    monkeypatch.setenv('KB_SYNC_GET_JOB_TPS', '100000')
+    monkeypatch.setenv('KB_SYNC_GET_JOB_BURST', '100000')
+    agent = FakeBedrockAgentClient()
+    dynamodb = FakeDynamoDbClient(page_size=7)
+    for module in (kb_sync_handler, ingestion_job_poller):
+        monkeypatch.setattr(module, 'bedrock_agent_client', agent)
+        monkeypatch.setattr(module, 'dynamodb_client', dynamodb)
+    store = SyncStateStore('sync-state', dynamodb)
+
+    def start(count):
+        job_ids = []
+        for i in range(count):
+            job = agent.start_ingestion_job(knowledgeBaseId=f'kb-{i}', dataSourceId=f'ds-{i}')['ingestionJob']
+            store.put(f'kb-{i}', f'ds-{i}', {'jobId': job['ingestionJobId'], 'pendingFingerprint': f'fp-{i}'})
+            job_ids.append(job['ingestionJobId'])
+        return job_ids
+
+    return agent, store, start
+
+
+def run_poller():
+    response = ingestion_job_poller.handler({}, FakeContext())
+    assert response['statusCode'] == 200, response
+    return json.loads(response['body'])['results']
+
+
+def test_finished_jobs_are_recorded(tracked_jobs):
+    agent, store, start = tracked_jobs
+    job_ids = start(20)
+    statistics = {'numberOfDocumentsScanned': 12, 'numberOfDocumentsFailed': 1}
+    for job_id in job_ids[:15]:
+        agent.set_job_status(
+            job_id, 'COMPLETE', statistics=statistics,
+            startedAt='2024-01-01T00:00:00Z', updatedAt='2024-01-01T00:02:30Z'
+        )
+
+    results = run_poller()
+
+    assert [r['status'] for r in results].count('COMPLETE') == 15
+    assert [r['status'] for r in results].count('STARTING') == 5
+    state = store.get('kb-0', 'ds-0')
+    assert 'jobId' not in state
+    assert state['fingerprint'] == 'fp-0'
+    assert state['lastJobStatus'] == 'COMPLETE'
+    assert state['lastJobDurationSeconds'] == '150.0'
+    assert json.loads(state['lastJobStatistics']) == statistics
+    assert len(list(store.list_tracked_jobs())) == 5
+
+
+def test_failed_job_keeps_the_previous_fingerprint(tracked_jobs):
+    agent, store, start = tracked_jobs
+    job_id = start(1)[0]
+    store.put('kb-0', 'ds-0', dict(store.get('kb-0', 'ds-0'), fingerprint='fp-old'))
+    agent.set_job_status(job_id, 'FAILED', failureReasons=['Access denied'])
+
+    run_poller()
+
+    state = store.get('kb-0', 'ds-0')
+    assert state['fingerprint'] == 'fp-old'
+    assert state['lastJobStatus'] == 'FAILED'
+    assert json.loads(state['lastJobFailureReasons']) == ['Access denied']
+
+
+def test_running_jobs_are_polled_with_backoff(tracked_jobs, monkeypatch):
+    agent, store, start = tracked_jobs
+    start(3)
+    now = [1000000.0]
+    monkeypatch.setattr(ingestion_job_poller.time, 'time', lambda: now[0])
+
+    run_poller()
+    assert len(agent.get_calls) == 3
+
+    # Not due again until the first interval has passed, then the interval doubles
+    now[0] += 60
+    assert run_poller() == []
+    now[0] += 60
+    run_poller()
+    assert len(agent.get_calls) == 6
+    assert store.get('kb-0', 'ds-0')['nextPollAt'] == str(int(now[0] + 240))
+
+
+def test_stale_snapshot_does_not_drop_a_job_started_since(tracked_jobs):
+    agent, store, start = tracked_jobs
+    first_job = start(1)[0]
+    [(_, _, stale_state)] = store.list_tracked_jobs()
+    agent.set_job_status(first_job, 'COMPLETE')
+    # Meanwhile the sync Lambda records the first job and starts the next one
+    second_job = agent.start_ingestion_job(knowledgeBaseId='kb-0', dataSourceId='ds-0')['ingestionJob']['ingestionJobId']
+    store.put('kb-0', 'ds-0', {'jobId': second_job, 'lastJobId': first_job})
+
+    result = ingestion_job_poller.poll_job(
+        store, 'kb-0', 'ds-0', stale_state, TokenBucket(rate=1000, capacity=1000), None, 0,
+        Metrics('Test', 'unit', stream=io.StringIO())
+    )
+
+    assert result['status'] == 'COMPLETE'
+    assert store.get('kb-0', 'ds-0')['jobId'] == second_job
+
+
+def test_state_writes_can_require_the_tracked_job():
+    store = SyncStateStore('sync-state', FakeDynamoDbClient())
+
+    assert store.put('kb', 'ds', {'jobId': 'job-1'}, expected_job_id='')
+    assert not store.put('kb', 'ds', {'jobId': 'job-2'}, expected_job_id='')
+    assert not store.put('kb', 'ds', {'lastJobId': 'job-0'}, expected_job_id='job-0')
+    assert store.put('kb', 'ds', {'lastJobId': 'job-1'}, expected_job_id='job-1')
+    assert store.get('kb', 'ds') == {'lastJobId': 'job-1'}
@@ -0,0 +1,64 @@
+import json
+
+from botocore.stub import Stubber
+
+import kb_sync_handler
+from kb_config import KbConfigLoader, KbDataSource, parse_kb_configs
+
+
+def test_entries_are_validated_once():
+    config = parse_kb_configs([
+        {'knowledgeBaseId': 'kb-1', 'dataSourceId': 'ds-1'},
+        {'knowledgeBaseId': 'kb-1', 'dataSourceId': 'ds-1'},
+        {'knowledgeBaseId': 'kb-2'},
+        {'knowledgeBaseId': 'kb-3', 'dataSourceId': ''},
+        'kb-legacy'
+    ])
+
+    assert config.entries == (KbDataSource('kb-1', 'ds-1'),)
+    assert [r['status'] for r in config.rejected] == ['error', 'error', 'skipped']
+
+
+def test_parameters_under_a_path_are_paginated():
+    with Stubber(kb_sync_handler.ssm_client) as stubber:
+        stubber.add_response(
+            'get_parameters_by_path',
+            {'Parameters': [
+                {'Name': '/kbs/kb-2/ds-2', 'Value': json.dumps({'knowledgeBaseId': 'kb-2', 'dataSourceId': 'ds-2'})},
+                {'Name': '/kbs/kb-1', 'Value': json.dumps([
+                    {'knowledgeBaseId': 'kb-1', 'dataSourceId': 'ds-1a'},
+                    {'knowledgeBaseId': 'kb-1', 'dataSourceId': 'ds-1b'}
+                ])}
+            ], 'NextToken': 'page-2'},
+            {'Path': '/kbs', 'Recursive': True, 'WithDecryption': True}
+        )
+        stubber.add_response(
+            'get_parameters_by_path',
+            {'Parameters': [{'Name': '/kbs/kb-3', 'Value': 'not json'}]},
+            {'Path': '/kbs', 'Recursive': True, 'WithDecryption': True, 'NextToken': 'page-2'}
+        )
+        config = KbConfigLoader(kb_sync_handler.ssm_client).load(parameter_path='/kbs')
+        stubber.assert_no_pending_responses()
+
+    assert config.entries == (
+        KbDataSource('kb-1', 'ds-1a'),
+        KbDataSource('kb-1', 'ds-1b'),
+        KbDataSource('kb-2', 'ds-2')
+    )
+    assert config.rejected[0]['config'] == {'parameter': '/kbs/kb-3'}
+
+
+def test_parsed_config_is_cached_until_the_ttl_expires():
+    now = [0.0]
+    value = json.dumps([{'knowledgeBaseId': 'kb-1', 'dataSourceId': 'ds-1'}])
+    loader = KbConfigLoader(kb_sync_handler.ssm_client, ttl_seconds=60, clock=lambda: now[0])
+
+    with Stubber(kb_sync_handler.ssm_client) as stubber:
+        for _ in range(2):
+            stubber.add_response('get_parameter', {'Parameter': {'Value': value}}, {'Name': '/ids', 'WithDecryption': True})
+        first = loader.load(parameter_name='/ids')
+        now[0] = 59
+        assert loader.load(parameter_name='/ids') is first
+        now[0] = 60
+        assert loader.load(parameter_name='/ids') == first
+        stubber.assert_no_pending_responses()
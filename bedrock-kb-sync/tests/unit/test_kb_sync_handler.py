@@ -0,0 +1,289 @@
+import json
+
+import pytest
+from botocore.stub import Stubber
+
+import kb_sync_handler
+from change_detection import s3_fingerprint
+from rate_limiter import TokenBucket
+from tests.fakes import FakeBedrockAgentClient, FakeContext, FakeDynamoDbClient, FakeS3Client, client_error
+
+
+def kb_pairs(count):
+    return [{'knowledgeBaseId': f'kb-{i}', 'dataSourceId': f'ds-{i}'} for i in range(count)]
+
+
+@pytest.fixture
+def fast_dispatch(monkeypatch):
+    monkeypatch.setenv('KB_SYNC_START_JOB_TPS', '100000')
+    monkeypatch.setenv('KB_SYNC_START_JOB_BURST', '100000')
+    monkeypatch.setenv('KB_SYNC_RETRY_BASE_DELAY', '0')
+
+
+@pytest.fixture
+def change_detection(fast_dispatch, monkeypatch):
+    """Wire fake bedrock-agent, S3 and DynamoDB clients and enable the sync state table."""
+    monkeypatch.setenv('KB_SYNC_STATE_TABLE_NAME', 'sync-state')
+    # Every pair is due on every run, so back-to-back runs exercise change detection
+    monkeypatch.setenv('KB_SYNC_DEFAULT_INTERVAL_MINUTES', '0')
+    agent = FakeBedrockAgentClient(data_sources={('kb-0', 'ds-0'): ('docs-bucket', ['docs/'])})
+    s3 = FakeS3Client({'docs-bucket': [('docs/a.pdf', '"etag-a"'), ('docs/b.pdf', '"etag-b"')]})
+    monkeypatch.setattr(kb_sync_handler, 'bedrock_agent_client', agent)
+    monkeypatch.setattr(kb_sync_handler, 's3_client', s3)
+    monkeypatch.setattr(kb_sync_handler, 'dynamodb_client', FakeDynamoDbClient())
+    return agent, s3
+
+
+def complete_all_jobs(agent):
+    for job_id in list(agent.jobs):
+        agent.set_job_status(job_id, 'COMPLETE')
+
+
+def run_handler(context=None, event=None):
+    response = kb_sync_handler.handler(event or {}, context or FakeContext())
+    assert response['statusCode'] == 200, response
+    return json.loads(response['body'])['results']
+
+
+def test_stubbed_start_ingestion_job(ssm_configs, fast_dispatch, monkeypatch):
+    monkeypatch.setenv('KB_SYNC_MAX_CONCURRENCY', '1')
+    ssm_configs([{'knowledgeBaseId': 'kb-1', 'dataSourceId': 'ds-1'}, 'kb-legacy', 42])
+
+    with Stubber(kb_sync_handler.bedrock_agent_client) as stubber:
+        stubber.add_response(
+            'start_ingestion_job',
+            {'ingestionJob': {
+                'knowledgeBaseId': 'kb-1',
+                'dataSourceId': 'ds-1',
+                'ingestionJobId': 'JOB1234567',
+                'status': 'STARTING',
+                'startedAt': '2024-01-01T00:00:00Z',
+                'updatedAt': '2024-01-01T00:00:00Z'
+            }},
+            {'knowledgeBaseId': 'kb-1', 'dataSourceId': 'ds-1'}
+        )
+        results = run_handler()
+
+    assert [r['status'] for r in results] == ['started', 'skipped', 'error']
+    assert results[0]['jobId'] == 'JOB1234567'
+
+
+def test_concurrent_dispatch_keeps_config_order(ssm_configs, fast_dispatch, monkeypatch):
+    monkeypatch.setenv('KB_SYNC_MAX_CONCURRENCY', '16')
+    fake = FakeBedrockAgentClient(latency=(0, 0.01))
+    monkeypatch.setattr(kb_sync_handler, 'bedrock_agent_client', fake)
+    configs = kb_pairs(100)
+    ssm_configs(configs)
+
+    results = run_handler()
+
+    assert [(r['knowledgeBaseId'], r['dataSourceId']) for r in results] == [
+        (c['knowledgeBaseId'], c['dataSourceId']) for c in configs
+    ]
+    assert all(r['status'] == 'started' for r in results)
+    assert all(fake.jobs[r['jobId']]['knowledgeBaseId'] == r['knowledgeBaseId'] for r in results)
+
+
+def test_throttled_calls_are_retried(ssm_configs, fast_dispatch, monkeypatch):
+    fake = FakeBedrockAgentClient(throttle_first=3)
+    monkeypatch.setattr(kb_sync_handler, 'bedrock_agent_client', fake)
+    ssm_configs(kb_pairs(2))
+
+    results = run_handler()
+
+    assert [r['status'] for r in results] == ['started', 'started']
+    assert len(fake.start_calls) == 5
+
+
+def test_dispatch_stops_at_the_deadline(ssm_configs, monkeypatch):
+    monkeypatch.setenv('KB_SYNC_START_JOB_TPS', '0.1')
+    monkeypatch.setenv('KB_SYNC_START_JOB_BURST', '1')
+    monkeypatch.setattr(kb_sync_handler, 'bedrock_agent_client', FakeBedrockAgentClient())
+    ssm_configs(kb_pairs(3))
+
+    # 15 s left: the burst token is free, the next one would arrive after the safety margin
+    results = run_handler(FakeContext(remaining_ms=15000))
+
+    assert [r['status'] for r in results].count('started') == 1
+    assert all('Not enough time' in r['error'] for r in results if r['status'] == 'error')
+
+
+def test_token_bucket_spaces_calls_at_the_configured_rate():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(rate=2, capacity=2, clock=lambda: now[0], sleep=sleep)
+    for _ in range(6):
+        assert bucket.acquire()
+
+    # Two burst tokens, then one token every half second
+    assert now[0] == pytest.approx(2.0)
+    assert bucket.acquire(deadline=now[0] + 0.1) is False
+
+
+@pytest.mark.parametrize('rate, capacity', [(0, 1), (-1, 1), (1, 0.5)])
+def test_token_bucket_rejects_limits_it_could_never_serve(rate, capacity):
+    with pytest.raises(ValueError):
+        TokenBucket(rate=rate, capacity=capacity)
+
+
+def test_zero_start_job_tps_is_reported_as_a_configuration_error(ssm_configs, monkeypatch):
+    monkeypatch.setenv('KB_SYNC_START_JOB_TPS', '0')
+    monkeypatch.setattr(kb_sync_handler, 'bedrock_agent_client', FakeBedrockAgentClient())
+    ssm_configs(kb_pairs(1))
+
+    response = kb_sync_handler.handler({}, FakeContext())
+
+    assert response['statusCode'] == 500
+    assert 'rate must be a positive number' in json.loads(response['body'])['error']
+
+
+def test_unchanged_data_source_is_skipped(ssm_configs, change_detection):
+    agent, _ = change_detection
+    ssm_configs(kb_pairs(1))
+    assert run_handler()[0]['status'] == 'started'
+    complete_all_jobs(agent)
+
+    ssm_configs(kb_pairs(1))
+    result = run_handler()[0]
+
+    assert result['status'] == 'skipped'
+    assert len(agent.start_calls) == 1
+
+
+def test_data_source_with_a_running_job_is_skipped(ssm_configs, change_detection):
+    agent, s3 = change_detection
+    ssm_configs(kb_pairs(1))
+    job_id = run_handler()[0]['jobId']
+    agent.set_job_status(job_id, 'IN_PROGRESS')
+
+    s3.objects['docs-bucket'].append(('docs/c.pdf', '"etag-c"'))
+    ssm_configs(kb_pairs(1))
+    list_calls = s3.list_calls
+    result = run_handler(event={'force': True})[0]
+
+    assert result['status'] == 'skipped'
+    assert result['jobId'] == job_id
+    assert len(agent.start_calls) == 1
+    # Skipped before the bucket is listed
+    assert s3.list_calls == list_calls
+
+
+def test_data_source_whose_state_cannot_be_loaded_is_skipped(ssm_configs, change_detection, monkeypatch):
+    agent, _ = change_detection
+    ssm_configs(kb_pairs(1))
+    run_handler()
+
+    def throttled(**kwargs):
+        raise client_error('ThrottlingException', 'GetIngestionJob')
+
+    monkeypatch.setattr(agent, 'get_ingestion_job', throttled)
+    ssm_configs(kb_pairs(1))
+    result = run_handler(event={'force': True})[0]
+
+    # The previous job may still be running, so no second job is started
+    assert result['status'] == 'skipped'
+    assert 'Sync state could not be loaded' in result['reason']
+    assert len(agent.start_calls) == 1
+
+
+def test_result_recorded_by_the_poller_first_is_kept(ssm_configs, change_detection, monkeypatch):
+    agent, _ = change_detection
+    ssm_configs(kb_pairs(1))
+    job_id = run_handler()[0]['jobId']
+    agent.set_job_status(job_id, 'COMPLETE')
+    store = kb_sync_handler.get_state_store()
+    stale_state = store.get('kb-0', 'ds-0')
+    # The poller records the result between the sync Lambda's read and its write
+    store.put('kb-0', 'ds-0', dict(stale_state, jobId=None, lastJobStatus='COMPLETE', fingerprint='fp-poller'))
+    stale_reads = [stale_state]
+    fresh_get = store.get
+    monkeypatch.setattr(store, 'get', lambda *key: stale_reads.pop() if stale_reads else fresh_get(*key))
+
+    state = kb_sync_handler.load_sync_state(store, 'kb-0', 'ds-0')
+
+    assert 'jobId' not in state
+    assert state['fingerprint'] == 'fp-poller'
+
+
+def test_failed_job_is_retried_on_the_next_run(ssm_configs, change_detection):
+    agent, _ = change_detection
+    ssm_configs(kb_pairs(1))
+    agent.set_job_status(run_handler()[0]['jobId'], 'FAILED', failureReasons=['Access denied'])
+
+    ssm_configs(kb_pairs(1))
+
+    assert run_handler()[0]['status'] == 'started'
+    assert len(agent.start_calls) == 2
+
+
+def test_changed_data_source_is_synced(ssm_configs, change_detection):
+    agent, s3 = change_detection
+    ssm_configs(kb_pairs(1))
+    run_handler()
+    complete_all_jobs(agent)
+
+    s3.objects['docs-bucket'].append(('docs/c.pdf', '"etag-c"'))
+    ssm_configs(kb_pairs(1))
+
+    assert run_handler()[0]['status'] == 'started'
+
+
+def test_force_starts_unchanged_data_sources(ssm_configs, change_detection):
+    agent, _ = change_detection
+    ssm_configs(kb_pairs(1))
+    run_handler()
+    complete_all_jobs(agent)
+
+    ssm_configs(kb_pairs(1))
+
+    assert run_handler(event={'force': True})[0]['status'] == 'started'
+
+
+def test_non_s3_data_sources_are_always_synced(ssm_configs, change_detection):
+    agent, _ = change_detection
+    configs = [{'knowledgeBaseId': 'kb-web', 'dataSourceId': 'ds-web'}]
+    ssm_configs(configs)
+    run_handler()
+    complete_all_jobs(agent)
+
+    ssm_configs(configs)
+
+    assert run_handler()[0]['status'] == 'started'
+
+
+def test_s3_fingerprint_streams_every_page():
+    objects = [(f'docs/{i:05d}.txt', f'"{i}"') for i in range(2500)]
+    s3 = FakeS3Client({'bucket': objects}, page_size=1000)
+
+    fingerprint = s3_fingerprint(s3, 'bucket', ['docs/'])
+
+    assert s3.list_calls == 3
+    s3.objects['bucket'][-1] = ('docs/02499.txt', '"changed"')
+    assert s3_fingerprint(s3, 'bucket', ['docs/']) != fingerprint
+
+
+def test_s3_fingerprint_stops_listing_at_the_deadline():
+    s3 = FakeS3Client({'bucket': [(f'docs/{i:05d}.txt', f'"{i}"') for i in range(2500)]}, page_size=1000)
+    ticks = iter(range(10))
+
+    with pytest.raises(TimeoutError):
+        s3_fingerprint(s3, 'bucket', ['docs/'], deadline=1, clock=lambda: next(ticks))
+
+    assert s3.list_calls == 2
+
+
+def test_change_detection_past_the_deadline_does_not_start_a_job(ssm_configs, change_detection):
+    agent, s3 = change_detection
+    ssm_configs(kb_pairs(1))
+
+    # Within the safety margin: the deadline has passed before the first page is folded in
+    result = run_handler(FakeContext(remaining_ms=5000))[0]
+
+    assert result['status'] == 'error'
+    assert 'deadline' in result['error']
+    assert agent.start_calls == []
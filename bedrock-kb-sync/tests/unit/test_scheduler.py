@@ -0,0 +1,90 @@
+from kb_config import KbDataSource, parse_kb_configs
+from scheduler import plan_tick
+
+NOW = 1700000000.0
+HOUR = 3600
+
+
+def entry(kb, priority=0, interval_minutes=None, vector_store=None, max_concurrent_jobs=None):
+    return KbDataSource(kb, f'ds-{kb}', interval_minutes, priority, vector_store, max_concurrent_jobs)
+
+
+def checked(hours_ago, **state):
+    return dict(state, lastCheckedAt=str(int(NOW - hours_ago * HOUR)))
+
+
+def test_scheduling_metadata_is_parsed_and_validated():
+    config = parse_kb_configs([
+        {'knowledgeBaseId': 'kb-1', 'dataSourceId': 'ds-1', 'intervalMinutes': 60, 'priority': 5,
+         'vectorStore': 'aoss-shared', 'maxConcurrentJobs': 2},
+        {'knowledgeBaseId': 'kb-2', 'dataSourceId': 'ds-2', 'intervalMinutes': 0},
+        {'knowledgeBaseId': 'kb-3', 'dataSourceId': 'ds-3', 'priority': 'high'}
+    ])
+
+    assert config.entries == (KbDataSource('kb-1', 'ds-1', 60, 5, 'aoss-shared', 2),)
+    assert [r['reason'] for r in config.rejected] == [
+        'Invalid configuration: intervalMinutes must be at least 1',
+        'Invalid configuration: priority must be an integer'
+    ]
+
+
+def test_only_due_pairs_are_selected():
+    entries = [entry('hot', interval_minutes=60), entry('cold', interval_minutes=30 * 24 * 60), entry('new')]
+    states = {('hot', 'ds-hot'): checked(2), ('cold', 'ds-cold'): checked(48)}
+
+    plan = plan_tick(entries, states, NOW)
+
+    assert [e.knowledge_base_id for e in plan.selected] == ['new', 'hot']
+    assert plan.not_due == 1
+
+
+def test_due_pairs_are_ordered_by_priority_then_wait():
+    entries = [entry('a', priority=1), entry('b', priority=9), entry('c', priority=1), entry('d', priority=1)]
+    states = {('a', 'ds-a'): checked(30), ('c', 'ds-c'): checked(50)}
+
+    plan = plan_tick(entries, states, NOW)
+
+    # d was never checked, so it has waited longest among the priority 1 pairs
+    assert [e.knowledge_base_id for e in plan.selected] == ['b', 'd', 'c', 'a']
+
+
+def test_vector_store_limit_counts_running_jobs():
+    entries = [entry(f'kb-{i}', priority=i, vector_store='aurora', max_concurrent_jobs=3) for i in range(6)]
+    entries.append(entry('other', vector_store='aoss'))
+    states = {('kb-0', 'ds-kb-0'): checked(30, jobId='job-0')}
+
+    plan = plan_tick(entries, states, NOW)
+
+    # kb-0's running job holds one slot, so only the two highest priority pairs are admitted
+    assert [e.knowledge_base_id for e in plan.selected] == ['kb-5', 'kb-4', 'other', 'kb-0']
+    assert [e.knowledge_base_id for e in plan.deferred] == ['kb-3', 'kb-2', 'kb-1']
+
+
+def test_force_makes_every_pair_due():
+    entries = [entry('a', interval_minutes=60)]
+
+    assert plan_tick(entries, {('a', 'ds-a'): checked(0)}, NOW, force=True).selected == tuple(entries)
+
+
+def test_pairs_waiting_in_the_shard_queue_are_not_selected_until_their_lease_expires():
+    entries = [entry('queued'), entry('lost'), entry('free')]
+    states = {
+        ('queued', 'ds-queued'): {'enqueuedAt': str(int(NOW - HOUR))},
+        ('lost', 'ds-lost'): {'enqueuedAt': str(int(NOW - 7 * HOUR))},
+    }
+
+    plan = plan_tick(entries, states, NOW, force=True, lease_seconds=6 * HOUR)
+
+    assert [e.knowledge_base_id for e in plan.selected] == ['lost', 'free']
+    assert plan.leased == 1
+
+
+def test_leased_pairs_count_against_the_vector_store_limit():
+    entries = [entry(f'kb-{i}', vector_store='aurora', max_concurrent_jobs=2) for i in range(4)]
+    states = {('kb-0', 'ds-kb-0'): {'enqueuedAt': str(int(NOW - HOUR))}}
+
+    plan = plan_tick(entries, states, NOW, lease_seconds=6 * HOUR)
+
+    # kb-0 is waiting in the shard queue and will start a job there, leaving one slot
+    assert [e.knowledge_base_id for e in plan.selected] == ['kb-1']
+    assert [e.knowledge_base_id for e in plan.deferred] == ['kb-2', 'kb-3']
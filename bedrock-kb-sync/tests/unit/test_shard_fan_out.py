@@ -0,0 +1,153 @@
+import json
+from collections import Counter
+
+import pytest
+
+import kb_sync_handler
+from kb_config import KbDataSource
+from shard_planner import enqueue_shards, parse_shard_message, plan_shards
+from tests.fakes import FakeBedrockAgentClient, FakeContext, FakeDynamoDbClient, FakeSqsClient
+
+QUEUE_URL = 'https://sqs.us-east-1.amazonaws.com/123456789012/kb-sync-shards'
+DLQ_URL = 'https://sqs.us-east-1.amazonaws.com/123456789012/kb-sync-shards-dlq'
+
+
+def fleet(kb_count, data_sources_per_kb=1):
+    return [
+        KbDataSource(f'kb-{kb}', f'ds-{kb}-{ds}')
+        for kb in range(kb_count) for ds in range(data_sources_per_kb)
+    ]
+
+
+def test_size_shards_are_consecutive_chunks():
+    entries = fleet(105)
+
+    shards = plan_shards(entries, 50, 'size')
+
+    assert [len(shard) for shard in shards] == [50, 50, 5]
+    assert [entry for shard in shards for entry in shard] == entries
+
+
+def test_hash_shards_keep_a_knowledge_base_together_across_runs():
+    entries = fleet(400, data_sources_per_kb=3)
+
+    shards = plan_shards(entries, 50, 'hash')
+
+    assert sorted(entry for shard in shards for entry in shard) == sorted(entries)
+    shard_of_kb = {}
+    for index, shard in enumerate(shards):
+        for entry in shard:
+            assert shard_of_kb.setdefault(entry.knowledge_base_id, index) == index
+    assert plan_shards(list(reversed(entries)), 50, 'hash') == [list(reversed(shard)) for shard in shards]
+
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError):
+        plan_shards(fleet(3), 2, 'random')
+
+
+def test_rejected_batch_entries_are_resent():
+    sqs = FakeSqsClient(reject_first=3)
+
+    assert enqueue_shards(sqs, QUEUE_URL, plan_shards(fleet(25), 1, 'size')) == 25
+
+    sent = [parse_shard_message(message['body']) for message in sqs.queues[QUEUE_URL]]
+    assert sorted(entries[0] for _, entries, _, _ in sent) == sorted(fleet(25))
+
+
+@pytest.fixture
+def fan_out(monkeypatch):
+    monkeypatch.setenv('KB_SYNC_SHARD_QUEUE_URL', QUEUE_URL)
+    monkeypatch.setenv('KB_SYNC_SHARD_DLQ_URL', DLQ_URL)
+    monkeypatch.setenv('KB_SYNC_SHARD_SIZE', '10')
+    monkeypatch.setenv('KB_SYNC_START_JOB_TPS', '100000')
+    monkeypatch.setenv('KB_SYNC_START_JOB_BURST', '100000')
+    sqs = FakeSqsClient()
+    monkeypatch.setattr(kb_sync_handler, 'sqs_client', sqs)
+    return sqs
+
+
+def test_scheduler_enqueues_shards_and_workers_retry_only_failed_pairs(ssm_configs, fan_out, monkeypatch):
+    configs = [{'knowledgeBaseId': e.knowledge_base_id, 'dataSourceId': e.data_source_id} for e in fleet(100)]
+    ssm_configs(configs + ['kb-legacy'])
+    agent = FakeBedrockAgentClient(fail_pairs={('kb-7', 'ds-7-0')})
+    monkeypatch.setattr(kb_sync_handler, 'bedrock_agent_client', agent)
+
+    response = kb_sync_handler.handler({}, FakeContext())
+    assert response['statusCode'] == 200
+    assert [r['status'] for r in json.loads(response['body'])['results']] == ['skipped']
+    assert agent.start_calls == []
+
+    for attempt in range(3):
+        event = fan_out.lambda_event(QUEUE_URL)
+        assert kb_sync_handler.shard_worker_handler(event, FakeContext()) == {'batchItemFailures': []}
+
+        # Only the failing pair comes back, delayed
+        retry = fan_out.queues[QUEUE_URL]
+        if attempt < 2:
+            assert len(retry) == 1
+            assert parse_shard_message(retry[0]['body'])[1:3] == ([KbDataSource('kb-7', 'ds-7-0')], attempt + 1)
+            assert retry[0]['delaySeconds'] == 60 * 2 ** attempt
+
+    assert fan_out.queues[QUEUE_URL] == []
+    assert parse_shard_message(fan_out.queues[DLQ_URL][0]['body'])[1] == [KbDataSource('kb-7', 'ds-7-0')]
+    starts = Counter(agent.start_calls)
+    assert starts[('kb-7', 'ds-7-0')] == 3
+    assert len(starts) == 100 and set(starts.values()) == {1, 3}
+
+
+def test_worker_reports_unprocessed_records_as_batch_item_failures(fan_out, monkeypatch):
+    monkeypatch.setattr(kb_sync_handler, 'bedrock_agent_client', FakeBedrockAgentClient())
+    enqueue_shards(fan_out, QUEUE_URL, plan_shards(fleet(4), 2, 'size'))
+    event = fan_out.lambda_event(QUEUE_URL)
+    event['Records'].insert(0, {'messageId': 'broken', 'body': 'not json'})
+
+    response = kb_sync_handler.shard_worker_handler(event, FakeContext())
+    assert response == {'batchItemFailures': [{'itemIdentifier': 'broken'}]}
+
+    # Past the deadline no shard is started; SQS redelivers all of them
+    response = kb_sync_handler.shard_worker_handler(event, FakeContext(remaining_ms=5000))
+    assert len(response['batchItemFailures']) == 3
+
+
+def queued_pairs(sqs):
+    return sorted(entry for message in sqs.queues.get(QUEUE_URL, []) for entry in parse_shard_message(message['body'])[1])
+
+
+def test_enqueued_pairs_wait_for_a_worker_before_they_are_enqueued_again(ssm_configs, fan_out, monkeypatch):
+    monkeypatch.setenv('KB_SYNC_STATE_TABLE_NAME', 'sync-state')
+    # Every pair is due on every tick
+    monkeypatch.setenv('KB_SYNC_DEFAULT_INTERVAL_MINUTES', '0')
+    monkeypatch.setattr(kb_sync_handler, 'dynamodb_client', FakeDynamoDbClient())
+    agent = FakeBedrockAgentClient()
+    monkeypatch.setattr(kb_sync_handler, 'bedrock_agent_client', agent)
+    configs = [{'knowledgeBaseId': e.knowledge_base_id, 'dataSourceId': e.data_source_id} for e in fleet(30)]
+
+    for _ in range(2):
+        ssm_configs(configs)
+        assert kb_sync_handler.handler({}, FakeContext())['statusCode'] == 200
+
+    # The second tick found every pair still leased by the first one
+    assert queued_pairs(fan_out) == sorted(fleet(30))
+
+    kb_sync_handler.shard_worker_handler(fan_out.lambda_event(QUEUE_URL), FakeContext())
+    assert len(agent.start_calls) == 30
+    for job_id in list(agent.jobs):
+        agent.set_job_status(job_id, 'COMPLETE')
+
+    # Handled pairs are released and enqueued again once they are due
+    ssm_configs(configs)
+    kb_sync_handler.handler({}, FakeContext())
+    assert queued_pairs(fan_out) == sorted(fleet(30))
+
+
+def test_pairs_whose_shards_could_not_be_enqueued_are_released(ssm_configs, fan_out, monkeypatch):
+    monkeypatch.setenv('KB_SYNC_STATE_TABLE_NAME', 'sync-state')
+    dynamodb = FakeDynamoDbClient()
+    monkeypatch.setattr(kb_sync_handler, 'dynamodb_client', dynamodb)
+    fan_out.reject_first = 1000
+    ssm_configs([{'knowledgeBaseId': 'kb-0', 'dataSourceId': 'ds-0-0'}])
+
+    assert kb_sync_handler.handler({}, FakeContext())['statusCode'] == 500
+
+    assert 'enqueuedAt' not in kb_sync_handler.get_state_store().get('kb-0', 'ds-0-0')
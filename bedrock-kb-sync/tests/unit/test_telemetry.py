@@ -0,0 +1,87 @@
+import io
+import json
+
+import kb_sync_handler
+import telemetry
+from telemetry import MAX_VALUES_PER_RECORD, Metrics
+from tests.fakes import FakeBedrockAgentClient, FakeContext
+
+
+def emf_records(text):
+    return [json.loads(line) for line in text.splitlines() if line.startswith('{"_aws"')]
+
+
+def metric_values(records, name):
+    values = []
+    for record in records:
+        if name in record:
+            values.extend(record[name] if isinstance(record[name], list) else [record[name]])
+    return values
+
+
+def test_records_follow_the_embedded_metric_format(monkeypatch):
+    monkeypatch.setattr(telemetry, '_cold_start', True)
+    stream = io.StringIO()
+    metrics = Metrics('Test', 'unit', xray_sample_rate=0, stream=stream)
+    metrics.set_property('requestId', 'req-1')
+    with metrics.timer('Phase'):
+        pass
+    metrics.put('Items', 3, 'Count')
+    metrics.flush()
+
+    [record] = emf_records(stream.getvalue())
+    directive = record['_aws']['CloudWatchMetrics'][0]
+    assert directive['Namespace'] == 'Test'
+    assert directive['Dimensions'] == [['Service']]
+    assert {m['Name']: m['Unit'] for m in directive['Metrics']} == {
+        'ColdStart': 'Count', 'Phase': 'Milliseconds', 'Items': 'Count'
+    }
+    assert record['Service'] == 'unit'
+    assert record['requestId'] == 'req-1'
+    assert record['ColdStart'] == 1
+    assert record['Items'] == 3
+    assert record['Phase'] >= 0
+
+
+def test_only_the_first_invocation_is_a_cold_start(monkeypatch):
+    monkeypatch.setattr(telemetry, '_cold_start', True)
+    first, second = io.StringIO(), io.StringIO()
+    Metrics('Test', 'unit', stream=first).flush()
+    Metrics('Test', 'unit', stream=second).flush()
+
+    assert emf_records(first.getvalue())[0]['ColdStart'] == 1
+    assert emf_records(second.getvalue())[0]['ColdStart'] == 0
+
+
+def test_metrics_over_the_value_limit_are_split_across_records():
+    stream = io.StringIO()
+    metrics = Metrics('Test', 'unit', stream=stream)
+    for i in range(MAX_VALUES_PER_RECORD * 2 + 5):
+        metrics.put('Latency', i)
+    metrics.flush()
+
+    records = emf_records(stream.getvalue())
+    assert len(records) == 3
+    assert all(len(metric_values([record], 'Latency')) <= MAX_VALUES_PER_RECORD for record in records)
+    assert metric_values(records, 'Latency') == list(range(MAX_VALUES_PER_RECORD * 2 + 5))
+    # Single-valued metrics are only emitted in the first record
+    assert len(metric_values(records, 'ColdStart')) == 1
+
+
+def test_sync_handler_emits_dispatch_latency_and_throttles(ssm_configs, monkeypatch, capsys):
+    monkeypatch.setenv('KB_SYNC_START_JOB_TPS', '100000')
+    monkeypatch.setenv('KB_SYNC_START_JOB_BURST', '100000')
+    monkeypatch.setenv('KB_SYNC_RETRY_BASE_DELAY', '0')
+    monkeypatch.setattr(kb_sync_handler, 'bedrock_agent_client', FakeBedrockAgentClient(throttle_first=2))
+    ssm_configs([{'knowledgeBaseId': f'kb-{i}', 'dataSourceId': f'ds-{i}'} for i in range(3)])
+
+    response = kb_sync_handler.handler({}, FakeContext())
+
+    assert response['statusCode'] == 200
+    records = emf_records(capsys.readouterr().out)
+    assert records[0]['_aws']['CloudWatchMetrics'][0]['Namespace'] == 'BedrockKbSync'
+    assert records[0]['Service'] == 'KbSyncScheduler'
+    assert len(metric_values(records, 'DispatchLatency')) == 3
+    assert sum(metric_values(records, 'Throttles')) == 2
+    assert metric_values(records, 'JobsStarted') == [3]
+    assert len(metric_values(records, 'ConfigLoad')) == 1
@@ -0,0 +1,156 @@
+"""Synchronous vs. asynchronous predictions for large images and a slow model.
+
+Runs image2sagemaker.Filter._call_lambda against a local aiohttp stand-in for the API.
+The model takes ``--model-seconds`` plus ``--seconds-per-mb`` for every MB uploaded.
+``/predict`` gives up after ``--gateway-timeout`` seconds with a 504, like API Gateway's
+29 s integration limit (scaled down so the run is quick). ``/predict/async`` and
+``/predict/result/{id}`` finish the same work in the background:
+
+    python benchmarks/bench_async.py --sizes-mb 0.5 2 8 --gateway-timeout 2.9
+"""
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import os
+import statistics
+import sys
+import time
+import uuid
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image2sagemaker import Filter  # noqa: E402
+
+
+def make_image(size_mb):
+    return base64.b64encode(os.urandom(int(size_mb * 1_000_000))).decode()
+
+
+async def start_server(args):
+    requests = {}
+
+    def model_seconds(body):
+        return args.model_seconds + args.seconds_per_mb * len(body) / 1_000_000
+
+    async def predict(request):
+        body = await request.read()
+        seconds = model_seconds(body)
+        if seconds > args.gateway_timeout:
+            await asyncio.sleep(args.gateway_timeout)
+            return web.json_response(
+                {"message": "Endpoint request timed out"}, status=504
+            )
+        await asyncio.sleep(seconds)
+        return web.json_response({"prediction": {"label": "cat", "score": 0.98}})
+
+    async def run_model(request_id, seconds):
+        await asyncio.sleep(seconds)
+        requests[request_id]["status"] = "COMPLETED"
+        requests[request_id]["done"].set()
+
+    async def predict_async(request):
+        body = await request.read()
+        request_id = uuid.uuid4().hex
+        requests[request_id] = {"status": "PENDING", "done": asyncio.Event()}
+        asyncio.get_running_loop().create_task(
+            run_model(request_id, model_seconds(body))
+        )
+        return web.json_response(
+            {"requestId": request_id, "status": "PENDING"}, status=202
+        )
+
+    async def result(request):
+        entry = requests.get(request.match_info["id"])
+        if entry is None:
+            return web.json_response({"message": "Not found"}, status=404)
+        wait = min(float(request.query.get("wait", "0")), args.gateway_timeout)
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(entry["done"].wait(), wait)
+        if entry["status"] != "COMPLETED":
+            return web.json_response({"status": "PENDING"}, status=202)
+        return web.json_response(
+            {"status": "COMPLETED", "prediction": {"label": "cat", "score": 0.98}}
+        )
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post("/predict", predict)
+    app.router.add_post("/predict/async", predict_async)
+    app.router.add_get("/predict/result/{id}", result)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+async def no_op_emitter(event):
+    pass
+
+
+async def main(args):
+    runner, base_url = await start_server(args)
+    rows = []
+    try:
+        for size_mb in args.sizes_mb:
+            image = make_image(size_mb)
+            for mode in ("sync", "async"):
+                image_filter = Filter()
+                image_filter.valves.sm_base_url = base_url
+                # The stand-in has no usage plan to stay under
+                image_filter.valves.rate_limit_rps = 0
+                image_filter.valves.max_retries = args.retries
+                image_filter.valves.retry_backoff_base = 0.1
+                image_filter.valves.async_enabled = mode == "async"
+                image_filter.valves.async_threshold_bytes = 0
+                # Long polls share the stand-in gateway's limit
+                image_filter.valves.async_wait_seconds = int(args.gateway_timeout)
+                timings, failures = [], 0
+                for _ in range(args.iterations):
+                    start = time.perf_counter()
+                    try:
+                        await image_filter._call_lambda(image, no_op_emitter)
+                    except RuntimeError:
+                        failures += 1
+                    timings.append(time.perf_counter() - start)
+                await image_filter.on_shutdown()
+                rows.append(
+                    (
+                        size_mb,
+                        mode,
+                        failures,
+                        args.iterations,
+                        statistics.median(timings),
+                    )
+                )
+    finally:
+        await runner.cleanup()
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[0.5, 2, 8])
+    parser.add_argument("--model-seconds", type=float, default=0.5)
+    parser.add_argument("--seconds-per-mb", type=float, default=0.6)
+    parser.add_argument("--gateway-timeout", type=float, default=2.9)
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--iterations", type=int, default=3)
+    args = parser.parse_args()
+    # The filter prints every response; keep that out of the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        rows = asyncio.run(main(args))
+
+    print(
+        f"model {args.model_seconds:g}s + {args.seconds_per_mb:g}s/MB, "
+        f"gateway timeout {args.gateway_timeout:g}s, {args.retries} attempts per image"
+    )
+    print(f"{'payload':>9} {'mode':<6} {'succeeded':>10} {'p50 s':>8}")
+    for size_mb, mode, failures, iterations, p50 in rows:
+        print(
+            f"{size_mb:>7g}MB {mode:<6} {iterations - failures:>4}/{iterations:<5} {p50:>8.2f}"
+        )
@@ -0,0 +1,103 @@
+"""Upload size and end-to-end latency with and without client-side downscaling.
+
+Sends a large PNG "screenshot" through image2sagemaker.Filter._call_lambda to a local
+aiohttp server that charges transfer time for every byte received (``--bandwidth-mbps``):
+
+    python benchmarks/bench_downscale.py --width 2560 --height 1440 --iterations 5
+"""
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+
+from aiohttp import web
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image2sagemaker import Filter  # noqa: E402
+
+
+def make_screenshot(width, height):
+    """A PNG data URL with enough noise that it compresses about as badly as a photo."""
+    image = Image.frombytes("RGB", (width, height), os.urandom(width * height * 3))
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(output.getvalue()).decode()
+
+
+async def start_server(bandwidth_mbps, received):
+    async def predict(request):
+        body = await request.read()
+        received.append(len(body))
+        await asyncio.sleep(len(body) * 8 / (bandwidth_mbps * 1_000_000))
+        return web.json_response({"prediction": {"label": "cat", "score": 0.98}})
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post("/predict", predict)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+async def no_op_emitter(event):
+    pass
+
+
+async def main(args):
+    image = make_screenshot(args.width, args.height)
+    received = []
+    runner, base_url = await start_server(args.bandwidth_mbps, received)
+    rows = []
+    try:
+        for resize_format in (None, "JPEG", "WEBP"):
+            image_filter = Filter()
+            image_filter.valves.sm_base_url = base_url
+            # The stand-in has no usage plan to stay under
+            image_filter.valves.rate_limit_rps = 0
+            image_filter.valves.resize_enabled = resize_format is not None
+            image_filter.valves.resize_format = resize_format or "JPEG"
+            image_filter.valves.resize_max_dimension = args.max_dimension
+            timings = []
+            received.clear()
+            for _ in range(args.iterations):
+                start = time.perf_counter()
+                await image_filter._call_lambda(image, no_op_emitter)
+                timings.append(time.perf_counter() - start)
+            await image_filter.on_shutdown()
+            rows.append(
+                (
+                    resize_format or "original PNG",
+                    received[0],
+                    statistics.median(timings),
+                )
+            )
+    finally:
+        await runner.cleanup()
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--width", type=int, default=2560)
+    parser.add_argument("--height", type=int, default=1440)
+    parser.add_argument("--max-dimension", type=int, default=512)
+    parser.add_argument("--bandwidth-mbps", type=float, default=50.0)
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+    # The filter prints every response; keep that out of the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        rows = asyncio.run(main(args))
+
+    print(f"{'upload':<14} {'request bytes':>14} {'p50 ms':>9}")
+    for label, request_bytes, p50 in rows:
+        print(f"{label:<14} {request_bytes:>14,} {p50 * 1000:>9.1f}")
@@ -0,0 +1,110 @@
+"""Per-turn CPU time and allocations of Filter.inlet as the chat history grows.
+
+Every earlier turn holds an image and an assistant reply, like a long multimodal chat.
+SageMaker calls are replaced by an immediate reply, so only the filter's own work on the
+body is measured, with and without the full-body logging the filter used to do (the
+``inlet:body`` log line and the ``outlet`` prints):
+
+    python benchmarks/bench_history.py --history 10 100 500 --image-kb 200
+"""
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import logging
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image2sagemaker import Filter, logger  # noqa: E402
+
+
+def make_history(turns, image_url):
+    history = []
+    for turn in range(turns):
+        history.append(
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": f"What is in picture {turn}?"},
+                    {"type": "image_url", "image_url": {"url": image_url}},
+                ],
+            }
+        )
+        history.append({"role": "assistant", "content": f"Picture {turn} shows a cat."})
+    return history
+
+
+def latest_message(image_url):
+    return {
+        "role": "user",
+        "content": [
+            {"type": "text", "text": "And this one?"},
+            {"type": "image_url", "image_url": {"url": image_url}},
+        ],
+    }
+
+
+async def no_op_emitter(event):
+    pass
+
+
+async def run_turns(image_filter, history, image_url, iterations, full_body_logging):
+    cpu_times, peaks = [], []
+    for _ in range(iterations):
+        body = {"messages": history + [latest_message(image_url)]}
+        tracemalloc.start()
+        start = time.process_time()
+        if full_body_logging:
+            logger.info(f"inlet:body:{body}")
+        body = await image_filter.inlet(body, no_op_emitter, {"id": "user"})
+        if full_body_logging:
+            print(f"outlet:body:{body}")
+        cpu_times.append(time.process_time() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return statistics.median(cpu_times), statistics.median(peaks)
+
+
+async def main(args):
+    image_url = (
+        "data:image/png;base64,"
+        + base64.b64encode(os.urandom(args.image_kb * 1024)).decode()
+    )
+    image_filter = Filter()
+
+    async def classify(image, event_emitter, label=""):
+        return {"prediction": {"label": "cat", "score": 0.98}}
+
+    image_filter._call_lambda = classify
+    rows = []
+    for turns in args.history:
+        history = make_history(turns, image_url)
+        for mode, full_body_logging in (("full body logged", True), ("scanner", False)):
+            cpu, peak = await run_turns(
+                image_filter, history, image_url, args.iterations, full_body_logging
+            )
+            rows.append((len(history) + 1, mode, cpu, peak))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--history", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--image-kb", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+    # Format log records and prints as usual, but do not write them to the terminal
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for handler in logging.getLogger().handlers:
+            handler.setStream(devnull)
+        rows = asyncio.run(main(args))
+
+    print(f"{'messages':>8} {'mode':<17} {'CPU ms/turn':>12} {'peak alloc':>14}")
+    for messages, mode, cpu, peak in rows:
+        print(f"{messages:>8} {mode:<17} {cpu * 1000:>12.2f} {peak:>14,}")
@@ -0,0 +1,136 @@
+"""Throttling with and without the filter's adaptive client-side rate limiter.
+
+Runs image2sagemaker.Filter._call_lambda against a local aiohttp stand-in for API Gateway
+that enforces a usage plan token bucket (``--rate`` requests per second, ``--burst``) and
+answers 429 beyond it. Compares no client limit, the limiter set to the plan's limits and
+the limiter set to twice the plan's rate, which it has to find out through 429s (AIMD):
+
+    python benchmarks/bench_rate_limit.py --images 300 --concurrency 50 --rate 50 --burst 20
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import time
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image2sagemaker import Filter  # noqa: E402
+
+IMAGE = "data:image/png;base64," + "A" * 4096
+
+
+async def start_server(args, counters):
+    bucket = {"tokens": float(args.burst), "updated": time.monotonic()}
+
+    async def predict(request):
+        await request.read()
+        now = time.monotonic()
+        bucket["tokens"] = min(
+            args.burst, bucket["tokens"] + (now - bucket["updated"]) * args.rate
+        )
+        bucket["updated"] = now
+        if bucket["tokens"] < 1:
+            counters["throttled"] += 1
+            headers = {"Retry-After": str(args.retry_after)} if args.retry_after else {}
+            return web.json_response(
+                {"message": "Too Many Requests"}, status=429, headers=headers
+            )
+        bucket["tokens"] -= 1
+        counters["served"] += 1
+        await asyncio.sleep(args.latency)
+        return web.json_response({"prediction": {"label": "cat", "score": 0.98}})
+
+    app = web.Application()
+    app.router.add_post("/predict", predict)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+async def no_op_emitter(event):
+    pass
+
+
+async def run_mode(base_url, args, client_rate, counters):
+    image_filter = Filter()
+    image_filter.valves.sm_base_url = base_url
+    image_filter.valves.rate_limit_rps = client_rate
+    image_filter.valves.rate_limit_burst = args.burst
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, failures = [], 0
+
+    async def one():
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await image_filter._call_lambda(IMAGE, no_op_emitter)
+                latencies.append(time.perf_counter() - start)
+            except RuntimeError:
+                failures += 1
+
+    counters.update(served=0, throttled=0)
+    # Let the server's bucket fill up again between modes
+    await asyncio.sleep(args.burst / args.rate)
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(args.images)))
+    wall = time.perf_counter() - start
+    await image_filter.on_shutdown()
+    latencies.sort()
+    p95 = latencies[int(0.95 * (len(latencies) - 1))] if latencies else float("nan")
+    return len(latencies), failures, counters["throttled"], wall, p95
+
+
+async def main(args):
+    counters = {}
+    runner, base_url = await start_server(args, counters)
+    rows = []
+    try:
+        modes = (
+            ("no client limit", 0),
+            ("limiter at plan rate", args.rate),
+            ("limiter at 2x plan", args.rate * 2),
+        )
+        for label, client_rate in modes:
+            rows.append(
+                (label,) + await run_mode(base_url, args, client_rate, counters)
+            )
+    finally:
+        await runner.cleanup()
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rate", type=float, default=50.0)
+    parser.add_argument("--burst", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument(
+        "--retry-after", type=int, default=0, help="Retry-After seconds sent with 429s"
+    )
+    args = parser.parse_args()
+    # The filter prints every response; keep that out of the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        rows = asyncio.run(main(args))
+
+    print(
+        f"usage plan {args.rate:g} req/s, burst {args.burst}; "
+        f"{args.images} images, {args.concurrency} in flight"
+    )
+    print(
+        f"{'mode':<22} {'succeeded':>9} {'failed':>7} {'429s':>6} {'wall s':>7} {'p95 s':>7}"
+    )
+    for label, succeeded, failed, throttled, wall, p95 in rows:
+        print(
+            f"{label:<22} {succeeded:>9} {failed:>7} {throttled:>6} {wall:>7.2f} {p95:>7.2f}"
+        )
@@ -0,0 +1,112 @@
+"""Latency of image2sagemaker.Filter._call_lambda with a pooled session vs. a session per message.
+
+Starts a local aiohttp server that stands in for API Gateway and drives the filter at
+several levels of concurrent chats:
+
+    python benchmarks/bench_session_pool.py --requests 200 --latency 0.01
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image2sagemaker import Filter  # noqa: E402
+
+IMAGE = "data:image/png;base64," + "A" * 4096
+CONCURRENCY_LEVELS = (1, 10, 50)
+
+
+async def start_server(latency):
+    async def predict(request):
+        await request.read()
+        await asyncio.sleep(latency)
+        return web.json_response({"prediction": {"label": "cat", "score": 0.98}})
+
+    app = web.Application()
+    app.router.add_post("/predict", predict)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+async def no_op_emitter(event):
+    pass
+
+
+async def call_with_session_per_message(url, image):
+    """The previous behaviour: a brand-new ClientSession (and connection) for every message."""
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url + "/predict", json={"image": image}) as response:
+            response.raise_for_status()
+            return await response.json()
+
+
+async def run_level(call, concurrency, requests):
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await call()
+            timings.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    timings.sort()
+    return (
+        timings[len(timings) // 2],
+        timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+    )
+
+
+async def main(args):
+    runner, base_url = await start_server(args.latency)
+    image_filter = Filter()
+    image_filter.valves.sm_base_url = base_url
+    # The stand-in has no usage plan to stay under
+    image_filter.valves.rate_limit_rps = 0
+    rows = []
+    try:
+        for concurrency in CONCURRENCY_LEVELS:
+            modes = (
+                (
+                    "session per message",
+                    lambda: call_with_session_per_message(base_url, IMAGE),
+                ),
+                (
+                    "pooled session",
+                    lambda: image_filter._call_lambda(IMAGE, no_op_emitter),
+                ),
+            )
+            for label, call in modes:
+                p50, p99 = await run_level(call, concurrency, args.requests)
+                rows.append((concurrency, label, p50, p99))
+    finally:
+        await image_filter.on_shutdown()
+        await runner.cleanup()
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.01)
+    args = parser.parse_args()
+    # The filter prints every response; keep that out of the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        rows = asyncio.run(main(args))
+
+    print(f"{'chats':>5} {'mode':<20} {'p50 ms':>9} {'p99 ms':>9}")
+    for concurrency, label, p50, p99 in rows:
+        print(f"{concurrency:>5} {label:<20} {p50 * 1000:>9.2f} {p99 * 1000:>9.2f}")
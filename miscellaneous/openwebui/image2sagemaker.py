@@ -8,13 +8,193 @@ version: 0.1
 
 from pydantic import BaseModel, Field
 from typing import Optional, Callable, Any, Awaitable
+import asyncio
+import base64
+import binascii
+import email.utils
+import array
+import io
+import json
 import logging
+import random
+import struct
+import sys
+import time
 import aiohttp
 
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; images are sent unchanged without it
+    Image = None
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+class RequestNotRetried(RuntimeError):
+    """A failure that retrying the request cannot fix."""
+
+
+class AsyncInferenceFailed(RequestNotRetried):
+    """The asynchronous inference finished with an error or did not finish in time."""
+
+
+class RateLimitExceeded(RequestNotRetried):
+    """The client-side rate limiter could not admit the request within rate_limit_max_wait."""
+
+
+class QuotaExceeded(RequestNotRetried):
+    """The usage plan quota of the API key is used up."""
+
+
+class Throttled(RuntimeError):
+    """The API answered 429; ``retry_after`` is its Retry-After delay in seconds, if any."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Accept header sent to /predict for each sm_response_format (see response_encoding.py in
+# apigateway-to-sagemaker for the formats)
+RESPONSE_TYPES = {
+    "json": "application/json",
+    "raw": "application/x-prediction-raw",
+    "float32": "application/x-prediction-float32",
+}
+FLOAT32_MARKER = "__float32__"
+
+# Pillow format for each accepted resize_format valve value; JPG is a common alias
+RESIZE_FORMATS = {"JPEG": "JPEG", "JPG": "JPEG", "WEBP": "WEBP"}
+
+
+def _unpack_float32(body: bytes) -> dict:
+    """Decode a float32-format /predict response into ``{"prediction": ...}``.
+
+    The body is a 4-byte little-endian header length, a JSON header and little-endian
+    float32 values; each ``{"__float32__": [offset, count], "shape": [...]}`` in the header
+    is replaced by its values, nested to the shape.
+    """
+    (header_length,) = struct.unpack_from("<I", body)
+    header = json.loads(body[4 : 4 + header_length])
+    values = array.array("f")
+    values.frombytes(body[4 + header_length :])
+    if sys.byteorder == "big":
+        values.byteswap()
+
+    def reshape(flat, shape):
+        if len(shape) == 1:
+            return flat
+        step = len(flat) // shape[0]
+        return [
+            reshape(flat[i : i + step], shape[1:]) for i in range(0, len(flat), step)
+        ]
+
+    def unpack(value):
+        if isinstance(value, dict):
+            if FLOAT32_MARKER in value:
+                offset, count = value[FLOAT32_MARKER]
+                return reshape(values[offset : offset + count].tolist(), value["shape"])
+            return {key: unpack(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [unpack(item) for item in value]
+        return value
+
+    return unpack(header)
+
+
+def _parse_retry_after(value) -> Optional[float]:
+    """Seconds to wait from a Retry-After header given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class AdaptiveRateLimiter:
+    """Token bucket with additive-increase/multiplicative-decrease (AIMD) of its rate.
+
+    Starts at ``rate`` requests per second with ``burst`` tokens, matching the API key's
+    usage plan. A 429 multiplies the rate by ``decrease`` (at most once per second, since
+    concurrent requests are throttled together), down to ``min_rate``, and empties the
+    bucket; a Retry-After delay also holds every request back until it has passed. Each
+    success raises the rate by ``increase * max_rate / rate``, which regains about
+    ``increase`` of the configured rate for every second of successful requests.
+
+    Requests reserve tokens in arrival order and sleep until theirs is due, so the event
+    loop is never blocked; a request that would wait longer than ``max_wait`` raises
+    RateLimitExceeded at once instead.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        min_rate: float,
+        increase: float,
+        decrease: float,
+        max_wait: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = max(1.0, float(burst))
+        self.min_rate = min(min_rate, rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.max_wait = max_wait
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+        self.blocked_until = 0.0
+        self.last_decrease = float("-inf")
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Take a token and return the seconds to wait before using it."""
+        now = self.clock()
+        self._refill(now)
+        wait = max(0.0, (1 - self.tokens) / self.rate, self.blocked_until - now)
+        if wait > self.max_wait:
+            raise RateLimitExceeded(
+                f"Rate limited for {wait:.1f}s, longer than rate_limit_max_wait"
+            )
+        # Tokens go negative while requests are queued for them
+        self.tokens -= 1
+        return wait
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_success(self):
+        self._refill(self.clock())
+        self.rate = min(
+            self.max_rate, self.rate + self.increase * self.max_rate / self.rate
+        )
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        now = self.clock()
+        self._refill(now)
+        if now - self.last_decrease >= 1.0:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.last_decrease = now
+        self.tokens = min(self.tokens, 0.0)
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+
+
 class Filter:
     class Valves(BaseModel):
         priority: int = Field(
@@ -30,6 +210,119 @@ class Filter:
         sm_endpoint: str = Field(
             default="/predict", description="SageMaker AI endpoint route, e.g. /predict"
         )
+        sm_stream: bool = Field(
+            default=False,
+            description="Stream the prediction from the streaming route as it is generated",
+        )
+        sm_stream_endpoint: str = Field(
+            default="/predict/stream",
+            description="SageMaker AI streaming route, e.g. /predict/stream",
+        )
+        sm_response_format: str = Field(
+            default="json",
+            description="Prediction format requested from /predict: json, raw (the endpoint's own response) or float32 (numeric arrays packed as float32)",
+        )
+        async_enabled: bool = Field(
+            default=False,
+            description="Send large images to the asynchronous route instead of waiting on the synchronous one",
+        )
+        async_threshold_bytes: int = Field(
+            default=1_000_000,
+            description="Images whose base64 payload is larger than this use the asynchronous route",
+        )
+        sm_async_endpoint: str = Field(
+            default="/predict/async",
+            description="SageMaker AI asynchronous route, e.g. /predict/async",
+        )
+        sm_result_endpoint: str = Field(
+            default="/predict/result",
+            description="SageMaker AI asynchronous result route, e.g. /predict/result",
+        )
+        async_wait_seconds: int = Field(
+            default=20,
+            description="Seconds each result request waits for the prediction (long poll, at most 20)",
+        )
+        async_timeout: float = Field(
+            default=900.0,
+            description="Overall seconds to wait for an asynchronous prediction",
+        )
+        http_pool_limit: int = Field(
+            default=100, description="Maximum open connections in the shared HTTP pool"
+        )
+        http_pool_limit_per_host: int = Field(
+            default=50, description="Maximum open connections per host"
+        )
+        http_dns_cache_ttl: int = Field(
+            default=300, description="Seconds to cache DNS lookups"
+        )
+        http_keepalive_timeout: float = Field(
+            default=30.0, description="Seconds to keep idle connections alive"
+        )
+        http_connect_timeout: float = Field(
+            default=5.0, description="Seconds to wait for a connection per request"
+        )
+        http_total_timeout: float = Field(
+            default=60.0, description="Overall timeout in seconds per request"
+        )
+        rate_limit_rps: float = Field(
+            default=10.0,
+            description="Requests per second allowed by the API's usage plan (USAGE_PLAN_RATE_LIMIT); 0 disables client-side rate limiting",
+        )
+        rate_limit_burst: int = Field(
+            default=20,
+            description="Burst allowed by the API's usage plan (USAGE_PLAN_BURST_LIMIT)",
+        )
+        rate_limit_min_rps: float = Field(
+            default=0.5,
+            description="Lowest rate the limiter backs off to after 429 responses",
+        )
+        rate_limit_increase: float = Field(
+            default=0.1,
+            description="Share of rate_limit_rps regained for every second of successful requests",
+        )
+        rate_limit_decrease: float = Field(
+            default=0.5, description="Factor applied to the rate on a 429 response"
+        )
+        rate_limit_max_wait: float = Field(
+            default=10.0,
+            description="Seconds a request may wait for the rate limiter before failing fast",
+        )
+        retry_backoff_base: float = Field(
+            default=0.5,
+            description="Base delay in seconds for exponential retry backoff",
+        )
+        retry_backoff_max: float = Field(
+            default=8.0, description="Maximum delay in seconds between retries"
+        )
+        resize_enabled: bool = Field(
+            default=False,
+            description="Downscale and re-encode images before upload (requires Pillow)",
+        )
+        resize_max_dimension: int = Field(
+            default=512, description="Longest side in pixels after downscaling"
+        )
+        resize_format: str = Field(
+            default="JPEG",
+            description="Re-encoding format: JPEG (or JPG) or WEBP; other values leave images unchanged",
+        )
+        resize_quality: int = Field(
+            default=85, description="Re-encoding quality from 1 to 100"
+        )
+        max_images: int = Field(
+            default=8,
+            description="Maximum number of images sent to SageMaker per message",
+        )
+        max_concurrent_images: int = Field(
+            default=4, description="Maximum number of images processed concurrently"
+        )
+        include_history_images: bool = Field(
+            default=False,
+            description="Also process images from recent user messages when the latest one has an image",
+        )
+        history_messages: int = Field(
+            default=4,
+            description="Number of earlier messages scanned when include_history_images is on",
+        )
 
     class UserValves(BaseModel):
         pass
@@ -43,26 +336,104 @@ class Filter:
         # Initialize 'valves' with specific configurations. Using 'Valves' instance helps encapsulate settings,
         # which ensures settings are managed cohesively and not confused with operational flags like 'file_handler'.
         self.valves = self.Valves()
-        pass
+        # Shared HTTP session, created lazily so it binds to the running event loop
+        self._session = None
+        self._session_key = None
+        # Shared by every chat, like the API key whose usage plan it follows
+        self._rate_limiter = None
+        self._rate_limiter_key = None
+
+    def _find_images_in_messages(self, messages):
+        """Locate the images to classify.
 
-    def _find_image_in_latest_messages(self, messages):
+        Returns ``(message_index, text_index, images)`` for the latest user message, where
+        ``text_index`` is its last text part (or None) and ``images`` is a list of
+        ``(message_index, content_index, url)`` in conversation order. With
+        include_history_images, images from recent user messages are added as well, but only
+        when the latest user message has an image itself. Returns None when the latest user
+        message has no images, so a text-only follow-up never re-sends earlier images.
+
+        One backward pass from the end of the conversation that stops as soon as it has
+        max_images images, so the cost does not grow with the length of the history. Only
+        positions and references are collected; image data is never copied.
+        """
         m_index = len(messages) - 1
-        message = messages[m_index]
-        if message["role"] == "user" and isinstance(message.get("content"), list):
-            t_index = 0
-            i_index = 0
-            image_count = 0
-            for c_index, content in enumerate(message["content"]):
-                if content["type"] == "image_url":
-                    # only process first image if user upload two image at the same time
-                    if image_count == 0:
-                        i_index = c_index
-                        image_count = image_count + 1
-                if content["type"] == "text":
+        # Assistant or tool messages may follow the user's latest message
+        while m_index >= 0 and messages[m_index].get("role") != "user":
+            m_index -= 1
+        if m_index < 0 or not isinstance(messages[m_index].get("content"), list):
+            return None
+
+        first_index = m_index
+        if self.valves.include_history_images:
+            first_index = max(0, m_index - self.valves.history_messages)
+
+        t_index = None
+        images = []
+        for i in range(m_index, first_index - 1, -1):
+            content = messages[i].get("content")
+            if messages[i].get("role") != "user" or not isinstance(content, list):
+                continue
+            for c_index in range(len(content) - 1, -1, -1):
+                part_type = content[c_index].get("type")
+                if part_type == "image_url" and len(images) < self.valves.max_images:
+                    images.append((i, c_index, content[c_index]["image_url"]["url"]))
+                elif part_type == "text" and i == m_index and t_index is None:
                     t_index = c_index
-                    # logger.info(content["image_url"])
-            return m_index, t_index, i_index, content["image_url"]["url"]
-        return None
+            # Text-only follow-ups do not re-classify images from earlier turns
+            if not images:
+                return None
+            # Keep the most recent images when there are more than max_images
+            if len(images) >= self.valves.max_images:
+                break
+
+        images.reverse()
+        return m_index, t_index, images
+
+    def _describe_content(self, content) -> str:
+        """Summarize message content for logs without formatting image data.
+
+        Text is shortened to its first 80 characters and images are reduced to their type
+        and size, so a log line stays small whatever the message holds.
+        """
+        if not isinstance(content, list):
+            content = [{"type": "text", "text": content or ""}]
+        parts = []
+        for part in content:
+            if part.get("type") == "text":
+                text = part.get("text") or ""
+                suffix = f"... ({len(text)} chars)" if len(text) > 80 else ""
+                parts.append(f"text {text[:80]!r}{suffix}")
+            elif part.get("type") == "image_url":
+                url = part.get("image_url", {}).get("url", "")
+                if url.startswith("data:"):
+                    media_type = url[5 : url.find(";", 0, 64)]
+                    parts.append(f"image {media_type} ~{len(url) * 3 // 4:,} bytes")
+                else:
+                    parts.append(f"image {url[:80]}")
+            else:
+                parts.append(str(part.get("type")))
+        return "[" + ", ".join(parts) + "]"
+
+    def _describe_result(self, result) -> str:
+        """Summarize a prediction or error for logs by its type and size, not its content.
+
+        Predictions can be large (embeddings, masks) and errors can carry response bodies,
+        so only errors keep a short message.
+        """
+        if isinstance(result, Exception):
+            message = str(result)
+            suffix = f"... ({len(message)} chars)" if len(message) > 80 else ""
+            return f"{type(result).__name__} {message[:80]!r}{suffix}"
+        if isinstance(result, bytes):
+            return f"bytes of {len(result):,} bytes"
+        if isinstance(result, str):
+            return f"str of {len(result):,} chars"
+        try:
+            size = len(json.dumps(result))
+        except (TypeError, ValueError):
+            size = len(str(result))
+        return f"{type(result).__name__} of {size:,} chars as JSON"
 
     def _remove_base64_header(self, base64_string):
         """Remove the 'data:image/jpeg;base64,' prefix from a base64 string"""
@@ -70,61 +441,357 @@ class Filter:
             return base64_string.split(",", 1)[1]
         return base64_string  # Return as-is if no prefix is found
 
+    def _downscale_image(self, image: str) -> str:
+        """Shrink a (data URL) image to resize_max_dimension and re-encode it.
+
+        CPU bound, so callers run it in a worker thread. Images that are already small
+        enough and in the target format, or that Pillow cannot decode, are returned unchanged,
+        as are all images when resize_format is not a supported format.
+        """
+        image_format = RESIZE_FORMATS.get(self.valves.resize_format.strip().upper())
+        if image_format is None:
+            logger.warning(
+                f"Image preprocessing skipped: unsupported resize_format {self.valves.resize_format!r}"
+            )
+            return image
+        max_dimension = self.valves.resize_max_dimension
+        try:
+            image_bytes = base64.b64decode(self._remove_base64_header(image))
+            with Image.open(io.BytesIO(image_bytes)) as decoded:
+                if (
+                    max(decoded.size) <= max_dimension
+                    and decoded.format == image_format
+                ):
+                    return image
+                # Let the JPEG decoder downscale while decoding, which is much cheaper
+                decoded.draft("RGB", (max_dimension, max_dimension))
+                decoded.thumbnail((max_dimension, max_dimension))
+                if decoded.mode not in ("RGB", "L"):
+                    # JPEG has no alpha channel
+                    decoded = decoded.convert("RGB")
+                output = io.BytesIO()
+                decoded.save(
+                    output, format=image_format, quality=self.valves.resize_quality
+                )
+        except (OSError, ValueError, binascii.Error, Image.DecompressionBombError) as e:
+            logger.warning(f"Image preprocessing skipped: {e}")
+            return image
+        encoded = base64.b64encode(output.getvalue()).decode()
+        return f"data:image/{image_format.lower()};base64,{encoded}"
+
+    def _connector_settings(self):
+        return (
+            self.valves.http_pool_limit,
+            self.valves.http_pool_limit_per_host,
+            self.valves.http_dns_cache_ttl,
+            self.valves.http_keepalive_timeout,
+        )
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the pooled session, rebuilding it if it was closed, the loop changed or the valves changed."""
+        session_key = (asyncio.get_running_loop(), self._connector_settings())
+        if (
+            self._session is None
+            or self._session.closed
+            or self._session_key != session_key
+        ):
+            await self.on_shutdown()
+            limit, limit_per_host, dns_cache_ttl, keepalive_timeout = session_key[1]
+            connector = aiohttp.TCPConnector(
+                limit=limit,
+                limit_per_host=limit_per_host,
+                ttl_dns_cache=dns_cache_ttl,
+                keepalive_timeout=keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._session_key = session_key
+        return self._session
+
+    async def on_shutdown(self):
+        # Close the pooled session; OpenWebUI/pipelines call this when the function is unloaded
+        if self._session is not None and not self._session.closed:
+            try:
+                await self._session.close()
+            except RuntimeError:
+                # The loop the session was bound to is gone; nothing left to close
+                pass
+        self._session = None
+        self._session_key = None
+
+    def _get_rate_limiter(self) -> Optional[AdaptiveRateLimiter]:
+        """Return the shared rate limiter, rebuilding it when its valves change; None when disabled."""
+        settings = (
+            self.valves.rate_limit_rps,
+            self.valves.rate_limit_burst,
+            self.valves.rate_limit_min_rps,
+            self.valves.rate_limit_increase,
+            self.valves.rate_limit_decrease,
+            self.valves.rate_limit_max_wait,
+        )
+        if self.valves.rate_limit_rps <= 0:
+            return None
+        if self._rate_limiter is None or self._rate_limiter_key != settings:
+            self._rate_limiter = AdaptiveRateLimiter(*settings)
+            self._rate_limiter_key = settings
+        return self._rate_limiter
+
+    async def _check_response(self, response, limiter):
+        """Raise for error responses and feed the outcome to the rate limiter."""
+        if response.status == 429:
+            retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+            message = (await response.text()).strip()
+            if limiter is not None:
+                limiter.on_throttle(retry_after)
+            # API Gateway answers "Limit Exceeded" once the usage plan quota is used up
+            if "Limit Exceeded" in message:
+                raise QuotaExceeded(f"Usage plan quota exhausted: {message[:200]}")
+            raise Throttled(f"Throttled by the API: {message[:200]}", retry_after)
+        response.raise_for_status()
+        if limiter is not None:
+            limiter.on_success()
+
+    def _retry_delay(self, attempt: int) -> float:
+        """Exponential backoff with full jitter."""
+        cap = min(
+            self.valves.retry_backoff_max,
+            self.valves.retry_backoff_base * (2**attempt),
+        )
+        return random.uniform(0, cap)
+
+    async def _read_prediction(self, response) -> dict:
+        """Decode a /predict response in the format requested with sm_response_format."""
+        if response.content_type == RESPONSE_TYPES["float32"]:
+            return _unpack_float32(await response.read())
+        if self.valves.sm_response_format != "raw":
+            return await response.json()
+        # Raw responses are the endpoint's own body, not wrapped in {"prediction": ...}
+        body = await response.read()
+        try:
+            prediction = json.loads(body)
+        except ValueError:
+            prediction = f"{len(body)} bytes of {response.content_type}"
+        return {"prediction": prediction}
+
+    async def _read_stream(
+        self, response, event_emitter: Callable[[Any], Awaitable[None]]
+    ):
+        """Consume a streamed prediction, emitting a status event for every chunk received."""
+        chunks = []
+        async for chunk in response.content.iter_any():
+            chunks.append(chunk)
+            preview = chunk.decode(errors="replace").strip()[-80:]
+            await event_emitter(
+                {
+                    "type": "status",
+                    "data": {
+                        "description": f"✨Sagemaker streaming... {preview}",
+                        "done": False,
+                    },
+                }
+            )
+
+        # JSON lines become a list of objects; anything else is returned as text
+        text = b"".join(chunks).decode()
+        try:
+            return [json.loads(line) for line in text.splitlines() if line.strip()]
+        except ValueError:
+            return text
+
+    async def _call_async(
+        self,
+        session: aiohttp.ClientSession,
+        body: dict,
+        headers: dict,
+        timeout: aiohttp.ClientTimeout,
+        event_emitter: Callable[[Any], Awaitable[None]],
+        label: str = "",
+    ):
+        """Submit the image to the asynchronous route and long-poll its result route.
+
+        Submission errors are raised to the caller's retry loop. Result requests are retried
+        up to max_retries times in a row; a failed or timed-out inference raises
+        AsyncInferenceFailed, which is not retried, so the image is never submitted twice
+        for the same outcome.
+        """
+        base = self.valves.sm_base_url
+        limiter = self._get_rate_limiter()
+        if limiter is not None:
+            await limiter.acquire()
+        async with session.post(
+            f"{base}{self.valves.sm_async_endpoint}",
+            json=body,
+            headers=headers,
+            timeout=timeout,
+        ) as response:
+            await self._check_response(response, limiter)
+            request_id = (await response.json())["requestId"]
+
+        result_url = f"{base}{self.valves.sm_result_endpoint}/{request_id}"
+        wait_seconds = max(0, min(20, self.valves.async_wait_seconds))
+        poll_timeout = aiohttp.ClientTimeout(
+            total=wait_seconds + self.valves.http_total_timeout,
+            connect=self.valves.http_connect_timeout,
+        )
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.valves.async_timeout
+        failures = 0
+        while loop.time() < deadline:
+            await event_emitter(
+                {
+                    "type": "status",
+                    "data": {
+                        "description": f"⏳Sagemaker async request{label} pending...",
+                        "done": False,
+                    },
+                }
+            )
+            try:
+                if limiter is not None:
+                    await limiter.acquire()
+                async with session.get(
+                    result_url,
+                    params={"wait": str(wait_seconds)},
+                    headers=headers,
+                    timeout=poll_timeout,
+                ) as response:
+                    if response.status == 404:
+                        raise AsyncInferenceFailed(
+                            f"Async request {request_id} is unknown or expired"
+                        )
+                    await self._check_response(response, limiter)
+                    data = await response.json()
+            except RequestNotRetried:
+                raise
+            except Exception as e:
+                failures += 1
+                if failures >= self.valves.max_retries:
+                    raise AsyncInferenceFailed(
+                        f"Async result for {request_id} unavailable: {e}"
+                    )
+                await asyncio.sleep(self._retry_delay(failures))
+                continue
+            failures = 0
+            if data.get("status") == "COMPLETED":
+                return {"prediction": data.get("prediction")}
+            if data.get("status") == "FAILED":
+                raise AsyncInferenceFailed(
+                    f"Async inference {request_id} failed: {data.get('error')}"
+                )
+            if wait_seconds == 0:
+                # The route does not long-poll, so pace the result requests ourselves
+                await asyncio.sleep(1)
+        raise AsyncInferenceFailed(
+            f"Async inference {request_id} did not finish in {self.valves.async_timeout:g}s"
+        )
+
     async def _call_lambda(
-        self, image: str, event_emitter: Callable[[Any], Awaitable[None]]
+        self,
+        image: str,
+        event_emitter: Callable[[Any], Awaitable[None]],
+        label: str = "",
     ) -> str:
         await event_emitter(
             {
                 "type": "status",
                 "data": {
-                    "description": "✨Sagemaker processing...",
+                    "description": f"✨Sagemaker processing{label}...",
                     "done": False,
                 },
             }
         )
 
+        if self.valves.resize_enabled:
+            if Image is None:
+                logger.warning("resize_enabled is set but Pillow is not installed")
+            else:
+                # Keep the event loop free while decoding and re-encoding
+                image = await asyncio.to_thread(self._downscale_image, image)
+
         headers = {
             "Content-Type": "application/json",
             "x-api-key": self.valves.sm_api_key,
         }
+        if not self.valves.sm_stream:
+            headers["Accept"] = RESPONSE_TYPES.get(
+                self.valves.sm_response_format, RESPONSE_TYPES["json"]
+            )
         body = {"image": self._remove_base64_header(image)}
+        stream = self.valves.sm_stream
         base = self.valves.sm_base_url
-        endpoint = self.valves.sm_endpoint
+        endpoint = self.valves.sm_stream_endpoint if stream else self.valves.sm_endpoint
         url = f"{base}{endpoint}"
+        # Large images go to the asynchronous route so slow models cannot hit the 29 s API limit
+        use_async = (
+            self.valves.async_enabled
+            and not stream
+            and len(body["image"]) > self.valves.async_threshold_bytes
+        )
 
-        async with aiohttp.ClientSession() as session:
-            for attempt in range(self.valves.max_retries):
-                try:
+        session = await self._get_session()
+        limiter = self._get_rate_limiter()
+        timeout = aiohttp.ClientTimeout(
+            total=self.valves.http_total_timeout,
+            connect=self.valves.http_connect_timeout,
+        )
+        for attempt in range(self.valves.max_retries):
+            try:
+                if use_async:
+                    response_data = await self._call_async(
+                        session, body, headers, timeout, event_emitter, label
+                    )
+                else:
+                    if limiter is not None:
+                        await limiter.acquire()
                     async with session.post(
-                        url, json=body, headers=headers
+                        url, json=body, headers=headers, timeout=timeout
                     ) as response:
-                        response.raise_for_status()
-                        response_data = await response.json()
-                        print(f"response_data:{response_data}")
-                        result = response_data
-
-                        await event_emitter(
-                            {
-                                "type": "status",
-                                "data": {
-                                    "description": "🎉Sagemaker process success. Handover to the LLM...",
-                                    "done": True,
-                                },
-                            }
-                        )
-                        await event_emitter(
-                            {
-                                "type": "message",
-                                "data": {
-                                    "content": f"The raw prediction result is: {str(result)}. \n"
-                                },
-                            }
-                        )
+                        await self._check_response(response, limiter)
+                        if stream:
+                            response_data = await self._read_stream(
+                                response, event_emitter
+                            )
+                        else:
+                            response_data = await self._read_prediction(response)
+                # Sizing a large prediction costs a serialization, so only do it when logged
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info(
+                        "SageMaker prediction%s: %s",
+                        label,
+                        self._describe_result(response_data),
+                    )
+                result = response_data
 
-                        return result
-                except Exception as e:
-                    if attempt == self.valves.max_retries - 1:
-                        raise RuntimeError(f"Sagemaker Failed：{e}")
+                await event_emitter(
+                    {
+                        "type": "status",
+                        "data": {
+                            "description": f"✅Sagemaker finished{label}",
+                            "done": False,
+                        },
+                    }
+                )
+                await event_emitter(
+                    {
+                        "type": "message",
+                        "data": {
+                            "content": f"The raw prediction result{' for' + label if label else ''} is: {str(result)}. \n"
+                        },
+                    }
+                )
+
+                return result
+            except Exception as e:
+                if isinstance(e, RequestNotRetried) or (
+                    attempt == self.valves.max_retries - 1
+                ):
+                    raise RuntimeError(f"Sagemaker Failed：{e}")
+                if isinstance(e, Throttled) and limiter is not None:
+                    # The limiter has slowed down and holds the next attempt back
+                    continue
+                delay = self._retry_delay(attempt)
+                if isinstance(e, Throttled) and e.retry_after:
+                    delay = max(delay, e.retry_after)
+                await asyncio.sleep(delay)
 
     async def inlet(
         self,
@@ -135,30 +802,85 @@ class Filter:
         # Modify the request body or validate it before processing by the chat completion API.
         # This function is the pre-processor for the API where various checks on the input can be performed.
         # It can also modify the request before sending it to the API.
-        logger.info(f"inlet:{__name__}")
-        logger.info(f"inlet:body:{body}")
-        logger.info(f"inlet:user:{__user__}")
-
         messages = body.get("messages", [])
-        image_info = self._find_image_in_latest_messages(messages)
+        # The body holds every image of the conversation, so only the latest message is
+        # logged, with images summarized
+        if messages and logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "inlet: %d messages from user %s, latest %s: %s",
+                len(messages),
+                (__user__ or {}).get("id"),
+                messages[-1].get("role"),
+                self._describe_content(messages[-1].get("content")),
+            )
+
+        image_info = self._find_images_in_messages(messages)
         if not image_info:
             return body
-        message_index, content_text_index, content_image_index, image = image_info
+        message_index, content_text_index, images = image_info
 
-        try:
-            result = await self._call_lambda(image, __event_emitter__)
-
-            original_text = messages[message_index]["content"][content_text_index][
-                "text"
-            ]
-            
-            messages[message_index]["content"][content_text_index]["text"] = (
-                original_text
-                + f"Additionaly, this is an image that has been classified by SageMaker. The result is : {result}. Based on that result, try to dig more details or reasoning."
+        # Classify every image concurrently so the turn takes about as long as the slowest call
+        semaphore = asyncio.Semaphore(max(1, self.valves.max_concurrent_images))
+
+        async def classify(number, image):
+            label = f" image {number}/{len(images)}" if len(images) > 1 else ""
+            async with semaphore:
+                return await self._call_lambda(image, __event_emitter__, label)
+
+        results = await asyncio.gather(
+            *(
+                classify(number, url)
+                for number, (_, _, url) in enumerate(images, start=1)
+            ),
+            return_exceptions=True,
+        )
+
+        # Attach each result right after its image, working backwards so content indexes stay valid
+        succeeded = 0
+        for (m_index, c_index, _), result in sorted(
+            zip(images, results), key=lambda item: item[0][:2], reverse=True
+        ):
+            if isinstance(result, Exception):
+                logger.warning(
+                    "SageMaker classification of message %d failed: %s",
+                    m_index,
+                    self._describe_result(result),
+                )
+                text = f"SageMaker could not classify the image above: {result}."
+            else:
+                succeeded += 1
+                text = f"This is the SageMaker classification of the image above: {result}."
+            messages[m_index]["content"].insert(
+                c_index + 1, {"type": "text", "text": text}
+            )
+            if (
+                m_index == message_index
+                and content_text_index is not None
+                and content_text_index > c_index
+            ):
+                content_text_index += 1
+
+        if succeeded:
+            instruction = (
+                "Additionaly, the images have been classified by SageMaker and each result "
+                "follows its image. Based on those results, try to dig more details or reasoning."
             )
-            body["messages"] = messages
-        except Exception as e:
-            print(f"Error: {e}")
+            latest_content = messages[message_index]["content"]
+            if content_text_index is None:
+                latest_content.append({"type": "text", "text": instruction})
+            else:
+                latest_content[content_text_index]["text"] += instruction
+        body["messages"] = messages
+
+        await __event_emitter__(
+            {
+                "type": "status",
+                "data": {
+                    "description": f"🎉Sagemaker processed {succeeded}/{len(images)} images. Handover to the LLM...",
+                    "done": True,
+                },
+            }
+        )
 
         return body
 
@@ -166,8 +888,4 @@ class Filter:
         # Modify or analyze the response body after processing by the API.
         # This function is the post-processor for the API, which can be used to modify the response
         # or perform additional checks and analytics.
-        print(f"outlet:{__name__}")
-        print(f"outlet:body:{body}")
-        print(f"outlet:user:{__user__}")
-
         return body
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# OpenWebUI loads the filter as a single file, so import it the same way
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
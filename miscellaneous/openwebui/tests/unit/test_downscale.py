@@ -0,0 +1,70 @@
+import base64
+import io
+
+import pytest
+
+from image2sagemaker import Filter
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def data_url(size, image_format="PNG"):
+    output = io.BytesIO()
+    Image.new("RGB", (size, size), "red").save(output, format=image_format)
+    return f"data:image/{image_format.lower()};base64,{base64.b64encode(output.getvalue()).decode()}"
+
+
+def decoded(url):
+    return Image.open(io.BytesIO(base64.b64decode(url.split(",", 1)[1])))
+
+
+@pytest.fixture
+def image_filter():
+    image_filter = Filter()
+    image_filter.valves.resize_max_dimension = 16
+    return image_filter
+
+
+@pytest.mark.parametrize(
+    "resize_format, pillow_format",
+    [("JPEG", "JPEG"), ("jpg", "JPEG"), ("webp", "WEBP")],
+)
+def test_large_images_are_downscaled_and_re_encoded(
+    image_filter, resize_format, pillow_format
+):
+    image_filter.valves.resize_format = resize_format
+
+    result = image_filter._downscale_image(data_url(64))
+
+    assert result.startswith(f"data:image/{pillow_format.lower()};base64,")
+    with decoded(result) as image:
+        assert (image.format, image.size) == (pillow_format, (16, 16))
+
+
+def test_small_images_in_the_target_format_are_unchanged(image_filter):
+    image = data_url(8, "JPEG")
+
+    assert image_filter._downscale_image(image) == image
+
+
+@pytest.mark.parametrize("resize_format", ["GIF!", "BMPX", ""])
+def test_unsupported_resize_format_leaves_the_image_unchanged(
+    image_filter, resize_format
+):
+    image_filter.valves.resize_format = resize_format
+    image = data_url(64)
+
+    assert image_filter._downscale_image(image) == image
+
+
+def test_undecodable_images_are_unchanged(image_filter):
+    image = "data:image/png;base64," + base64.b64encode(b"not an image").decode()
+
+    assert image_filter._downscale_image(image) == image
+
+
+def test_decompression_bombs_are_unchanged(image_filter, monkeypatch):
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 100)
+    image = data_url(64)
+
+    assert image_filter._downscale_image(image) == image
@@ -0,0 +1,99 @@
+import pytest
+
+from image2sagemaker import Filter
+
+
+def user(*parts):
+    content = []
+    for part in parts:
+        if part.startswith("data:"):
+            content.append({"type": "image_url", "image_url": {"url": part}})
+        else:
+            content.append({"type": "text", "text": part})
+    return {"role": "user", "content": content}
+
+
+def assistant(text="ok"):
+    return {"role": "assistant", "content": text}
+
+
+@pytest.fixture
+def image_filter():
+    return Filter()
+
+
+def test_images_come_from_the_latest_user_message(image_filter):
+    messages = [user("data:old"), assistant(), user("what is this?", "data:new")]
+
+    assert image_filter._find_images_in_messages(messages) == (
+        2,
+        0,
+        [(2, 1, "data:new")],
+    )
+
+
+def test_replies_after_the_latest_user_message_are_skipped(image_filter):
+    messages = [
+        user("data:a", "describe"),
+        assistant(),
+        {"role": "tool", "content": "x"},
+    ]
+
+    assert image_filter._find_images_in_messages(messages) == (0, 1, [(0, 0, "data:a")])
+
+
+@pytest.mark.parametrize(
+    "messages",
+    [
+        [],
+        [assistant()],
+        [{"role": "user", "content": "plain text"}],
+        [user("data:old"), assistant(), user("and now?")],
+    ],
+)
+def test_messages_without_new_images_find_nothing(image_filter, messages):
+    image_filter.valves.include_history_images = True
+
+    assert image_filter._find_images_in_messages(messages) is None
+
+
+def test_history_images_are_added_in_conversation_order(image_filter):
+    image_filter.valves.include_history_images = True
+    messages = [
+        user("data:a"),
+        assistant(),
+        user("data:b", "data:c"),
+        assistant(),
+        user("compare", "data:d"),
+    ]
+
+    _, _, images = image_filter._find_images_in_messages(messages)
+
+    assert [url for _, _, url in images] == ["data:a", "data:b", "data:c", "data:d"]
+    assert images[1] == (2, 0, "data:b")
+
+
+def test_history_is_limited_to_history_messages(image_filter):
+    image_filter.valves.include_history_images = True
+    image_filter.valves.history_messages = 2
+    messages = [
+        user("data:a"),
+        assistant(),
+        user("data:b"),
+        assistant(),
+        user("data:c"),
+    ]
+
+    _, _, images = image_filter._find_images_in_messages(messages)
+
+    assert [url for _, _, url in images] == ["data:b", "data:c"]
+
+
+def test_max_images_keeps_the_most_recent_images(image_filter):
+    image_filter.valves.include_history_images = True
+    image_filter.valves.max_images = 3
+    messages = [user("data:a", "data:b"), assistant(), user("data:c", "data:d")]
+
+    _, _, images = image_filter._find_images_in_messages(messages)
+
+    assert [url for _, _, url in images] == ["data:b", "data:c", "data:d"]
@@ -0,0 +1,148 @@
+import asyncio
+import email.utils
+
+import pytest
+
+import image2sagemaker
+from image2sagemaker import AdaptiveRateLimiter, RateLimitExceeded, _parse_retry_after
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def limiter(clock, rate=10.0, burst=2, max_wait=10.0):
+    return AdaptiveRateLimiter(
+        rate=rate,
+        burst=burst,
+        min_rate=1.0,
+        increase=0.1,
+        decrease=0.5,
+        max_wait=max_wait,
+        clock=clock,
+    )
+
+
+def test_requests_beyond_the_burst_wait_for_their_token(clock):
+    limits = limiter(clock, rate=10.0, burst=2)
+
+    waits = [limits.reserve() for _ in range(4)]
+
+    assert waits == pytest.approx([0, 0, 0.1, 0.2])
+
+
+def test_tokens_refill_at_the_rate(clock):
+    limits = limiter(clock, rate=10.0, burst=2)
+    limits.reserve()
+    limits.reserve()
+
+    clock.now += 0.1
+
+    assert limits.reserve() == pytest.approx(0)
+
+
+def test_throttles_halve_the_rate_at_most_once_per_second(clock):
+    limits = limiter(clock, rate=8.0)
+
+    limits.on_throttle()
+    limits.on_throttle()
+    assert limits.rate == 4.0
+
+    clock.now += 1
+    limits.on_throttle()
+    assert limits.rate == 2.0
+
+    for _ in range(3):
+        clock.now += 1
+        limits.on_throttle()
+    assert limits.rate == limits.min_rate
+
+
+def test_successes_raise_the_rate_back_to_the_configured_rate(clock):
+    limits = limiter(clock, rate=10.0)
+    limits.on_throttle()
+
+    limits.on_success()
+    # 10% of the configured 10 rps, scaled by configured / current rate
+    assert limits.rate == pytest.approx(5.2)
+
+    for _ in range(100):
+        limits.on_success()
+    assert limits.rate == 10.0
+
+
+def test_a_throttle_empties_the_bucket(clock):
+    limits = limiter(clock, rate=10.0, burst=2)
+
+    limits.on_throttle()
+
+    # The rate is down to 5 rps, so the next token is 0.2 s away
+    assert limits.reserve() == pytest.approx(0.2)
+
+
+def test_retry_after_holds_every_request_back(clock):
+    limits = limiter(clock, rate=10.0, burst=20)
+
+    limits.on_throttle(retry_after=3)
+
+    assert [limits.reserve() for _ in range(2)] == pytest.approx([3, 3])
+    clock.now += 3
+    assert limits.reserve() == 0
+
+
+def test_requests_that_would_wait_past_max_wait_fail_fast(clock):
+    limits = limiter(clock, rate=1.0, burst=1, max_wait=2.0)
+
+    assert [limits.reserve() for _ in range(3)] == [0, 1, 2]
+    with pytest.raises(RateLimitExceeded):
+        limits.reserve()
+
+    # A rejected request does not take a token
+    clock.now += 1
+    assert limits.reserve() == pytest.approx(2)
+
+
+def test_a_retry_after_longer_than_max_wait_fails_fast(clock):
+    limits = limiter(clock, max_wait=2.0)
+    limits.on_throttle(retry_after=5)
+
+    with pytest.raises(RateLimitExceeded):
+        limits.reserve()
+
+
+def test_acquire_sleeps_without_blocking_the_event_loop(clock, monkeypatch):
+    sleeps = []
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(image2sagemaker.asyncio, "sleep", sleep)
+    limits = limiter(clock, rate=10.0, burst=1)
+
+    async def acquire_twice():
+        await limits.acquire()
+        await limits.acquire()
+
+    asyncio.run(acquire_twice())
+
+    assert sleeps == [pytest.approx(0.1)]
+
+
+def test_retry_after_is_read_in_seconds_or_as_an_http_date(monkeypatch):
+    monkeypatch.setattr(image2sagemaker.time, "time", lambda: 1_700_000_000.0)
+    http_date = email.utils.formatdate(1_700_000_030, usegmt=True)
+
+    assert _parse_retry_after("2.5") == 2.5
+    assert _parse_retry_after("-1") == 0
+    assert _parse_retry_after(http_date) == pytest.approx(30)
+    assert _parse_retry_after("soon") is None
+    assert _parse_retry_after(None) is None
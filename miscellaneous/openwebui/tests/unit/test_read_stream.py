@@ -0,0 +1,56 @@
+import asyncio
+
+from image2sagemaker import Filter
+
+
+class FakeContent:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def iter_any(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class FakeResponse:
+    def __init__(self, chunks):
+        self.content = FakeContent(chunks)
+
+
+def read_stream(chunks):
+    events = []
+
+    async def emit(event):
+        events.append(event)
+
+    result = asyncio.run(Filter()._read_stream(FakeResponse(chunks), emit))
+    return result, events
+
+
+def test_json_lines_are_parsed_across_chunk_boundaries():
+    result, events = read_stream([b'{"token": "a"}\n{"tok', b'en": "b"}\n', b"\n"])
+
+    assert result == [{"token": "a"}, {"token": "b"}]
+    assert len(events) == 3
+    assert all(event["data"]["done"] is False for event in events)
+
+
+def test_every_chunk_is_previewed_in_a_status_event():
+    _, events = read_stream([b'{"token": "cat"}\n'])
+
+    assert events[0]["type"] == "status"
+    assert events[0]["data"]["description"].endswith('{"token": "cat"}')
+
+
+def test_multibyte_characters_split_across_chunks_are_decoded_whole():
+    text = "chat noir: café".encode()
+
+    result, _ = read_stream([text[:-1], text[-1:]])
+
+    assert result == "chat noir: café"
+
+
+def test_plain_text_streams_are_returned_as_text():
+    result, _ = read_stream([b"first part, ", b"second part"])
+
+    assert result == "first part, second part"
@@ -0,0 +1,51 @@
+import array
+import json
+import struct
+import sys
+
+import pytest
+
+from image2sagemaker import _unpack_float32
+
+
+def float32_body(header, values):
+    """Build a body the way /predict does for application/x-prediction-float32."""
+    data = array.array("f", values)
+    if sys.byteorder == "big":
+        data.byteswap()
+    header = json.dumps(header).encode()
+    return struct.pack("<I", len(header)) + header + data.tobytes()
+
+
+def test_packed_arrays_are_restored_to_their_shape():
+    body = float32_body(
+        {
+            "prediction": {
+                "label": "cat",
+                "embedding": {"__float32__": [0, 4], "shape": [4]},
+                "scores": [{"mask": {"__float32__": [4, 6], "shape": [2, 3]}}],
+            }
+        },
+        [0.5, 1.5, 2.5, 3.5, 0.0, 0.25, 0.5, 0.75, 1.0, 1.25],
+    )
+
+    assert _unpack_float32(body) == {
+        "prediction": {
+            "label": "cat",
+            "embedding": [0.5, 1.5, 2.5, 3.5],
+            "scores": [{"mask": [[0.0, 0.25, 0.5], [0.75, 1.0, 1.25]]}],
+        }
+    }
+
+
+def test_values_are_rounded_to_float32():
+    body = float32_body({"prediction": {"__float32__": [0, 1], "shape": [1]}}, [0.1])
+
+    assert _unpack_float32(body)["prediction"] == [pytest.approx(0.1)]
+    assert _unpack_float32(body)["prediction"] != [0.1]
+
+
+def test_bodies_without_packed_arrays_are_plain_json():
+    body = float32_body({"prediction": {"labels": [1, 2, 3], "top": "cat"}}, [])
+
+    assert _unpack_float32(body) == {"prediction": {"labels": [1, 2, 3], "top": "cat"}}